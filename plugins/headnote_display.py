@@ -0,0 +1,71 @@
+"""
+Datasette plugin: template helpers for headnote_display.html
+summary_markup filter: renders a summary_html value with every tag escaped except bare <em> & <strong>
+(luba_db_build.py only ever writes those, but a hand-written query can return any text as summary_html,
+so the value is never trusted as HTML)
+with_args filter: the current page's path with some query parameters replaced (None removes one), for paging links
+headnote_total: rows in the headnotes table (from --inspect-file when served -i), for "filtered from N total"
+to run type 'datasette serve luba.db --plugins-dir plugins --template-dir templates --static static:static'
+"""
+
+import re
+from typing import Optional
+from markupsafe import Markup, escape
+from datasette import hookimpl
+from datasette.utils import path_with_replaced_args
+
+# the only tags let through, after escaping (no attributes)
+ALLOWED_TAG = re.compile(r'&lt;(/?)(em|strong)&gt;')
+
+def summary_markup(value) -> Markup:
+    """
+    value escaped, then its <em>/<strong> tags put back; stray closing tags are dropped & unclosed ones closed,
+    so the markup can't run on into the rest of the page
+    """
+    escaped = str(escape('' if value is None else value))
+    parts = []
+    open_tags = []
+    last = 0
+    for match in ALLOWED_TAG.finditer(escaped):
+        parts.append(escaped[last:match.start()])
+        closing, tag = match.groups()
+        if not closing:
+            open_tags.append(tag)
+            parts.append(f'<{tag}>')
+        elif tag in open_tags:
+            # close anything opened inside it first, so tags always nest
+            while open_tags:
+                inner = open_tags.pop()
+                parts.append(f'</{inner}>')
+                if inner == tag:
+                    break
+        last = match.end()
+    parts.append(escaped[last:])
+    parts += [f'</{tag}>' for tag in reversed(open_tags)]
+    return Markup(''.join(parts))
+
+def with_args(request, **args) -> str:
+    return path_with_replaced_args(request, args)
+
+async def headnote_total(datasette, database: str) -> Optional[int]:
+    """
+    Row count of database's headnotes table (None if it has none)
+    """
+    counted = (datasette.inspect_data or {}).get(database, {}).get('tables', {}).get('headnotes', {}).get('count')
+    if counted is not None:
+        return counted
+    db = datasette.get_database(database)
+    if not await db.table_exists('headnotes'):
+        return None
+    return (await db.execute("SELECT count(*) FROM headnotes")).single_value()
+
+@hookimpl
+def prepare_jinja2_environment(env):
+    env.filters['summary_markup'] = summary_markup
+    env.filters['with_args'] = with_args
+
+@hookimpl
+def extra_template_vars(datasette, database):
+    async def template_vars():
+        return {'headnote_total': await headnote_total(datasette, database) if database else None}
+    return template_vars
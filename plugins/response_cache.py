@@ -0,0 +1,197 @@
+"""
+Datasette plugin: keeps whole rendered responses in memory (LRU, up to MAX_CACHE_BYTES of bodies in all) while
+every database is served immutable, so a repeated page, query or static file is answered without running SQLite
+or the templates again
+Each response gets a strong ETag (hash of the body) & Cache-Control, and a matching If-None-Match gets a 304
+The cache key is the path + sorted query parameters (SQL exactly as sent) + the databases' content
+hashes, so a redeployed luba.db never serves old results
+to run type 'datasette serve -i luba.db --inspect-file inspect-data.json --plugins-dir plugins --template-dir templates --static static:static'
+(mutable databases, i.e. no -i, turn the cache off)
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+from datasette import hookimpl
+
+# CONFIG ********
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # total size of the cached bodies; least recently used dropped first past this
+MAX_BODY_BYTES = 2 * 1024 * 1024    # bigger responses (e.g. full CSV exports) are passed through uncached
+MAX_AGE = 300                       # seconds browsers may reuse a response before re-checking its ETag
+# ********
+
+def cache_key(scope: Dict, version: str) -> str:
+    """
+    Path, sorted query parameters & database content version
+    (the SQL is kept exactly as sent: the page shows it in the SQL editor & "Edit SQL" links, so a copy with
+    different spacing is a different page)
+    """
+    params = sorted(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+    return f"{version}:{scope['path']}?{urlencode(params)}"
+
+def content_version(datasette) -> Optional[str]:
+    """
+    Content hashes of the served databases (None if any can change, which turns caching off)
+    Immutable databases hash the file once at startup, or take the hash from --inspect-file
+    """
+    hashes = []
+    for name, database in sorted(datasette.databases.items()):
+        if name == '_internal':
+            continue  # datasette's own in-memory catalog
+        if database.hash is None:
+            return None
+        hashes.append(database.hash)
+    return ','.join(hashes)
+
+def header_value(headers: List[Tuple[bytes, bytes]], name: bytes) -> str:
+    """
+    First value of a header (name in lower case) or ''
+    """
+    return next((value.decode('latin-1') for key, value in headers if key.lower() == name), '')
+
+def cacheable_request(scope: Dict) -> bool:
+    """
+    Plain anonymous GETs only; signed-in actors can get pages that differ per person
+    """
+    if scope['type'] != 'http' or scope['method'] != 'GET':
+        return False
+    headers = scope.get('headers', [])
+    return not header_value(headers, b'authorization') and 'ds_actor=' not in header_value(headers, b'cookie')
+
+def cacheable_response(start: Dict) -> bool:
+    """
+    200s that don't set cookies or ask not to be stored
+    """
+    headers = start.get('headers', [])
+    cache_control = header_value(headers, b'cache-control').lower()
+    return (start['status'] == 200 and not header_value(headers, b'set-cookie')
+            and 'no-store' not in cache_control and 'private' not in cache_control)
+
+class CachedResponse:
+    """
+    Status, headers & body of one response, with its ETag & caching headers added
+    """
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        replaced = (b'cache-control', b'etag', b'content-length')
+        self.headers = [(key, value) for key, value in headers if key.lower() not in replaced]
+        self.headers += [
+            (b'etag', self.etag.encode('latin-1')),
+            (b'cache-control', f"public, max-age={MAX_AGE}".encode('latin-1')),
+        ]
+
+    def matches(self, if_none_match: str) -> bool:
+        """
+        True if the client's If-None-Match already has this body
+        """
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or self.etag in tags
+
+    async def send(self, scope: Dict, send, cache_status: str):
+        """
+        Sends the response (or a 304 Not Modified if the client's copy is current)
+        """
+        headers = self.headers + [(b'x-response-cache', cache_status.encode('latin-1'))]
+        if self.matches(header_value(scope.get('headers', []), b'if-none-match')):
+            headers = [(key, value) for key, value in headers if key.lower() != b'content-type']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        headers.append((b'content-length', str(len(self.body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+class ResponseCache:
+    """
+    {cache key: CachedResponse}, dropping the least recently used while the bodies add up to more than max_bytes
+    (a byte budget rather than an entry count, so a run of large pages can't use up the host's memory)
+    """
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        replaced = self.entries.pop(key, None)
+        if replaced is not None:
+            self.size -= len(replaced.body)
+        self.entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, oldest = self.entries.popitem(last=False)
+            self.size -= len(oldest.body)
+
+async def capture_response(app, scope: Dict, receive, send) -> Optional[CachedResponse]:
+    """
+    Runs the request through datasette, holding the response back to cache it
+    If it turns out not to be cacheable (error, cookies, too big...) it's passed on to the client as is & None returned
+    """
+    start = None
+    chunks = []
+    size = 0
+    passing = False
+
+    async def hold_send(message):
+        nonlocal start, size, passing
+        if passing:
+            await send(message)
+        elif message['type'] == 'http.response.start':
+            start = message
+            if not cacheable_response(message):
+                passing = True
+                await send(message)
+        else:
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            if size > MAX_BODY_BYTES:
+                passing = True
+                await send(start)
+                await send({'type': 'http.response.body', 'body': b''.join(chunks),
+                            'more_body': message.get('more_body', False)})
+
+    await app(scope, receive, hold_send)
+    if passing or start is None:
+        return None
+    return CachedResponse(start['status'], list(start.get('headers', [])), b''.join(chunks))
+
+@hookimpl
+def asgi_wrapper(datasette):
+    cache = ResponseCache()
+
+    def wrap_with_cache(app):
+        async def cached_app(scope, receive, send):
+            if not cacheable_request(scope):
+                await app(scope, receive, send)
+                return
+            version = content_version(datasette)
+            if version is None:
+                await app(scope, receive, send)
+                return
+            key = cache_key(scope, version)
+            entry = cache.get(key)
+            cache_status = 'hit'
+            if entry is None:
+                entry = await capture_response(app, scope, receive, send)
+                if entry is None:
+                    return  # already sent, uncached
+                cache.put(key, entry)
+                cache_status = 'miss'
+            await entry.send(scope, send, cache_status)
+
+        return cached_app
+
+    return wrap_with_cache
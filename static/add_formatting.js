@@ -1,4 +1,5 @@
 // Apply formatting from the stored formatting data
+// Fallback only: headnotes with summary_html (luba_db_build.py) are formatted on the server & get no formatting-data
 document.addEventListener('DOMContentLoaded', function() {
     const formattingScripts = document.querySelectorAll('.formatting-data');
     formattingScripts.forEach(function(script) {
@@ -3,11 +3,35 @@ document.addEventListener('DOMContentLoaded', async () => {
     // Find all headnote entries
     const linkTemplate = `/luba?sql=SQL`
 
+    // SQL for headnotes with an exact cite (indexed lookup in headnote_citations, built by luba_db_build.py;
+    // cite is COLLATE NOCASE there, so a cite matched with /i still finds the stored spelling)
+    const citeSQL = (kinds, cite) => {
+        const kindList = kinds.map(kind => `'${kind}'`).join(', ');
+        return `SELECT * FROM headnotes WHERE rowid IN (SELECT headnote_rowid FROM headnote_citations WHERE kind IN (${kindList}) AND cite = '${cite.replace(/'/g, "''")}') ORDER BY year DESC`;
+    }
+
+    // SQL for one part of the headnote outline (range read on headnote_sort, built by luba_db_build.py)
+    // each level is 3 digits of headnote_sort: 36.2.3 => 36002003000, 10.1.2.4 => 10001002004
+    const outlineSQL = (section, subSec, subSub, subSubSub) => {
+        const base = 1000;
+        const start = Number(section) * base ** 3 + Number(subSec || 0) * base ** 2 + Number(subSub || 0) * base + Number(subSubSub || 0);
+        const span = subSubSub ? 1 : subSub ? base : subSec ? base ** 2 : base ** 3;
+        return `SELECT * FROM headnotes WHERE headnote_sort BETWEEN ${start} AND ${start + span - 1} ORDER BY headnote_sort ASC, year DESC`;
+    }
+
+    // SQL for headnotes linked to an opinion (headnote_opinions & opinion_keys, built by luba_db_build.py)
+    // citedBySQL: headnotes citing the opinion this headnote comes from; citesSQL: headnotes from the opinions it cites
+    const citedBySQL = rowid => `SELECT * FROM headnotes WHERE rowid IN (SELECT c.headnote_rowid FROM headnote_opinions AS d JOIN headnote_opinions AS c ON c.opinion_rowid = d.opinion_rowid AND c.relation = 'cites' WHERE d.headnote_rowid = ${Number(rowid)} AND d.relation = 'decided') ORDER BY year DESC`;
+    const citesSQL = rowid => `SELECT * FROM headnotes WHERE rowid IN (SELECT d.headnote_rowid FROM headnote_opinions AS c JOIN headnote_opinions AS d ON d.opinion_rowid = c.opinion_rowid AND d.relation = 'decided' WHERE c.headnote_rowid = ${Number(rowid)} AND c.relation = 'cites') ORDER BY year DESC`;
+    // opinion key for a docket number, as normalized by the build: "LUBA No 2013-008"
+    const docketSQL = (year, caseNum) => `SELECT * FROM headnotes WHERE rowid IN (SELECT headnote_rowid FROM headnote_opinions WHERE relation = 'decided' AND opinion_rowid IN (SELECT opinion_rowid FROM opinion_keys WHERE key = 'LUBA No ${Number(year)}-${String(Number(caseNum)).padStart(3, '0')}')) ORDER BY year DESC, reporter ASC, headnote ASC`;
+
     //populate links in headnotes list
     const headNumLinks = document.querySelectorAll('a.head-number');
 
     headNumLinks.forEach(headNumLink => {
-        const sql = `SELECT * FROM headnotes WHERE headnote LIKE '${headNumLink.textContent}%' ORDER BY headnote ASC, year DESC`;
+        const [section, subSec, subSub, subSubSub] = headNumLink.textContent.split('.').map(num => parseInt(num, 10));
+        const sql = outlineSQL(section, subSec, subSub, subSubSub);
         const encodedSQL = encodeURIComponent(sql);
         const link = linkTemplate.replace(/SQL/, encodedSQL);
         headNumLink.setAttribute('href', link)
@@ -23,15 +47,16 @@ document.addEventListener('DOMContentLoaded', async () => {
         if (headnoteHeader) {
             const headerText = headnoteHeader.innerHTML;
             //create section & subsection data and links to metadata
-            const headParser = /(\d+)\.(\d+)?\.?(\d+)?/
+            const headParser = /(\d+)\.(\d+)?\.?(\d+)?\.?(\d+)?/
             const match = headerText.match(headParser)
             const headnoteNum = match[0] ? match [0] : null
             const headSection = match[1] ? match[1] : null
             const headSubSec = match[2] ? match [2] : null
             const headSubSub = match[3] ? match [3] : null
+            const headSubSubSub = match[4] ? match [4] : null
             let newHeadnoteNum = ''
             if (headSection) {
-                const sql = `SELECT * FROM headnotes WHERE headnote LIKE '${headSection}%' ORDER BY headnote ASC, year DESC`;
+                const sql = outlineSQL(headSection);
                 const encodedSQL = encodeURIComponent(sql);
                 const link = linkTemplate.replace(/SQL/, encodedSQL);
                 newHeadnoteNum = `<a href="${link}" title="Search for headnote ${headSection}">${headSection}</a>.`
@@ -39,17 +64,23 @@ document.addEventListener('DOMContentLoaded', async () => {
                 console.log(`No headnote for this section!?: ${headerText.trim()}`);
             }
             if (headSubSec) {
-                const sql = `SELECT * FROM headnotes WHERE headnote LIKE '${headSection}.${headSubSec}%' ORDER BY headnote ASC, year DESC`;
+                const sql = outlineSQL(headSection, headSubSec);
                 const encodedSQL = encodeURIComponent(sql);
                 const link = linkTemplate.replace(/SQL/, encodedSQL);
                 newHeadnoteNum += `<a href=${link} title="Search for headnote ${headSection}.${headSubSec}">${headSubSec}</a></div>`;
             }
             if (headSubSub) {
-                const sql = `SELECT * FROM headnotes WHERE headnote LIKE '${headSection}.${headSubSec}.${headSubSub}%' ORDER BY headnote ASC, year DESC`;
+                const sql = outlineSQL(headSection, headSubSec, headSubSub);
                 const encodedSQL = encodeURIComponent(sql);
                 const link = linkTemplate.replace(/SQL/, encodedSQL);
                 newHeadnoteNum += `.<a href="${link}" title="Search for headnote ${headSection}.${headSubSec}.${headSubSub}">${headSubSub}</a></div>`;
             }
+            if (headSubSubSub) {
+                const sql = outlineSQL(headSection, headSubSec, headSubSub, headSubSubSub);
+                const encodedSQL = encodeURIComponent(sql);
+                const link = linkTemplate.replace(/SQL/, encodedSQL);
+                newHeadnoteNum += `.<a href="${link}" title="Search for headnote ${headSection}.${headSubSec}.${headSubSub}.${headSubSubSub}">${headSubSubSub}</a>`;
+            }
             if (newHeadnoteNum.length > 0) {
                 headnoteHeader.innerHTML = headerText.replace(headnoteNum, newHeadnoteNum)
             }
@@ -66,7 +97,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             if (citeReporter) {
                 // Create SQL to citation in either citation field or case_cites field
-                const sql = `SELECT * FROM headnotes WHERE reporter LIKE '%${citeReporter}%' OR case_cites LIKE '%${citeReporter}%' ORDER BY year DESC`;
+                const sql = citeSQL(['reporter', 'case'], citeReporter);
                 const encodedSQL = encodeURIComponent(sql);
                 const link = linkTemplate.replace(/SQL/, encodedSQL);
 
@@ -78,6 +109,18 @@ document.addEventListener('DOMContentLoaded', async () => {
             }
         }
 
+        // Add "cited by" & "cites" links (opinion citation graph) under the metadata
+        const rowid = headnoteEntry.dataset.rowid;
+        const metadata = headnoteEntry.querySelector('.metadata details');
+        if (rowid !== undefined && metadata) {
+            const graphLine = document.createElement('div');
+            graphLine.className = 'metadata-line';
+            const citedByLink = linkTemplate.replace(/SQL/, encodeURIComponent(citedBySQL(rowid)));
+            const citesLink = linkTemplate.replace(/SQL/, encodeURIComponent(citesSQL(rowid)));
+            graphLine.innerHTML = `<strong>Opinion Links:</strong> <a href="${citedByLink}" class="citation-link" title="headnotes citing this opinion">Cited by</a>, <a href="${citesLink}" class="citation-link" title="headnotes from LUBA opinions this one cites">Cites</a>`;
+            metadata.appendChild(graphLine);
+        }
+
         // Add links to SQL searches in metadata
         const metadataLines = headnoteEntry.querySelectorAll('.metadata-line');
         metadataLines.forEach(line => {
@@ -93,7 +136,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
                     const linkedCitations = citations.map(cite => {
                         if (cite && cite !== '') {
-                            const sql = `SELECT * FROM headnotes WHERE reporter LIKE '%${cite.replace(/'/g, "''")}%' OR case_cites LIKE '%${cite.replace(/'/g, "''")}%' ORDER BY year DESC`;
+                            const sql = citeSQL(['reporter', 'case'], cite);
                             const encodedSQL = encodeURIComponent(sql);
                             const link = linkTemplate.replace(/SQL/, encodedSQL);
                             return `<a href="${link}" class="citation-link">${cite}</a>`;
@@ -114,7 +157,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
                     const linkedORS = orsCitations.map(cite => {
                         if (cite && cite !== '') {
-                            const sql = `SELECT * FROM headnotes WHERE ors_cites LIKE '%${cite.replace(/'/g, "''")}%' ORDER BY year DESC`;
+                            const sql = citeSQL(['ors'], cite);
                             const encodedSQL = encodeURIComponent(sql);
                             const link = linkTemplate.replace(/SQL/, encodedSQL);
                             return `<a href="${link}" class="citation-link">${cite}</a>`;
@@ -135,7 +178,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
                     const linkedOAR = oarCitations.map(cite => {
                         if (cite && cite !== '') {
-                            const sql = `SELECT * FROM headnotes WHERE oar_cites LIKE '%${cite.replace(/'/g, "''")}%' ORDER BY year DESC`;
+                            const sql = citeSQL(['oar'], cite);
                             const encodedSQL = encodeURIComponent(sql);
                             const link = linkTemplate.replace(/SQL/, encodedSQL);
                             return `<a href="${link}" class="citation-link">${cite}</a>`;
@@ -158,7 +201,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                         if (index > 1 && aMatch) {
                             const caseNum = aMatch.replace(/\//,'').trim();
                             const caseNumRE = RegExp(`\\b${caseNum}(\\b|$)`,'g');
-                            const sql = `SELECT * FROM headnotes WHERE luba_no LIKE '%${year}%'AND luba_no LIKE '%${caseNum}%' ORDER BY year DESC, reporter ASC, headnote ASC`;
+                            const sql = docketSQL(year, caseNum);
                             const encodedSQL = encodeURIComponent(sql);
                             const link = linkTemplate.replace(/SQL/, encodedSQL);
                             replaceString = replaceString.replace(caseNumRE, `<a href="${link}" class="luba_num_link">${caseNum}</a>`);
@@ -0,0 +1,33 @@
+document.addEventListener('DOMContentLoaded', () => {
+    // Suggests party names in the Party Search box as you type
+    // (trigram index party_names_fts, built by luba_db_build.py; most frequent parties first)
+    const partyInput = document.querySelector('.party-search-box');
+    const suggestions = document.getElementById('party-suggestions');
+    if (!partyInput || !suggestions) {
+        return;
+    }
+    const suggestSQL = `SELECT party FROM party_names_fts WHERE party_names_fts MATCH :q ORDER BY CAST(case_count AS INTEGER) DESC LIMIT 10`;
+    let timer = null;
+
+    partyInput.addEventListener('input', () => {
+        clearTimeout(timer);
+        const text = partyInput.value.trim();
+        if (text.length < 3) {
+            return; // trigrams need at least 3 characters
+        }
+        timer = setTimeout(async () => {
+            const params = new URLSearchParams({ sql: suggestSQL, q: `"${text.replace(/"/g, '""')}"`, _shape: 'array' });
+            const response = await fetch(`/${partyInput.dataset.database}.json?${params}`);
+            if (!response.ok) {
+                return;
+            }
+            const rows = await response.json();
+            suggestions.innerHTML = '';
+            rows.forEach(row => {
+                const option = document.createElement('option');
+                option.value = row.party;
+                suggestions.appendChild(option);
+            });
+        }, 150);
+    });
+});
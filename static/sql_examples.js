@@ -4,8 +4,9 @@ document.addEventListener('DOMContentLoaded', () => {
         {
             label: "Affordable Housing",
             sql:
-`SELECT * FROM headnotes
-WHERE summary LIKE '%affordable housing%'
+`SELECT headnotes.* FROM headnotes_fts
+JOIN headnotes ON headnotes.rowid = headnotes_fts.rowid
+WHERE headnotes_fts MATCH 'summary: "affordable housing"'
 ORDER BY year DESC`
         },
         {
@@ -19,34 +20,48 @@ ORDER BY year DESC, pub_month DESC`
             label: "Cites to ORS 197.829",
             sql:
 `SELECT * FROM headnotes
-WHERE ors_cites LIKE '%197.829%'`
+WHERE rowid IN (
+  SELECT headnote_rowid FROM headnote_citations
+  WHERE kind = 'ors' AND cite = '197.829')`
         },
         {
             label: "Headnote 36",
             sql:
 `SELECT * FROM headnotes
-WHERE headnote LIKE '36%'
-ORDER BY headnote ASC, year DESC`
+WHERE headnote_sort BETWEEN 36000000000 AND 36999999999 -- all of section 36
+ORDER BY headnote_sort ASC, year DESC`
         },
         {
             label: "Headnote Count",
             sql: `
-SELECT topic, COUNT(*) as headnote_count FROM headnotes
-GROUP BY topic
+SELECT topic, headnote_count FROM topic_counts
 ORDER BY headnote_count DESC`
         },
         {
             label: "Corvallis since 2015",
             sql: `
 SELECT * FROM headnotes
-WHERE case_name LIKE '%City of Corvallis%' AND year >= 2015`
+WHERE rowid IN (
+  SELECT source_rowid FROM case_parties
+  WHERE party_key = 'city of corvallis' AND source = 'headnotes')
+AND year >= 2015`
         },
         {
             label: "Environmental",
             sql:
-`SELECT * FROM headnotes
-WHERE summary LIKE '%environment%' OR summary LIKE '%pollut%' OR summary LIKE "%contamina%"
-ORDER BY year DESC`
+`SELECT headnotes.* FROM headnotes_fts
+JOIN headnotes ON headnotes.rowid = headnotes_fts.rowid
+WHERE headnotes_fts MATCH 'summary: (environ* OR pollut* OR contamin*)'
+ORDER BY headnotes_fts.rank`
+        },
+        {
+            label: "Best Match: Goal 5 Wetlands",
+            sql:
+`SELECT headnotes.* FROM headnotes_fts
+JOIN headnotes ON headnotes.rowid = headnotes_fts.rowid
+WHERE headnotes_fts MATCH 'topic: "goal 5" AND wetland*'
+ORDER BY headnotes_fts.rank
+LIMIT 50`
         },
         {
             label: "Headnotes with Warnings",
@@ -58,24 +73,37 @@ ORDER BY warnings ASC`
         {
             label: "Most Cited OAR List",
             sql:
-`SELECT cite.value AS value, COUNT(cite.value) AS cite_count FROM headnotes,
-JSON_EACH(headnotes.oar_cites) AS cite
-GROUP BY cite.value
+`SELECT cite AS value, headnote_count AS cite_count FROM cite_counts
+WHERE kind = 'oar'
 ORDER BY cite_count DESC, value ASC`
-            /* `SELECT cite.value AS oar_cited, COUNT(*) AS cite_count FROM headnotes,
-JSON_EACH(headnotes.oar_cites) AS cite
-WHERE headnotes.oar_cites != '[]' AND headnotes.oar_cites != ''
-GROUP BY cite.value
-ORDER BY cite_count DESC, individual_oar ASC;`
- */        },
+        },
+        {
+            label: "Most Cited LUBA Opinions",
+            sql:
+`SELECT o.name, o.reporter, o.year, c.headnote_count AS cited_by
+FROM opinion_citation_counts AS c
+JOIN opinions AS o ON o.rowid = c.opinion_rowid
+WHERE c.relation = 'cites'
+ORDER BY cited_by DESC, o.year DESC
+LIMIT 50`
+        },
+        {
+            label: "Opinions against Lane County",
+            sql:
+`SELECT name, reporter, year, url FROM opinions
+WHERE rowid IN (
+  SELECT source_rowid FROM case_parties
+  WHERE party_key = 'lane county' AND source = 'opinions' AND role = 'respondent')
+ORDER BY year DESC`
+        },
         {
             label: "Citing Or S.Ct.",
             sql:
-`SELECT DISTINCT headnotes.* FROM headnotes
-JOIN JSON_EACH(headnotes.case_cites) AS cite
-WHERE cite.value LIKE '%Or%'
-  AND cite.value NOT LIKE '%App%'
-ORDER BY headnotes.year DESC`
+`SELECT * FROM headnotes
+WHERE rowid IN (
+  SELECT headnote_rowid FROM headnote_citations
+  WHERE kind = 'case' AND cite LIKE '%Or%' AND cite NOT LIKE '%App%')
+ORDER BY year DESC`
         }
     ];
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Times the headnote tools on synthetic corpora (synthetic_corpus.py) of a given size, stage by stage:
+parse (python-docx read, streamed read, formatting, extraction, JSON write), split & recombine the Word file,
+compare against an old database & (--db) build luba.db. Reports seconds, headnotes/s & peak Python memory
+per stage, and how much of the parser output matches the corpus' ground truth: scored apart for the headnotes with
+topics the parser's topic rule can't end on (synthetic_corpus.TOPIC_RULE_MISS, expected misses) & the rest.
+Accuracy is only reported, never fails the run
+'long headnote' parses one headnote with a LONG_SUMMARY_WORDS word summary; it fails the run if it's parsed wrong or
+takes longer than the parser's time budget
+With --db, 'db build' loads the parse plus the corpus' opinion matches (like combiner output) & 'db update' applies
+the same parse as parser JSON (no opinion_ID) with one edited summary using luba_db_update.py; anything but exactly
+1 changed row fails the run
+--save-baseline stores the times for this machine in BASELINE_FILE; later runs compare against it & exit 1
+if any stage got more than SLOWDOWN slower
+to run type 'python benchmark_tools.py [--count 1000 10000 100000] [--db] [--no-memory] [--save-baseline]'
+"""
+
+import contextlib, copy, io, json, os, random, shutil, sqlite3, sys, tempfile, time, tracemalloc
+from typing import Callable, Dict, List, Tuple
+import synthetic_corpus
+import build_db_compare
+import luba_docx_parser
+from split_word_doc_by_headnote import split_document
+from zip_headnote_splits_to_word import combine_documents
+
+# CONFIG ********
+CORPUS_FOLDER = "benchmark_corpus"          # generated corpora are kept here & reused
+BASELINE_FILE = "benchmark_baselines.json"  # per machine, not checked in
+DEFAULT_COUNTS = [1000]
+# ********
+
+SLOWDOWN = 0.25      # a stage this much slower than its baseline is a regression
+MIN_SECONDS = 0.05   # stages quicker than this (in the baseline) are too noisy to flag
+
+# fields checked against the corpus ground truth
+ACCURACY_FIELDS = ('headnote', 'topic', 'summary', 'case_name', 'reporter', 'year', 'ors_cites', 'oar_cites', 'case_cites')
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+def italic_spans(formatting: List[Dict]) -> List[Tuple]:
+    return [(fmt['text'], fmt.get('summary_start'), fmt.get('summary_end')) for fmt in formatting if fmt['type'] == 'italic']
+
+def accuracy(pairs: List[Tuple[Dict, Dict]]) -> Dict[str, float]:
+    """
+    Share of (parsed, ground truth) pairs where each field (& the summary's italic formatting) matches
+    """
+    matches = dict.fromkeys(ACCURACY_FIELDS + ('formatting',), 0)
+    for got, expected in pairs:
+        for field in ACCURACY_FIELDS:
+            matches[field] += got[field] == expected[field]
+        matches['formatting'] += italic_spans(got['formatting']) == italic_spans(expected['formatting'])
+    return {field: round(matched / len(pairs), 4) for field, matched in matches.items()} if pairs else {}
+
+def scores(parsed: List[Dict], truth: List[Dict]) -> Dict:
+    """
+    {'readable': accuracy, 'misses': accuracy, 'miss_count': headnotes}: 'misses' covers the headnotes whose topic
+    the parser's topic rule can't end on, 'readable' the rest
+    """
+    if len(parsed) != len(truth):
+        print_it(f"  parser found {len(parsed)} headnotes, corpus has {len(truth)}")
+    readable, misses = [], []
+    for got, expected in zip(parsed, truth):
+        (misses if synthetic_corpus.TOPIC_RULE_MISS.search(expected['topic']) else readable).append((got, expected))
+    return {'readable': accuracy(readable), 'misses': accuracy(misses), 'miss_count': len(misses)}
+
+def tool_stages(paths: Dict[str, str], work_dir: str, with_db: bool) -> Tuple[List[Tuple[str, Callable]], Dict]:
+    """
+    ([(stage name, function)] run in order, state): later stages use what earlier ones left in state
+    """
+    state = {}
+    long_raw, state['long_expected'] = synthetic_corpus.long_headnote(random.Random(synthetic_corpus.DEFAULT_SEED))
+
+    def docx_read():
+        state['docx'] = luba_docx_parser.parse_docx_headnotes(paths['docx'])
+
+    def stream_read():
+        state['raw'] = list(luba_docx_parser.iter_docx_headnotes(paths['docx']))
+
+    def formatting():
+        from docx import Document
+        for para in Document(paths['docx']).paragraphs:
+            luba_docx_parser.extract_formatting(para, para.text.strip())
+
+    def extraction():
+        # extract_headnote_data edits the formatting list it's given, so each run gets fresh copies
+        state['parsed'] = [luba_docx_parser.extract_headnote_data(raw) for raw in copy.deepcopy(state['raw'])]
+
+    def long_headnote():
+        # one headnote with a LONG_SUMMARY_WORDS word summary (catches anything that grows faster than the text)
+        state['long'] = luba_docx_parser.extract_headnote_data(copy.deepcopy(long_raw))
+
+    def json_write():
+        with open(os.path.join(work_dir, 'parsed.json'), 'w', encoding='utf-8') as f:
+            json.dump(state['parsed'], f, indent=2, ensure_ascii=False)
+
+    def split():
+        split_dir = os.path.join(work_dir, 'split')
+        shutil.rmtree(split_dir, ignore_errors=True)
+        os.makedirs(split_dir)
+        source = shutil.copy(paths['docx'], split_dir)
+        split_document(source)
+        os.remove(source)  # only the split files get recombined
+        state['split_dir'] = split_dir
+
+    def combine():
+        combine_documents(state['split_dir'])
+
+    def compare_load():
+        conn = sqlite3.connect(paths['old_db'])
+        state['old'] = build_db_compare.load_old_data(conn)
+        conn.close()
+        state['new'] = build_db_compare.load_new_data(paths['json'])
+
+    def compare():
+        state['changes'] = build_db_compare.compare(state['old'], state['new'])
+
+    def compare_write():
+        build_db_compare.write_outputs(state['changes'], os.path.join(work_dir, 'compare_output.csv'),
+                                       os.path.join(work_dir, 'compare_output.json'))
+
+    def db_build():
+        # this parse with each headnote's opinion match from the corpus, i.e. what headnote_opinion_combiner.js gives
+        import luba_db_build
+        with open(paths['json'], encoding='utf-8') as f:
+            matches = [{name: truth[name] for name in ('opinion_ID', 'opinion_matched_by')} for truth in json.load(f)]
+        combined_path = os.path.join(work_dir, 'combined.json')
+        with open(combined_path, 'w', encoding='utf-8') as f:
+            json.dump([{**parsed, 'index': str(i), **match} for i, (parsed, match) in enumerate(zip(state['parsed'], matches))],
+                      f, ensure_ascii=False)
+        luba_db_build.build_database(combined_path, paths['opinions'], os.path.join(work_dir, 'luba.db'))
+
+    def db_update():
+        # the same parse as plain parser output (no opinion_ID) with one summary edited: only that headnote is written
+        import luba_db_update
+        release = [{**parsed, 'index': str(i)} for i, parsed in enumerate(state['parsed'])]
+        edited = len(release) // 2
+        release[edited] = {**release[edited], 'summary': release[edited]['summary'] + " Edited for this release."}
+        release_path = os.path.join(work_dir, 'release.json')
+        with open(release_path, 'w', encoding='utf-8') as f:
+            json.dump(release, f, ensure_ascii=False)
+        db_path = os.path.join(work_dir, 'luba_update.db')
+        shutil.copy(os.path.join(work_dir, 'luba.db'), db_path)
+        conn = sqlite3.connect(db_path)
+        updates, deletes, inserts, unchanged = luba_db_update.find_delta(luba_db_update.load_live_rows(conn),
+                                                                         luba_db_update.load_release_rows(conn, release_path))
+        luba_db_update.apply_delta(conn, updates, deletes, inserts, verify=True)
+        conn.close()
+        state['update'] = {'added': len(inserts), 'removed': len(deletes), 'changed': len(updates), 'unchanged': unchanged}
+
+    stages = [('docx read', docx_read), ('stream read', stream_read), ('formatting', formatting),
+              ('extraction', extraction), ('long headnote', long_headnote), ('json write', json_write),
+              ('split', split), ('combine', combine),
+              ('compare load', compare_load), ('compare', compare), ('compare write', compare_write)]
+    if with_db:
+        stages += [('db build', db_build), ('db update', db_update)]
+    return stages, state
+
+def run_stages(stages: List[Tuple[str, Callable]], measure_memory: bool = False) -> Dict[str, float]:
+    """
+    {stage: seconds} (or peak traced MB with measure_memory), keeping the tools' own printing quiet
+    """
+    results = {}
+    for name, stage in stages:
+        if measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stage()
+        seconds = time.perf_counter() - start
+        if measure_memory:
+            results[name] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        else:
+            results[name] = seconds
+    return results
+
+def benchmark(count: int, seed: int, with_db: bool, measure_memory: bool) -> Dict:
+    """
+    Runs every stage on the corpus of count headnotes (writing it first if needed)
+    """
+    # a corpus written by another seed or generator version is never reused
+    name = f"synthetic_{count}_seed{seed}_v{synthetic_corpus.CORPUS_VERSION}"
+    if not os.path.exists(os.path.join(CORPUS_FOLDER, f"{name}_old.db")):
+        print_it(f"writing {count} headnote corpus to {CORPUS_FOLDER} ...")
+        synthetic_corpus.write_corpus(count, seed, CORPUS_FOLDER, name)
+    paths = {kind: os.path.join(CORPUS_FOLDER, f"{name}{suffix}") for kind, suffix in
+             (('docx', '.docx'), ('json', '.json'), ('opinions', '_opinions.json'), ('old_db', '_old.db'))}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        stages, state = tool_stages(paths, work_dir, with_db)
+        print_it(f"timing {count} headnotes ...")
+        seconds = run_stages(stages)
+        with open(paths['json'], encoding='utf-8') as f:
+            scored = scores(state['parsed'], json.load(f))
+        long_ok = state['long']['summary'] == state['long_expected'] and not state['long']['warnings']
+        update = state.get('update')
+        changes = state['changes']
+        compared = {kind: len(changes[kind]) for kind in ('added', 'removed', 'changed')}
+        peaks = {}
+        if measure_memory:
+            print_it(f"measuring memory for {count} headnotes ...")
+            peaks = run_stages(tool_stages(paths, work_dir, with_db)[0], measure_memory=True)
+    return {'count': count, 'seconds': seconds, 'peak_mb': peaks, 'accuracy': scored, 'long_ok': long_ok,
+            'compare': {**compared, 'unchanged': changes['unchanged']}, 'update': update}
+
+def report(result: Dict, baseline: Dict) -> List[str]:
+    """
+    Prints the stage table; returns the stages that regressed against baseline
+    """
+    count = result['count']
+    regressions = []
+    print(f"\n{count} headnotes")
+    print(f"  {'stage':>14} {'seconds':>9} {'headnotes/s':>12} {'peak MB':>9} {'baseline':>9}")
+    for stage, seconds in result['seconds'].items():
+        peak = result['peak_mb'].get(stage)
+        before = baseline.get(stage)
+        flag = ''
+        if before is not None and before >= MIN_SECONDS and seconds > before * (1 + SLOWDOWN):
+            flag = f"  SLOWER (+{(seconds / before - 1) * 100:.0f}%)"
+            regressions.append(stage)
+        rate = f"{count / seconds if seconds else 0:,.0f}" if stage != 'long headnote' else '-'
+        print(f"  {stage:>14} {seconds:>9.3f} {rate:>12} "
+              f"{f'{peak:.1f}' if peak is not None else '-':>9} {f'{before:.3f}' if before is not None else '-':>9}{flag}")
+    print(f"  {'total':>14} {sum(result['seconds'].values()):>9.3f}")
+    scored = result['accuracy']
+    print("  parser accuracy: " + ', '.join(f"{field} {score:.1%}" for field, score in scored['readable'].items()))
+    if scored['miss_count']:
+        print(f"  parser accuracy, {scored['miss_count']} topics ending in S-U or a digit (expected misses): "
+              + ', '.join(f"{field} {score:.1%}" for field, score in scored['misses'].items()))
+    long_seconds = result['seconds']['long headnote']
+    if not result['long_ok'] or long_seconds > luba_docx_parser.DEFAULT_TIME_BUDGET:
+        regressions.append('long headnote')
+    print(f"  long headnote ({synthetic_corpus.LONG_SUMMARY_WORDS:,} words): {long_seconds:.3f}s, "
+          + ("parsed correctly" if result['long_ok'] else "WRONG SUMMARY OR WARNINGS")
+          + (f", OVER the {luba_docx_parser.DEFAULT_TIME_BUDGET}s time budget" if long_seconds > luba_docx_parser.DEFAULT_TIME_BUDGET else ""))
+    print("  compare: " + ', '.join(f"{count} {kind}" for kind, count in result['compare'].items()))
+    update = result.get('update')
+    if update:
+        # one edited headnote in parser JSON => 1 changed row; anything else means rows were rewritten needlessly
+        update_ok = update == {'added': 0, 'removed': 0, 'changed': 1, 'unchanged': count - 1}
+        if not update_ok:
+            regressions.append('db update')
+        print("  db update (1 edited headnote): " + ', '.join(f"{amount} {kind}" for kind, amount in update.items())
+              + ("" if update_ok else ", EXPECTED 1 CHANGED"))
+    return regressions
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Benchmark the headnote tools on synthetic corpora")
+    arg_parser.add_argument('--count', type=int, nargs='+', default=DEFAULT_COUNTS, metavar='N',
+                            help="corpus size(s) in headnotes, e.g. 1000 10000 100000 (default 1000)")
+    arg_parser.add_argument('--seed', type=int, default=synthetic_corpus.DEFAULT_SEED, help="corpus random seed")
+    arg_parser.add_argument('--db', action='store_true', help="also time building luba.db")
+    arg_parser.add_argument('--no-memory', action='store_true', help="skip the (slower) peak memory pass")
+    arg_parser.add_argument('--save-baseline', action='store_true', help=f"save these times as the baseline in {BASELINE_FILE}")
+    args = arg_parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    regressed = False
+    for count in args.count:
+        result = benchmark(count, args.seed, args.db, not args.no_memory)
+        regressed |= bool(report(result, {} if args.save_baseline else baselines.get(str(count), {})))
+        if args.save_baseline:
+            baselines[str(count)] = result['seconds']
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2)
+        print_it(f"saved baseline to {BASELINE_FILE}")
+    sys.exit(1 if regressed else 0)
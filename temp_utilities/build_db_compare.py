@@ -1,169 +1,315 @@
-import sqlite3, json, time, csv, re
-from difflib import SequenceMatcher
+import sqlite3, json, time, csv, hashlib, re
+from typing import List, Dict, Tuple
+from headnote_io import iter_records
+from pipeline_metrics import Metrics, profile_path_for
 
 # Compares data in existing DB with newer JSON data to see if there are discrepancies. Create JSON data with luba_docx_parser.py
+# Both sides are normalized once & keyed by (headnote, citation); each record also gets a hash of its content,
+# so unchanged headnotes are spotted without comparing text. Several headnotes under one key (same case & number)
+# are paired by summary word overlap, picking the pairing with the best total score. Writes the added/removed/changed headnotes as JSON
+# (createChangeSet) & the rows needing a look as CSV (createOutput)
+# To write a new release into luba.db (same matching, applied in place) use luba_db_update.py
+# to run type 'python build_db_compare.py [old luba.db] [new headnotes.json] [--metrics Headnotes_Results_*.json] [--profile]'
 
 # CONFIG ********
 lubaDB = "../../luba.db"
 newJson = "./LUBA_headnotes_2026-04-22--16-41.json"
 createOutput = "compare_output.csv"
+createChangeSet = "compare_output.json"
 # ********
 
+# duplicate (headnote, citation) entries are only paired up if their summaries are at least this similar
+# (token-set Jaccard: shared words / all words)
+PAIR_CUTOFF = 0.5
+
+# fields compared between old & new (& hashed into content_hash)
+CONTENT_FIELDS = ('topic', 'summary', 'case_name')
+
+CSV_HEADERS = ['index_key', 'change', 'headnote', 'citation', 'topic', 'myTopic', 'summary', 'mySummary',
+               'case_name', 'myCaseName', 'match_score', 'warning']
+
 def print_it(myText):
     print (str(time.time()) + " " + myText)
 
 def clean(old):
-    rSpaces = r"(\s|\t|\n|\r|[\s\xa0])+"
-    return re.sub(rSpaces, ' ', old).strip()
-
-def calcRatio(old, new):
-    return SequenceMatcher(None, old, new).ratio()
-
-with open(newJson, 'r' , encoding='utf-8') as f:
-  new_data = json.load(f)
-
-conn = sqlite3.connect(lubaDB)
-print(conn.execute("SELECT summary FROM published_headnotes_old LIMIT 1").fetchone())
-
-# cleans up old data created by earlier iterations of this program
-conn.execute("DROP TABLE IF EXISTS compareTable")
-conn.execute("DROP VIEW IF EXISTS myDATA")
-conn.execute("DROP VIEW IF EXISTS compare")
-
-# creates new view of old data (included HN, Topic, summary, case name, reporter and "warnings" (array))
-
-conn.execute(
-  """CREATE VIEW myDATA AS
-    SELECT h.headnote_number AS myHeadnote,
-      trim(t.topic) as myTopic,
-      trim(replace(replace(replace(replace(h.summary, char(160), ' '), char(9), ' '), char(10), ' '), char(13), ' ')) as mySummary,
-      trim(o.case_name) as myCaseName,
-      trim(o.reporter) as myCitation,
-      w.message as warning
-    FROM published_headnotes_old AS h
-    LEFT JOIN opinions AS o
-    ON h.opinion_id = o.id
-    LEFT JOIN headnote_topics as t
-    ON h.headnote_number = t.number
-    LEFT JOIN warnings as w
-    ON h.warning_id = w.id
-    """
-    )
-
-print_it("importing new data into table...")
-
-conn.execute(
-  """CREATE TEMP TABLE newDATA
-  (headnote, topic, summary, case_name, citation, year, index_key)""")
-conn.executemany(
-    """INSERT INTO newDATA VALUES
-    (:headnote, :topic, :summary, :case_name, :citation, :year, :index_key)""",
-    [{
-        **r,
-        'index_key': r.get('index'),
-        'topic': clean(r.get('topic')),
-        'summary': clean(r.get('summary')),
-        'case_name': clean(r.get('case_name')),
-        'citation': clean(r.get('citation'))
-    } for r in new_data]
-)
-
-print_it("comparing old and new data ...")
-
-conn.execute("""CREATE TABLE compareTable AS
-    SELECT n.index_key,
-      n.headnote,
-      n.citation,
-      n.topic, m.myTopic,
-      n.summary, m.mySummary,
-      n.case_name, m.myCaseName,
-      m.warning
-    FROM newDATA AS n
-    LEFT JOIN myDATA AS m
-    ON (n.headnote = m.myHeadnote AND n.citation = m.myCitation)
-    WHERE n.headnote IS NOT NULL AND n.citation IS NOT NULL
-      AND NOT (
-        n.topic = m.myTopic
-        AND n.summary = m.mySummary
-        AND n.case_name = m.myCaseName
-        AND (m.warning IS NULL OR m.warning = '[]')
-      )
-    """)
-
-# find duplicate headnote/citation pairs
-duplicates = conn.execute("""
-    SELECT a.index_key, a.mySummary, a.summary, a.headnote, a.citation
-    FROM compareTable a
-    JOIN (
-        SELECT headnote, citation
-        FROM compareTable
-        GROUP BY headnote, citation
-        HAVING COUNT(*) > 1
-    ) b ON (a.headnote = b.headnote AND a.citation = b.citation)
-    ORDER BY a.headnote, a.citation
-""").fetchall()
-
-# group by headnote/citation pair
-from itertools import groupby
-
-delete_keys = []
-my_count = 0
-for row in duplicates:
-    index_key, mySummary, summary, headnote, citation = row
-    score = calcRatio(mySummary, summary) if mySummary else .9
-    if score < .7:
-        delete_keys.append((index_key,))
-        my_count = my_count+1
-        #print_it(f"flagging unpaired duplicates for {headnote}: {citation}, failing score: {score}/1.0"
-
-print_it(f"found {my_count} keys that may need deleted ...")
-conn.executemany(
-    "DELETE FROM compareTable WHERE index_key = ? AND warning = '[]'",
-     delete_keys
-)
-
-conn.execute("DROP VIEW IF EXISTS myDATA")
-conn.execute("DROP VIEW IF EXISTS compare")
-print_it("table built, running comparisons...")
-
-rows = conn.execute("SELECT headnote, citation, topic, myTopic, summary, mySummary, case_name, myCaseName, warning FROM compareTable").fetchall()
-
-updates = []
-for row in rows:
-    headnote, citation, topic, myTopic, summary, mySummary, case_name, myCaseName, warning = row
-    warnings = json.loads(warning) if warning else []
-
-    if topic != myTopic:
-        warnings.append(f"Topic mismatch: new='{topic}' old='{myTopic}'")
-
-    if case_name != myCaseName:
-        warnings.append(f"Case name mismatch: new='{case_name}' old='{myCaseName}'")
-
-    updates.append((json.dumps(warnings), headnote, citation))
-
-print_it("comparisons done, adding index...")
-
-conn.execute("CREATE INDEX idx_compare ON compareTable (headnote, citation)")
-
-print_it("updating table data...")
-
-conn.executemany(
-    "UPDATE compareTable SET warning = ? WHERE headnote = ? AND citation = ?",
-    updates
-)
-
-print(conn.execute("SELECT summary FROM compareTable LIMIT 1").fetchone())
-
-print_it("writing to csv")
-
-rows = conn.execute("SELECT * FROM compareTable").fetchall()
-headers = [d[0] for d in conn.execute("SELECT * FROM compareTable").description]
-
-with open(createOutput, "w", newline="", encoding="utf-8-sig") as f:
-    writer = csv.writer(f)
-    writer.writerow(headers)
-    writer.writerows(rows)
-
-print_it("finished!")
-
-conn.close()  #changes not committed
\ No newline at end of file
+    # collapses runs of whitespace (incl. tabs, newlines & non-breaking spaces) to one space & trims
+    return ' '.join(old.split()) if old else old
+
+def content_hash(record: Dict) -> str:
+    """
+    Hash of a normalized record's compared fields (equal hashes => nothing to report)
+    """
+    content = '\x1f'.join(record[field] or '' for field in CONTENT_FIELDS)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def normalize(record: Dict) -> Dict:
+    """
+    Cleans whitespace in text fields & adds the content hash
+    """
+    normalized = {**record}
+    for field in (*CONTENT_FIELDS, 'citation'):
+        normalized[field] = clean(record.get(field))
+    normalized['hash'] = content_hash(normalized)
+    return normalized
+
+def load_old_data(conn: sqlite3.Connection) -> List[Dict]:
+    """
+    Old headnotes (HN, topic, summary, case name, reporter & "warnings" (array)) from the existing DB
+    Plain joins on the tables' keys; the text is cleaned up in Python afterwards
+    """
+    rows = conn.execute("""
+        SELECT h.headnote_number, t.topic, h.summary, o.case_name, o.reporter, w.message
+        FROM published_headnotes_old AS h
+        LEFT JOIN opinions AS o
+        ON h.opinion_id = o.id
+        LEFT JOIN headnote_topics as t
+        ON h.headnote_number = t.number
+        LEFT JOIN warnings as w
+        ON h.warning_id = w.id
+        """).fetchall()
+    return [normalize({
+        'headnote': headnote, 'topic': topic, 'summary': summary, 'case_name': case_name,
+        'citation': reporter, 'warning': warning
+    }) for headnote, topic, summary, case_name, reporter, warning in rows]
+
+def load_new_data(json_file: str) -> List[Dict]:
+    """
+    New headnotes from luba_docx_parser.py .json or .jsonl (which calls the citation 'reporter')
+    Read one record at a time, so only the cleaned copy is ever held in memory
+    """
+    return [normalize({
+        'index_key': r.get('index'), 'headnote': r.get('headnote'), 'topic': r.get('topic'),
+        'summary': r.get('summary'), 'case_name': r.get('case_name'),
+        'citation': r.get('citation', r.get('reporter')), 'year': r.get('year')
+    }) for r in iter_records(json_file)]
+
+def group_by_key(records: List[Dict]) -> Dict[Tuple, List[Dict]]:
+    """
+    {(headnote, citation): [records]}, in the order records were given
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record['headnote'], record['citation']), []).append(record)
+    return groups
+
+def summary_tokens(summary: str) -> frozenset:
+    """
+    Set of lower-cased words in a summary (compared with Jaccard similarity)
+    """
+    return frozenset(re.findall(r"\w+", (summary or '').lower()))
+
+def quick_bound(old_tokens: frozenset, new_tokens: frozenset) -> float:
+    """
+    Upper bound on jaccard() from the set sizes alone (like SequenceMatcher.quick_ratio, cheap & never too low)
+    """
+    larger = max(len(old_tokens), len(new_tokens))
+    return min(len(old_tokens), len(new_tokens)) / larger if larger else 1.0
+
+def jaccard(old_tokens: frozenset, new_tokens: frozenset) -> float:
+    """
+    Token-set Jaccard similarity, 0 - 1
+    """
+    union = len(old_tokens | new_tokens)
+    return len(old_tokens & new_tokens) / union if union else 1.0
+
+def best_assignment(scores: List[List[float]]) -> List[Tuple[int, int]]:
+    """
+    One-to-one (row, column) pairs with the highest total score (Hungarian algorithm, O(n^3))
+    Works for any rows x columns; the extra rows or columns are left out
+    """
+    transposed = len(scores) > len(scores[0])
+    if transposed:
+        scores = [list(column) for column in zip(*scores)]
+    rows, columns = len(scores), len(scores[0])
+    # minimize cost = -score; 1-based arrays with a dummy 0 entry
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (columns + 1)
+    match = [0] * (columns + 1)
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        column0 = 0
+        min_values = [float('inf')] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column0] = True
+            row0 = match[column0]
+            delta = float('inf')
+            column1 = 0
+            for column in range(1, columns + 1):
+                if not used[column]:
+                    cost = -scores[row0 - 1][column - 1] - u[row0] - v[column]
+                    if cost < min_values[column]:
+                        min_values[column] = cost
+                        way[column] = column0
+                    if min_values[column] < delta:
+                        delta = min_values[column]
+                        column1 = column
+            for column in range(columns + 1):
+                if used[column]:
+                    u[match[column]] += delta
+                    v[column] -= delta
+                else:
+                    min_values[column] -= delta
+            column0 = column1
+            if match[column0] == 0:
+                break
+        while column0:
+            column1 = way[column0]
+            match[column0] = match[column1]
+            column0 = column1
+    pairs = [(match[column] - 1, column - 1) for column in range(1, columns + 1) if match[column]]
+    return sorted((column, row) for row, column in pairs) if transposed else sorted(pairs)
+
+def pair_group(old_group: List[Dict], new_group: List[Dict]) -> Tuple[List[Tuple[Dict, Dict, float]], List[Dict], List[Dict]]:
+    """
+    Pairs old & new records sharing one (headnote, citation) key
+    Identical content pairs first (score 1); a single leftover on each side pairs up whatever its score;
+    otherwise leftovers get the one-to-one pairing with the best total summary similarity (token-set Jaccard),
+    keeping pairs scoring at least PAIR_CUTOFF. Returns (pairs as (old, new, score), unpaired old, unpaired new)
+    """
+    pairs = []
+    old_left = list(old_group)
+    new_left = []
+    for new in new_group:
+        same = next((old for old in old_left if old['hash'] == new['hash']), None)
+        if same is None:
+            new_left.append(new)
+        else:
+            old_left.remove(same)
+            pairs.append((same, new, 1.0))
+    if not old_left or not new_left:
+        return pairs, old_left, new_left
+
+    old_tokens = [summary_tokens(old['summary']) for old in old_left]
+    new_tokens = [summary_tokens(new['summary']) for new in new_left]
+    if len(old_left) == 1 and len(new_left) == 1:
+        return pairs + [(old_left[0], new_left[0], jaccard(old_tokens[0], new_tokens[0]))], [], []
+
+    # pairs that can't reach the cutoff score 0, so they never beat leaving both unpaired
+    scores = [[0.0] * len(new_left) for _ in old_left]
+    for i, old_set in enumerate(old_tokens):
+        for j, new_set in enumerate(new_tokens):
+            if quick_bound(old_set, new_set) >= PAIR_CUTOFF:
+                score = jaccard(old_set, new_set)
+                scores[i][j] = score if score >= PAIR_CUTOFF else 0.0
+
+    paired_old = set()
+    paired_new = set()
+    for i, j in best_assignment(scores):
+        if scores[i][j] >= PAIR_CUTOFF:
+            pairs.append((old_left[i], new_left[j], scores[i][j]))
+            paired_old.add(i)
+            paired_new.add(j)
+    return (pairs, [old for i, old in enumerate(old_left) if i not in paired_old],
+            [new for j, new in enumerate(new_left) if j not in paired_new])
+
+def compare(old_data: List[Dict], new_data: List[Dict]) -> Dict:
+    """
+    Change set between old & new headnotes: {'added', 'removed', 'changed', 'unchanged' (count)}
+    changed entries hold both versions, the fields that differ & how well the summaries matched (match_score)
+    """
+    old_groups = group_by_key(old_data)
+    new_groups = group_by_key(new_data)
+    changes = {'added': [], 'removed': [], 'changed': [], 'unchanged': 0}
+
+    for key, new_group in new_groups.items():
+        if None in key:
+            # no headnote number or citation, so it can't be matched up: added here & removed on the old side
+            changes['added'].extend(new_group)
+            continue
+        pairs, removed, added = pair_group(old_groups.get(key, []), new_group)
+        changes['added'].extend(added)
+        changes['removed'].extend(removed)
+        for old, new, score in pairs:
+            if old['hash'] == new['hash'] and not old_warnings(old):
+                changes['unchanged'] += 1
+            else:
+                fields = [field for field in CONTENT_FIELDS if old[field] != new[field]]
+                changes['changed'].append({'key': list(key), 'fields': fields, 'match_score': round(score, 3),
+                                           'old': old, 'new': new})
+
+    for key, old_group in old_groups.items():
+        if key not in new_groups or None in key:
+            changes['removed'].extend(old_group)
+    return changes
+
+def old_warnings(old: Dict) -> List[str]:
+    """
+    Warnings stored with an old record (JSON array text)
+    """
+    return json.loads(old['warning']) if old.get('warning') else []
+
+def csv_rows(changes: Dict) -> List[List]:
+    """
+    One CSV row per added or changed headnote (new vs old values), with mismatches listed in warning
+    """
+    rows = []
+    for new in changes['added']:
+        unkeyed = None in (new['headnote'], new['citation'])
+        warnings = ["No headnote number or citation, so it can't be matched to an old headnote"] if unkeyed else []
+        rows.append([new['index_key'], 'added', new['headnote'], new['citation'], new['topic'], None,
+                     new['summary'], None, new['case_name'], None, None, json.dumps(warnings)])
+    for change in changes['changed']:
+        old, new = change['old'], change['new']
+        warnings = old_warnings(old)
+        if 'topic' in change['fields']:
+            warnings.append(f"Topic mismatch: new='{new['topic']}' old='{old['topic']}'")
+        if 'case_name' in change['fields']:
+            warnings.append(f"Case name mismatch: new='{new['case_name']}' old='{old['case_name']}'")
+        rows.append([new['index_key'], 'changed', new['headnote'], new['citation'], new['topic'], old['topic'],
+                     new['summary'], old['summary'], new['case_name'], old['case_name'], change['match_score'],
+                     json.dumps(warnings)])
+    return rows
+
+def write_outputs(changes: Dict, csv_file: str, json_file: str):
+    """
+    Writes the change set as JSON & the rows to check as CSV
+    """
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(changes, f, indent=2, ensure_ascii=False)
+    with open(csv_file, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        writer.writerows(csv_rows(changes))
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Compare an existing luba.db with newly parsed headnotes")
+    arg_parser.add_argument('old_db', nargs='?', default=lubaDB, help=f"existing database (default {lubaDB})")
+    arg_parser.add_argument('new_json', nargs='?', default=newJson, help=f"parsed headnotes .json or .jsonl (default {newJson})")
+    arg_parser.add_argument('--metrics', metavar='RESULTS_JSON',
+                            help="add stage times to this Headnotes_Results_*.json (metrics.compare)")
+    arg_parser.add_argument('--profile', action='store_true', help="profile the run (cProfile & peak memory)")
+    args = arg_parser.parse_args()
+    metrics = Metrics(profile=args.profile)
+
+    print_it("loading old & new data...")
+    with metrics.stage('SQL read'):
+        conn = sqlite3.connect(args.old_db)
+        old_data = load_old_data(conn)
+        conn.close()
+    with metrics.stage('JSON read'):
+        new_data = load_new_data(args.new_json)
+
+    print_it("comparing old and new data ...")
+    with metrics.stage('compare'):
+        changes = compare(old_data, new_data)
+    print_it(f"{len(changes['added'])} added, {len(changes['removed'])} removed, "
+             f"{len(changes['changed'])} changed, {changes['unchanged']} unchanged")
+    metrics.count('old headnotes', len(old_data))
+    metrics.count('new headnotes', len(new_data))
+    for kind in ('added', 'removed', 'changed'):
+        metrics.count(kind, len(changes[kind]))
+    metrics.count('unchanged', changes['unchanged'])
+
+    print_it("writing change set & csv")
+    with metrics.stage('CSV export'):
+        write_outputs(changes, createOutput, createChangeSet)
+    metrics.finish(profile_path_for(args.metrics or createChangeSet, 'compare') if args.profile else None)
+    if args.metrics:
+        metrics.save(args.metrics, 'compare')
+    metrics.report()
+    print_it(f"finished in {metrics.to_dict()['total_seconds']:.2f}s!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Citation extractor for LUBA headnote summaries
+Finds ORS, OAR and case reporter cites in a single pass over each summary
+Used by luba_docx_parser.py; to re-extract cites in an existing headnotes file type
+'python citation_extractor.py <headnotes.json>'
+"""
+
+import re, json
+from typing import List, Dict, Iterable, Iterator
+
+# One alternation per kind of cite, tried left to right at each position in the summary
+# (every cite starts with a digit; the lookahead lets the scan skip over plain text quickly)
+CITE_PATTERN = re.compile(r'''
+  (?=\d)(?:
+    (?P<ors>\d{1,3}[A-C]?\.\d{3,4})(?=\D)                           # ORS 197.829, 215.283
+  | (?P<oar>(?P<oar_div>\d{3})-(?P<oar_rule>\d{2,4})-(?P<oar_sec>\d{2,4}))(?=\D)  # OAR 660-012-0060
+  | (?P<oregon>\d{1,3}\sOr\.?\s*(?:App\.?|LUBA)?\s*\d{1,4})          # 310 Or 1, 146 Or App 191, 35 Or LUBA 1
+  | (?P<us>\d{1,3}\sU\.?S\.?\s\d{1,4})                               # 512 US 374
+  | (?P<regional>\d{1,3}\s(?:F|P)\.?\dd\s\d{1,4})                    # 931 P2d 833, 53 F3d 1
+  )''', re.VERBOSE)
+
+# kinds that get lumped together as 'case_cites' in the headnote data
+CASE_KINDS = ('oregon', 'us', 'regional')
+
+def normalize_oar(division: str, rule: str, section: str) -> str:
+    """
+    Pads OAR cite pieces to standard 3-3-4 form (660-12-60 => 660-012-0060)
+    """
+    return f"{int(division):03d}-{int(rule):03d}-{int(section):04d}"
+
+def iter_citations(summary: str) -> Iterator[tuple]:
+    """
+    Yields (kind, cite) for every cite in summary, in order found
+    kind is one of 'ors', 'oar', 'oregon', 'us' or 'regional'
+    """
+    for match in CITE_PATTERN.finditer(summary):
+        kind = match.lastgroup
+        if kind == 'oar':
+            yield 'oar', normalize_oar(match.group('oar_div'), match.group('oar_rule'), match.group('oar_sec'))
+        else:
+            yield kind, match.group(kind)
+
+def extract_citations(summary: str) -> Dict[str, List[str]]:
+    """
+    Returns {ors_cites, oar_cites, case_cites} for a summary, without duplicates, in first-seen order
+    """
+    ors_cites = {}
+    oar_cites = {}
+    case_cites = {}
+    for kind, cite in iter_citations(summary):
+        if kind == 'ors':
+            ors_cites[cite] = None
+        elif kind == 'oar':
+            oar_cites[cite] = None
+        elif kind in CASE_KINDS:
+            case_cites[cite] = None
+    return {
+        'ors_cites': list(ors_cites),
+        'oar_cites': list(oar_cites),
+        'case_cites': list(case_cites)
+    }
+
+def extract_citations_batch(summaries: Iterable[str]) -> List[Dict[str, List[str]]]:
+    """
+    extract_citations for a list of summaries (e.g. every headnote in the corpus)
+    """
+    return [extract_citations(summary or '') for summary in summaries]
+
+# entry into program
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Headnotes file missing. Type 'python citation_extractor.py <headnotes.json>'")
+        sys.exit(1)
+
+    headnotes_file = sys.argv[1]
+    with open(headnotes_file, 'r', encoding='utf-8') as f:
+        headnotes = json.load(f)
+
+    all_cites = extract_citations_batch(h.get('summary') for h in headnotes)
+    changed = 0
+    for headnote, cites in zip(headnotes, all_cites):
+        if any(headnote.get(key) != value for key, value in cites.items()):
+            changed += 1
+        headnote.update(cites)
+
+    with open(headnotes_file, 'w', encoding='utf-8') as f:
+        json.dump(headnotes, f, indent=2, ensure_ascii=False)
+
+    print(f"Re-extracted cites for {len(headnotes)} headnotes ({changed} changed); saved to {headnotes_file}")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of parsed headnotes, keyed by a hash of each headnote's paragraph XML
+Used by luba_docx_parser.py (--cache) so a re-import only re-parses headnotes that changed,
+and by split_word_doc_by_headnote.py to skip rewriting split files that haven't changed
+"""
+
+import hashlib, json, sqlite3
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+# attributes Word rewrites on every edit session without changing the content
+VOLATILE_ATTRIBUTES = ('rsidR', 'rsidRPr', 'rsidRDefault', 'rsidP', 'rsidDel', 'rsidTr', 'paraId', 'textId')
+# new entries are written this many at a time, so they don't pile up in memory & a crash keeps what was parsed
+WRITE_BATCH = 1000
+
+def normalized_xml(elem) -> str:
+    """
+    Paragraph XML reduced to tags, (non-volatile) attributes & text, in a form that's the same
+    whether the element came from python-docx (lxml) or ElementTree
+    """
+    if not isinstance(elem, ET.Element):
+        # python-docx element: its classes override .text, so reparse it as plain ElementTree
+        from lxml import etree
+        elem = ET.fromstring(etree.tostring(elem))
+    parts = []
+    for node in elem.iter():
+        if not isinstance(node.tag, str):
+            continue  # comments & processing instructions
+        attributes = sorted(
+            (name, value) for name, value in node.attrib.items()
+            if name.rsplit('}', 1)[-1] not in VOLATILE_ATTRIBUTES
+        )
+        parts.append(f"<{node.tag}{attributes}>{node.text or ''}")
+        if node is not elem:
+            parts.append(f"</>{node.tail or ''}")
+    return ''.join(parts)
+
+def hash_paragraphs(elems) -> str:
+    """
+    Content hash for a group of paragraph elements (e.g. all paragraphs in one headnote)
+    """
+    return hash_normalized(normalized_xml(elem) for elem in elems)
+
+def hash_normalized(normalized_parts) -> str:
+    """
+    Content hash from already normalized paragraph XML (for readers that drop each element once read)
+    """
+    hasher = hashlib.sha256()
+    for part in normalized_parts:
+        hasher.update(part.encode('utf-8'))
+    return hasher.hexdigest()
+
+class HeadnoteCache:
+    """
+    SQLite file of {content hash: parsed headnote JSON}
+    New entries are written every WRITE_BATCH; entries not used during a run are evicted when finish() is called
+    (version is added to every key, so changing it throws out results from older parser code)
+    Use it as a context manager, so the file is closed (with the entries so far written) if the run fails
+    """
+    def __init__(self, path: str, version: str = '', batch: int = WRITE_BATCH):
+        self.path = path
+        self.version = version
+        self.batch = batch
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS parsed (hash TEXT PRIMARY KEY, headnote TEXT)")
+        self.seen = set()
+        self.new_entries = []
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Cached parse result for this hash (None if not cached)
+        """
+        key = f"{self.version}:{key}"
+        row = self.conn.execute("SELECT headnote FROM parsed WHERE hash = ?", (key,)).fetchone()
+        self.seen.add(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, parsed: Dict):
+        """
+        Saves a parse result (written to disk with the rest of its batch)
+        """
+        key = f"{self.version}:{key}"
+        self.seen.add(key)
+        self.new_entries.append((key, json.dumps(parsed, ensure_ascii=False)))
+        if len(self.new_entries) >= self.batch:
+            self.write()
+
+    def write(self):
+        """
+        Writes the new entries not yet on disk
+        """
+        if self.new_entries:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO parsed VALUES (?, ?)", self.new_entries)
+            self.new_entries = []
+
+    def finish(self) -> Dict:
+        """
+        Writes new entries, evicts ones that weren't seen this run, closes the file & returns hit/miss stats
+        """
+        self.write()
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE seen (hash TEXT PRIMARY KEY)")
+            self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in self.seen))
+            self.evicted = self.conn.execute(
+                "DELETE FROM parsed WHERE hash NOT IN (SELECT hash FROM seen)").rowcount
+            self.conn.execute("DROP TABLE seen")
+        self.close()
+        return self.stats()
+
+    def close(self):
+        """
+        Writes new entries & closes the file, without evicting anything (safe to call more than once)
+        """
+        if self.conn is not None:
+            try:
+                self.write()
+            finally:
+                self.conn.close()
+                self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss/evicted counts for this run
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted}
+
+    def split_chunk(self, chunk: List[tuple]) -> tuple:
+        """
+        Splits a chunk of (index, raw headnote) into {index: cached result} and the list still needing parsing
+        """
+        cached = {}
+        misses = []
+        for i, raw_headnote in chunk:
+            parsed = self.get(raw_headnote['source_hash'])
+            if parsed is None:
+                misses.append((i, raw_headnote))
+            else:
+                cached[i] = parsed
+        return cached, misses
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Reading & writing headnote (or opinion) records as JSON Lines: one JSON object per line,
+so a file can be written as records are made & read back one record at a time
+Used by luba_docx_parser.py (--jsonl), luba_db_build.py & build_db_compare.py
+"""
+
+import json, sqlite3
+from typing import Dict, Iterable, Iterator, List
+
+# rows per executemany when feeding SQLite (memory use depends on this, not on the size of the file)
+BATCH_SIZE = 500
+
+def write_record(f, record: Dict):
+    """
+    Writes one record as a line of JSON
+    """
+    f.write(json.dumps(record, ensure_ascii=False))
+    f.write('\n')
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """
+    Yields records from a .jsonl file one line at a time
+    (plain .json arrays, as older parser runs wrote, are loaded whole & then yielded)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def iter_batches(items: Iterable, size: int = BATCH_SIZE) -> Iterator[List]:
+    """
+    Groups items into lists of (at most) size
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def insert_batches(conn: sqlite3.Connection, sql: str, rows: Iterable, size: int = BATCH_SIZE) -> int:
+    """
+    executemany(sql) over rows, size rows at a time; returns number of rows inserted
+    """
+    count = 0
+    for batch in iter_batches(rows, size):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Hand-written scanners for the pieces of a LUBA headnote:
+  <number> <topic>. <summary> <case name>, <reporter or LUBA No> (<date>).
+Each one walks the text once (no regex backtracking) & gives the same answer as the regular expressions
+luba_docx_parser.py used to use (noted above each function). Used by extract_headnote_data.
+"""
+
+import time
+from typing import Optional, Tuple
+
+# characters the topic can't end on, so "U.S." or "197.xxx" don't end it early
+TOPIC_END_EXCLUDED = set('STU0123456789')
+
+# how often (in characters) the scanners check their time budget
+BUDGET_CHECK_EVERY = 4096
+
+class TimeBudget:
+    """
+    Per-headnote time limit. Scanners give up (return None) once it has run out & set .expired,
+    so a pathological headnote gets flagged rather than stalling the import
+    """
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds if seconds else None
+        self.expired = False
+
+    def check(self) -> bool:
+        """
+        True if the budget has run out
+        """
+        if self.deadline is not None and not self.expired and time.perf_counter() > self.deadline:
+            self.expired = True
+        return self.expired
+
+def find_topic(raw_text: str, budget: TimeBudget = None) -> Optional[Tuple[str, int]]:
+    """
+    Same as re.search(r'^(?:[\\d.]{2,}\\s+)([\\s\\S]+?[^S-U0-9]\\.)', raw_text)
+    Returns (topic text incl. final period, end position) or None
+    """
+    n = len(raw_text)
+
+    # headnote number (digits & dots, at least two)
+    pos = 0
+    while pos < n and (raw_text[pos] == '.' or raw_text[pos].isdecimal()):
+        pos += 1
+    if pos < 2:
+        return None
+
+    # whitespace after the number
+    ws_start = pos
+    while pos < n and raw_text[pos].isspace():
+        pos += 1
+    ws_len = pos - ws_start
+    if ws_len < 1:
+        return None
+    start = pos
+
+    # first period at least two characters in, not preceded by S, T, U or a digit
+    dot = raw_text.find('.', start + 2)
+    checked = 0
+    while dot != -1:
+        if raw_text[dot - 1] not in TOPIC_END_EXCLUDED:
+            return raw_text[start:dot + 1], dot + 1
+        checked += 1
+        if budget and not checked % 64 and budget.check():
+            return None
+        dot = raw_text.find('.', dot + 1)
+
+    # regex would backtrack into the whitespace after the number & accept a one character "topic"
+    if ws_len >= 2 and start + 1 < n and raw_text[start + 1] == '.' and raw_text[start] not in TOPIC_END_EXCLUDED:
+        return raw_text[start - 1:start + 2], start + 2
+    if ws_len >= 3 and start < n and raw_text[start] == '.':
+        return raw_text[start - 2:start + 1], start + 1
+    return None
+
+def find_last_case_name(raw_text: str, budget: TimeBudget = None) -> Optional[str]:
+    """
+    Same as re.findall(r'\\S*?\\sv\\.\\s[\\s\\S]*?,', raw_text)[-1]
+    i.e. the last "<word> v. <anything up to a comma>," in the text (None if there isn't one)
+    """
+    n = len(raw_text)
+    last = None
+    i = 0
+    next_check = BUDGET_CHECK_EVERY
+    while i < n:
+        if budget and i >= next_check:
+            next_check = i + BUDGET_CHECK_EVERY
+            if budget.check():
+                return None
+
+        # a match starting at i needs " v. " right after the run of non-space characters starting at i
+        j = i
+        while j < n and not raw_text[j].isspace():
+            j += 1
+        if j + 3 >= n:
+            break
+        if raw_text[j + 1] == 'v' and raw_text[j + 2] == '.' and raw_text[j + 3].isspace():
+            comma = raw_text.find(',', j + 4)
+            if comma == -1:
+                break  # later matches would need a comma too
+            last = raw_text[i:comma + 1]
+            i = comma + 1
+        else:
+            i = j + 1  # every start inside this run fails the same way
+    return last
+
+def find_reporter(text: str, budget: TimeBudget = None) -> Optional[Tuple[str, str]]:
+    """
+    Same as re.search(r'\\s*(\\d+\\s+Or\\s+LUBA\\s+\\d+)\\s+\\((\\d{4})\\)', text)
+    Returns (reporter "VV Or LUBA PPP", year) or None
+    """
+    n = len(text)
+    i = 0
+    next_check = BUDGET_CHECK_EVERY
+    while i < n:
+        if budget and i >= next_check:
+            next_check = i + BUDGET_CHECK_EVERY
+            if budget.check():
+                return None
+
+        if not text[i].isdecimal():
+            i += 1
+            continue
+        run_end = _skip_decimals(text, i)
+        pos = _skip_spaces_then(text, run_end, 'Or')
+        pos = _skip_spaces_then(text, pos, 'LUBA')
+        pos = _skip_spaces_then(text, pos, '')
+        if pos != -1:
+            page_end = _skip_decimals(text, pos)
+            paren = _skip_spaces_then(text, page_end, '(') if page_end > pos else -1
+            if paren != -1 and _skip_decimals(text, paren, 4) == paren + 4 and text.startswith(')', paren + 4):
+                return text[i:page_end], text[paren:paren + 4]
+        i = run_end  # starting later in the same run of digits can't match either
+    return None
+
+def find_luba_no(text: str, budget: TimeBudget = None) -> Optional[Tuple[str, str]]:
+    """
+    Same as re.search(r'LUBA Nos? \\d{4}-([0-9/-])+\\s\\(\\w{3,4}\\s\\d{1,2},\\s(\\d{4})\\)', text)
+    Returns (whole match "LUBA No YYYY-NNN (Mon DD, YYYY)", year) or None
+    """
+    n = len(text)
+    start = text.find('LUBA No')
+    checked = 0
+    while start != -1:
+        checked += 1
+        if budget and not checked % 64 and budget.check():
+            return None
+
+        pos = start + 7
+        if text.startswith('s', pos):
+            pos += 1
+        if text.startswith(' ', pos):
+            end = _match_luba_no_rest(text, pos + 1, n)
+            if end is not None:
+                return text[start:end], text[end - 5:end - 1]
+        start = text.find('LUBA No', start + 1)
+    return None
+
+def _match_luba_no_rest(text: str, pos: int, n: int) -> Optional[int]:
+    """
+    Matches '\\d{4}-([0-9/-])+\\s\\(\\w{3,4}\\s\\d{1,2},\\s(\\d{4})\\)' at pos, returning end position or None
+    """
+    # \d{4}-
+    if _skip_decimals(text, pos, 4) != pos + 4 or not text.startswith('-', pos + 4):
+        return None
+    pos += 5
+    # [0-9/-]+\s  (the character class can't contain whitespace, so it takes the whole run)
+    run_start = pos
+    while pos < n and text[pos] in '0123456789/-':
+        pos += 1
+    if pos == run_start:
+        return None
+    if not (pos < n and text[pos].isspace()):
+        return None
+    pos += 1
+    # \(\w{3,4}\s
+    if not text.startswith('(', pos):
+        return None
+    pos += 1
+    word_end = pos
+    while word_end < n and (text[word_end].isalnum() or text[word_end] == '_') and word_end - pos < 5:
+        word_end += 1
+    if not 3 <= word_end - pos <= 4 or not (word_end < n and text[word_end].isspace()):
+        return None
+    pos = word_end + 1
+    # \d{1,2},\s
+    day_end = _skip_decimals(text, pos, 3)
+    if not 1 <= day_end - pos <= 2 or not text.startswith(',', day_end):
+        return None
+    pos = day_end + 1
+    if not (pos < n and text[pos].isspace()):
+        return None
+    pos += 1
+    # (\d{4})\)
+    if _skip_decimals(text, pos, 4) != pos + 4 or not text.startswith(')', pos + 4):
+        return None
+    return pos + 5
+
+def _skip_decimals(text: str, pos: int, limit: int = None) -> int:
+    """
+    Position after the run of digits starting at pos (stops after limit digits, if given)
+    """
+    end = len(text) if limit is None else min(len(text), pos + limit)
+    while pos < end and text[pos].isdecimal():
+        pos += 1
+    return pos
+
+def _skip_spaces(text: str, pos: int) -> int:
+    """
+    Position after the run of whitespace starting at pos
+    """
+    n = len(text)
+    while pos < n and text[pos].isspace():
+        pos += 1
+    return pos
+
+def _skip_spaces_then(text: str, pos: int, word: str) -> int:
+    """
+    Matches whitespace then <word> at pos; returns position after word, or -1 (also -1 if pos is already -1)
+    """
+    if pos == -1:
+        return -1
+    after_space = _skip_spaces(text, pos)
+    if after_space == pos or not text.startswith(word, after_space):
+        return -1
+    return after_space + len(word)
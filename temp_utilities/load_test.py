@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Load test for the Datasette site: starts a local 'datasette serve' with this repo's templates, static files & plugins
+(or uses --url), then replays a weighted mix of the site's real traffic with N concurrent clients:
+  example   the sql_examples.js queries
+  outline   headnote_list.html links (headnote number => headnote_sort range, like add_links.js outlineSQL)
+  cite      ORS/OAR/case cite links (add_links.js citeSQL), cites picked from the database
+  opinion   "Cited by" & "Cites" links (citedBySQL, citesSQL) for random headnotes
+  docket    LUBA No links (docketSQL)
+  browse    "Browse all headnotes" & its Next pages
+Reports requests, errors, p50/p95/p99 latency, requests/s & response size per kind (--json saves them to compare runs)
+Keep the SQL below in step with add_links.js
+to run type 'python load_test.py [luba.db] [--concurrency 8] [--duration 30] [--no-cache] [--url http://...]'
+"""
+
+import asyncio, json, os, random, re, shutil, sqlite3, subprocess, sys, tempfile, time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import quote, urljoin
+import httpx
+
+# CONFIG ********
+lubaDB = "../luba.db"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PORT = 8765
+CONCURRENCY = 8
+DURATION = 30           # seconds of load (after warm up)
+WARM_UP = 3             # seconds of requests not counted (fills caches like the live site's)
+# ********
+
+# share of traffic for each kind of request
+WEIGHTS = {'example': 3, 'outline': 3, 'cite': 2, 'opinion': 1, 'docket': 1, 'browse': 1}
+
+# values sampled from the database for the cite, opinion & docket links
+SAMPLE_SIZE = 200
+BROWSE_PAGES = 10       # Next pages followed from "Browse all headnotes"
+SERVER_START_TIMEOUT = 60
+REQUEST_TIMEOUT = 60
+CACHE_PLUGIN = 'response_cache.py'   # left out by --no-cache
+
+EXAMPLE_PATTERN = re.compile(r'label:\s*"([^"]+)",\s*sql:\s*`([^`]*)`')
+HEAD_NUMBER_PATTERN = re.compile(r'class="head-number">([\d.]+)<')
+BROWSE_LINK_PATTERN = re.compile(r'<a href="([^"]+)">Browse all headnotes</a>')
+NEXT_LINK_PATTERN = re.compile(r'<a href="([^"]+)"[^>]*>\s*Next')
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+def quote_sql(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def cite_sql(kinds: List[str], cite: str) -> str:
+    kind_list = ', '.join(quote_sql(kind) for kind in kinds)
+    return (f"SELECT * FROM headnotes WHERE rowid IN (SELECT headnote_rowid FROM headnote_citations "
+            f"WHERE kind IN ({kind_list}) AND cite = {quote_sql(cite)}) ORDER BY year DESC")
+
+def outline_sql(number: str) -> str:
+    levels = [int(level) for level in number.split('.') if level]
+    base = 1000
+    start = sum(level * base ** (3 - depth) for depth, level in enumerate(levels))
+    span = base ** (4 - len(levels))
+    return f"SELECT * FROM headnotes WHERE headnote_sort BETWEEN {start} AND {start + span - 1} ORDER BY headnote_sort ASC, year DESC"
+
+def cited_by_sql(rowid: int) -> str:
+    return (f"SELECT * FROM headnotes WHERE rowid IN (SELECT c.headnote_rowid FROM headnote_opinions AS d "
+            f"JOIN headnote_opinions AS c ON c.opinion_rowid = d.opinion_rowid AND c.relation = 'cites' "
+            f"WHERE d.headnote_rowid = {rowid} AND d.relation = 'decided') ORDER BY year DESC")
+
+def cites_sql(rowid: int) -> str:
+    return (f"SELECT * FROM headnotes WHERE rowid IN (SELECT d.headnote_rowid FROM headnote_opinions AS c "
+            f"JOIN headnote_opinions AS d ON d.opinion_rowid = c.opinion_rowid AND d.relation = 'decided' "
+            f"WHERE c.headnote_rowid = {rowid} AND c.relation = 'cites') ORDER BY year DESC")
+
+def docket_sql(key: str) -> str:
+    return (f"SELECT * FROM headnotes WHERE rowid IN (SELECT headnote_rowid FROM headnote_opinions "
+            f"WHERE relation = 'decided' AND opinion_rowid IN (SELECT opinion_rowid FROM opinion_keys "
+            f"WHERE key = {quote_sql(key)})) ORDER BY year DESC, reporter ASC, headnote ASC")
+
+def query_path(database: str, sql: str) -> str:
+    return f"/{database}?sql={quote(sql, safe='')}"
+
+def build_workload(db_path: str, rng: random.Random) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    {kind: [(label, path)]} for every kind but browse (found from the running site)
+    """
+    database = Path(db_path).stem
+    examples = EXAMPLE_PATTERN.findall((REPO_ROOT / 'static' / 'sql_examples.js').read_text(encoding='utf-8'))
+    numbers = HEAD_NUMBER_PATTERN.findall((REPO_ROOT / 'templates' / 'headnote_list.html').read_text(encoding='utf-8'))
+    workload = {
+        'example': [(label, query_path(database, sql.strip())) for label, sql in examples],
+        'outline': [(number, query_path(database, outline_sql(number))) for number in dict.fromkeys(numbers)],
+    }
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    cites = conn.execute("SELECT kind, cite FROM headnote_citations GROUP BY kind, cite ORDER BY random() LIMIT ?",
+                         (SAMPLE_SIZE,)).fetchall()
+    kinds = {'ors': ['ors'], 'oar': ['oar']}  # case & reporter cites are searched together, like add_links.js
+    workload['cite'] = [(f"{kind} {cite}", query_path(database, cite_sql(kinds.get(kind, ['reporter', 'case']), cite)))
+                        for kind, cite in cites]
+    rowids = [rowid for rowid, in conn.execute("SELECT rowid FROM headnotes ORDER BY random() LIMIT ?", (SAMPLE_SIZE,))]
+    workload['opinion'] = [(f"cited by {rowid}", query_path(database, cited_by_sql(rowid))) for rowid in rowids]
+    workload['opinion'] += [(f"cites {rowid}", query_path(database, cites_sql(rowid))) for rowid in rowids]
+    keys = [key for key, in conn.execute("SELECT DISTINCT key FROM opinion_keys WHERE key LIKE 'LUBA No %' "
+                                         "ORDER BY random() LIMIT ?", (SAMPLE_SIZE,))]
+    workload['docket'] = [(key, query_path(database, docket_sql(key))) for key in keys]
+    conn.close()
+    return workload
+
+async def browse_paths(client: httpx.AsyncClient, database: str) -> List[Tuple[str, str]]:
+    """
+    "Browse all headnotes" from the database page & the Next pages after it
+    """
+    page = (await client.get(f"/{database}")).text
+    match = BROWSE_LINK_PATTERN.search(page)
+    paths = []
+    path = match.group(1).replace('&amp;', '&') if match else None
+    while path and len(paths) < BROWSE_PAGES:
+        paths.append((f"page {len(paths) + 1}", path))
+        match = NEXT_LINK_PATTERN.search((await client.get(path)).text)
+        path = urljoin(path, match.group(1).replace('&amp;', '&')) if match else None
+    return paths
+
+def start_server(db_path: str, port: int, plugins_dir: Path) -> subprocess.Popen:
+    """
+    datasette serve -i (immutable, like the hosted site) with the repo's templates, static files & plugins_dir
+    """
+    command = [sys.executable, '-m', 'datasette', 'serve', '-i', db_path, '--port', str(port),
+               '--template-dir', str(REPO_ROOT / 'templates'), '--static', f"static:{REPO_ROOT / 'static'}",
+               '--plugins-dir', str(plugins_dir)]
+    inspect_file = Path(db_path).with_name('inspect-data.json')
+    if inspect_file.exists():
+        command += ['--inspect-file', str(inspect_file)]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_for_server(client: httpx.AsyncClient, server: subprocess.Popen):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server and server.poll() is not None:
+            raise RuntimeError("datasette exited on startup (is it installed? is the port free?)")
+        try:
+            if (await client.get('/-/versions.json')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"datasette not answering after {SERVER_START_TIMEOUT}s")
+
+def percentile(ordered: List[float], share: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered) + 0.5) - 1))]
+
+async def run_load(client: httpx.AsyncClient, workload: Dict[str, List[Tuple[str, str]]], concurrency: int,
+                   duration: float, warm_up: float, rng: random.Random) -> Tuple[Dict[str, Dict], float]:
+    """
+    concurrency clients each sending one request after another (kind by WEIGHTS, then a random one of that kind)
+    Returns ({kind: {'latencies', 'sizes', 'errors'}}, seconds measured)
+    """
+    kinds = [kind for kind in WEIGHTS if workload.get(kind)]
+    weights = [WEIGHTS[kind] for kind in kinds]
+    results = {kind: {'latencies': [], 'sizes': [], 'errors': 0} for kind in kinds}
+    start = time.monotonic()
+    measure_from = start + warm_up
+    stop_at = measure_from + duration
+
+    async def client_loop():
+        while True:
+            sent = time.monotonic()
+            if sent >= stop_at:
+                return
+            kind = rng.choices(kinds, weights)[0]
+            label, path = rng.choice(workload[kind])
+            try:
+                response = await client.get(path)
+                ok = response.status_code == 200
+                size = len(response.content)
+            except httpx.HTTPError:
+                ok, size = False, 0
+            if sent < measure_from:
+                continue
+            if ok:
+                results[kind]['latencies'].append(time.monotonic() - sent)
+                results[kind]['sizes'].append(size)
+            else:
+                results[kind]['errors'] += 1
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return results, time.monotonic() - measure_from
+
+def summarize(results: Dict[str, Dict], seconds: float) -> Dict[str, Dict]:
+    """
+    {kind (& 'all'): requests, errors, p50/p95/p99 ms, requests/s, mean KB}
+    """
+    summary = {}
+    everything = {'latencies': [], 'sizes': [], 'errors': 0}
+    for kind, result in list(results.items()) + [('all', everything)]:
+        if kind != 'all':
+            everything['latencies'] += result['latencies']
+            everything['sizes'] += result['sizes']
+            everything['errors'] += result['errors']
+        ordered = sorted(result['latencies'])
+        summary[kind] = {
+            'requests': len(ordered), 'errors': result['errors'],
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+            'per_second': round(len(ordered) / seconds, 1),
+            'mean_kb': round(sum(result['sizes']) / len(result['sizes']) / 1024, 1) if result['sizes'] else 0.0,
+        }
+    return summary
+
+def report(summary: Dict[str, Dict]):
+    print(f"  {'kind':>8} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'mean KB':>8}")
+    for kind, row in summary.items():
+        print(f"  {kind:>8} {row['requests']:>9} {row['errors']:>7} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+              f"{row['p99_ms']:>8} {row['per_second']:>8} {row['mean_kb']:>8}")
+
+async def main(args) -> Dict:
+    rng = random.Random(args.seed)
+    server = None
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    # the templates need the other plugins, so --no-cache serves a copy of plugins/ without the response cache
+    plugins_copy = tempfile.TemporaryDirectory()
+    plugins_dir = REPO_ROOT / 'plugins'
+    if args.no_cache:
+        plugins_dir = Path(shutil.copytree(plugins_dir, Path(plugins_copy.name) / 'plugins',
+                                           ignore=shutil.ignore_patterns(CACHE_PLUGIN, '__pycache__')))
+    if not args.url:
+        print_it(f"starting datasette on port {args.port} ({'without' if args.no_cache else 'with'} the response cache) ...")
+        server = start_server(args.db_path, args.port, plugins_dir)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=REQUEST_TIMEOUT) as client:
+            await wait_for_server(client, server)
+            workload = build_workload(args.db_path, rng)
+            workload['browse'] = await browse_paths(client, Path(args.db_path).stem)
+            print_it("workload: " + ', '.join(f"{kind} {len(paths)}" for kind, paths in workload.items()))
+            print_it(f"{args.concurrency} clients for {args.duration}s (after {args.warm_up}s warm up) ...")
+            results, seconds = await run_load(client, workload, args.concurrency, args.duration, args.warm_up, rng)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        plugins_copy.cleanup()
+    return summarize(results, seconds)
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Replay the site's query mix against datasette & report latency")
+    arg_parser.add_argument('db_path', nargs='?', default=lubaDB, help=f"database (default {lubaDB}; also read for sample values)")
+    arg_parser.add_argument('--concurrency', type=int, default=CONCURRENCY, metavar='N', help=f"simultaneous clients (default {CONCURRENCY})")
+    arg_parser.add_argument('--duration', type=float, default=DURATION, metavar='SECONDS', help=f"measured seconds (default {DURATION})")
+    arg_parser.add_argument('--warm-up', type=float, default=WARM_UP, metavar='SECONDS', help=f"unmeasured seconds first (default {WARM_UP})")
+    arg_parser.add_argument('--port', type=int, default=PORT, help=f"port for the local server (default {PORT})")
+    arg_parser.add_argument('--url', help="test an already running site instead of starting one (e.g. http://127.0.0.1:8001)")
+    arg_parser.add_argument('--no-cache', action='store_true', help=f"serve without the response cache (plugins/{CACHE_PLUGIN})")
+    arg_parser.add_argument('--seed', type=int, default=1, help="random seed for the sampled values & request order")
+    arg_parser.add_argument('--json', metavar='FILE', help="also save the results as JSON")
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        print(f"Error. Database not found at: {args.db_path}")
+        sys.exit(1)
+    summary = asyncio.run(main(args))
+    report(summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': {key: value for key, value in vars(args).items() if key != 'json'}, 'results': summary},
+                      f, indent=2)
+        print_it(f"saved results to {args.json}")
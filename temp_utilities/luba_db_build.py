@@ -0,0 +1,665 @@
+#!/usr/bin/env python3
+"""
+Builds luba.db (the database Datasette serves) from the headnotes JSON (luba_docx_parser.py,
+or headnote_opinion_combiner.js output) & the opinions JSON (luba_scraper.js), then adds search
+indexes & other derived tables
+to build type 'python luba_db_build.py --headnotes <headnotes.json> --opinions <opinions.json> [luba.db]'
+to only (re)add derived tables to an existing file type 'python luba_db_build.py [path to luba.db]'
+(--metrics Headnotes_Results_*.json adds the step times to that file, --profile runs cProfile & tracks peak memory)
+"""
+
+import html, json, os, re, sqlite3, time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from headnote_io import iter_records, insert_batches
+from pipeline_metrics import Metrics, profile_path_for
+
+# CONFIG ********
+lubaDB = "../luba.db"
+# ********
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+def run_script(conn: sqlite3.Connection, script: str):
+    """
+    Runs each statement in script with conn.execute (executescript would COMMIT the open transaction first)
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+# served tables; [index] is the INTEGER PRIMARY KEY, so rowids (used by the derived tables) survive VACUUM
+HEADNOTE_COLUMNS = {
+    'index': 'INTEGER PRIMARY KEY', 'headnote': 'TEXT', 'topic': 'TEXT', 'summary': 'TEXT',
+    'case_name': 'TEXT', 'reporter': 'TEXT', 'year': 'INTEGER', 'ors_cites': 'TEXT', 'oar_cites': 'TEXT',
+    'case_cites': 'TEXT', 'luba_no': 'TEXT', 'warnings': 'TEXT', 'formatting': 'TEXT',
+    'pub_month': 'TEXT', 'pub_pdf_url': 'TEXT', 'pub_matched_by': 'TEXT', 'summary_html': 'TEXT',
+}
+OPINION_COLUMNS = {
+    'index': 'INTEGER PRIMARY KEY', 'name': 'TEXT', 'year': 'INTEGER', 'month': 'TEXT', 'reporter': 'TEXT',
+    'luba_no': 'TEXT', 'url': 'TEXT', 'source_type': 'TEXT', 'warnings': 'TEXT',
+}
+# headnote fields stored as JSON text
+JSON_COLUMNS = ('ors_cites', 'oar_cites', 'case_cites', 'warnings', 'formatting')
+
+# created after the bulk insert (cheaper than updating them row by row)
+BASE_INDEXES = """
+    CREATE INDEX headnotes_year ON headnotes (year);
+    CREATE INDEX headnotes_case_name ON headnotes (case_name);
+    CREATE INDEX opinions_reporter ON opinions (reporter);
+    CREATE INDEX opinions_luba_no ON opinions (luba_no);
+    CREATE INDEX opinions_year_name ON opinions (year, name);
+"""
+
+def create_table_sql(table: str, columns: Dict[str, str]) -> str:
+    """
+    CREATE TABLE statement for one of the column dicts above
+    """
+    column_sql = ",\n   ".join(f"[{name}] {column_type}" for name, column_type in columns.items())
+    return f"CREATE TABLE [{table}] (\n   {column_sql}\n)"
+
+def insert_sql(table: str, columns: Dict[str, str]) -> str:
+    """
+    INSERT statement with a named parameter for each column
+    """
+    names = ", ".join(f"[{name}]" for name in columns)
+    params = ", ".join(f":{name}" for name in columns)
+    return f"INSERT INTO [{table}] ({names}) VALUES ({params})"
+
+def json_text(value) -> str:
+    """
+    JSON text for list columns (lists already stored as text are left alone)
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+def opinion_row(opinion: Dict) -> Dict:
+    """
+    opinions table row from an opinions JSON entry (luba_scraper.js calls name & reporter 'case_name' & 'citation')
+    """
+    row = {name: opinion.get(name) for name in OPINION_COLUMNS}
+    row['name'] = opinion.get('name', opinion.get('case_name'))
+    row['reporter'] = opinion.get('reporter', opinion.get('citation'))
+    row['warnings'] = json_text(opinion.get('warnings') or [])
+    return row
+
+# formatting block type => HTML tag (the only tags summary_html ever contains)
+FORMAT_TAGS = {'bold': 'strong', 'italic': 'em'}
+
+def summary_html(summary: str, formatting: List[Dict]):
+    """
+    Summary as HTML with <strong>/<em> around the formatting blocks' summary_start - summary_end spans
+    Text is escaped, so it's safe to render as is; None if there's no summary or no block has positions
+    (older parser output; the page falls back to add_formatting.js)
+    """
+    spans = [(fmt['summary_start'], fmt['summary_end'], FORMAT_TAGS[fmt['type']])
+             for fmt in formatting or [] if 'summary_start' in fmt and fmt.get('type') in FORMAT_TAGS]
+    if not summary or not spans:
+        return None
+    boundaries = sorted({0, len(summary)} | {min(position, len(summary)) for start, end, tag in spans
+                                              for position in (start, end)})
+    parts = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        # tags active over this stretch, opened & closed around it so overlapping spans still nest properly
+        tags = [tag for tag in ('strong', 'em') if any(s <= start and end <= e for s, e, t in spans if t == tag)]
+        text = html.escape(summary[start:end], quote=False)
+        parts.append(''.join(f'<{tag}>' for tag in tags) + text + ''.join(f'</{tag}>' for tag in reversed(tags)))
+    return ''.join(parts)
+
+def headnote_row(headnote: Dict, opinions_by_index: Dict[int, Dict]) -> Dict:
+    """
+    headnotes table row from a headnotes JSON entry, with pub_* fields filled in from the opinion
+    headnote_opinion_combiner.js matched it to (opinion_ID & opinion_matched_by), if any
+    """
+    row = {name: headnote.get(name) for name in HEADNOTE_COLUMNS}
+    row['index'] = int(headnote['index'])
+    for name in JSON_COLUMNS:
+        row[name] = json_text(headnote.get(name) if name != 'formatting' else headnote.get(name, []))
+    opinion_id = headnote.get('opinion_ID')
+    opinion = opinions_by_index.get(int(opinion_id)) if opinion_id is not None else None
+    if opinion:
+        row['pub_month'] = row['pub_month'] or opinion.get('month')
+        row['pub_pdf_url'] = row['pub_pdf_url'] or opinion.get('url')
+        row['luba_no'] = row['luba_no'] or opinion.get('luba_no')
+    row['pub_matched_by'] = row['pub_matched_by'] or headnote.get('opinion_matched_by')
+    row['summary_html'] = summary_html(headnote.get('summary'), headnote.get('formatting'))
+    return row
+
+def load_tables(conn: sqlite3.Connection, headnotes: Iterable[Dict], opinions: Iterable[Dict]):
+    """
+    Creates & bulk loads the headnotes & opinions tables in one transaction, then adds their indexes
+    Headnotes can be a generator (e.g. headnote_io.iter_records); they're inserted in batches as they're read
+    """
+    opinion_rows = [opinion_row(opinion) for opinion in opinions]
+    opinions_by_index = {row['index']: row for row in opinion_rows if row['index'] is not None}
+    with conn:
+        conn.execute("BEGIN")
+        conn.execute(create_table_sql('headnotes', HEADNOTE_COLUMNS))
+        conn.execute(create_table_sql('opinions', OPINION_COLUMNS))
+        insert_batches(conn, insert_sql('opinions', OPINION_COLUMNS), opinion_rows)
+        headnote_count = insert_batches(conn, insert_sql('headnotes', HEADNOTE_COLUMNS),
+                                        (headnote_row(headnote, opinions_by_index) for headnote in headnotes))
+        run_script(conn, BASE_INDEXES)
+    print_it(f"loaded {headnote_count} headnotes & {len(opinion_rows)} opinions")
+
+def build_database(headnotes_file: str, opinions_file: str, db_path: str, metrics: Metrics = None):
+    """
+    Builds db_path from scratch: bulk load, derived tables, ANALYZE & VACUUM
+    Written to a temp file & renamed at the end, so a failed build never replaces a good luba.db;
+    same input JSON (& SQLite version) gives a byte for byte identical file, ready to serve with -i
+    """
+    build_start = time.perf_counter()
+    metrics = metrics or Metrics()
+
+    temp_path = db_path + ".building"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        # nothing to recover on a crash (the temp file is just thrown away), so skip the journal & fsyncs
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        with metrics.stage('SQL import'):
+            load_tables(conn, iter_records(headnotes_file), iter_records(opinions_file))
+        build_derived_tables(conn, metrics)
+        with metrics.stage('analyze & vacuum'):
+            conn.execute("ANALYZE")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(temp_path, db_path)
+    print_it(f"built {db_path} in {time.perf_counter() - build_start:.2f}s")
+
+def build_search_index(conn: sqlite3.Connection):
+    """
+    Full text search (FTS5) table over headnote summary, topic & case name
+    External content table (text lives in headnotes only), kept in sync with triggers
+    Porter stemming, so search for stems: 'contamin*' finds contaminate, contamination, etc.
+    Datasette picks it up automatically for ?_search= on the headnotes table
+    """
+    run_script(conn, """
+        DROP TABLE IF EXISTS headnotes_fts;
+        DROP TRIGGER IF EXISTS headnotes_fts_insert;
+        DROP TRIGGER IF EXISTS headnotes_fts_delete;
+        DROP TRIGGER IF EXISTS headnotes_fts_update;
+
+        CREATE VIRTUAL TABLE headnotes_fts USING fts5(
+            summary, topic, case_name,
+            content="headnotes",
+            tokenize="porter unicode61 remove_diacritics 2"
+        );
+        INSERT INTO headnotes_fts(headnotes_fts) VALUES ('rebuild');
+
+        CREATE TRIGGER headnotes_fts_insert AFTER INSERT ON headnotes BEGIN
+            INSERT INTO headnotes_fts (rowid, summary, topic, case_name)
+            VALUES (new.rowid, new.summary, new.topic, new.case_name);
+        END;
+        CREATE TRIGGER headnotes_fts_delete AFTER DELETE ON headnotes BEGIN
+            INSERT INTO headnotes_fts (headnotes_fts, rowid, summary, topic, case_name)
+            VALUES ('delete', old.rowid, old.summary, old.topic, old.case_name);
+        END;
+        CREATE TRIGGER headnotes_fts_update AFTER UPDATE OF summary, topic, case_name ON headnotes BEGIN
+            INSERT INTO headnotes_fts (headnotes_fts, rowid, summary, topic, case_name)
+            VALUES ('delete', old.rowid, old.summary, old.topic, old.case_name);
+            INSERT INTO headnotes_fts (rowid, summary, topic, case_name)
+            VALUES (new.rowid, new.summary, new.topic, new.case_name);
+        END;
+    """)
+    indexed = conn.execute("SELECT count(*) FROM headnotes_fts").fetchone()[0]
+    print_it(f"search index built over {indexed} headnotes")
+
+# headnote JSON columns that go into headnote_citations, by kind
+CITATION_COLUMNS = {'ors': 'ors_cites', 'oar': 'oar_cites', 'case': 'case_cites'}
+
+def citation_rows_sql(row: str) -> str:
+    """
+    SELECT of (headnote_rowid, kind, cite) for one headnotes row ('new' or 'old' in triggers),
+    or for the whole table when row is 'headnotes'
+    Includes the headnote's own reporter as kind 'reporter', so a case cite lookup covers both
+    Blank or non-JSON cite columns (older data) are treated as empty lists
+    """
+    table = "headnotes, " if row == 'headnotes' else ""
+    selects = [
+        f"SELECT {row}.rowid, '{kind}', cite.value FROM {table}json_each("
+        f"CASE WHEN json_valid({row}.{column}) THEN {row}.{column} ELSE '[]' END) AS cite"
+        for kind, column in CITATION_COLUMNS.items()
+    ]
+    from_clause = "FROM headnotes " if row == 'headnotes' else ""
+    selects.append(f"SELECT {row}.rowid, 'reporter', {row}.reporter {from_clause}WHERE ifnull({row}.reporter, '') != ''")
+    return "\n            UNION ALL ".join(selects)
+
+def build_citation_table(conn: sqlite3.Connection):
+    """
+    headnote_citations(headnote_rowid, kind, cite): one row per cite in ors_cites, oar_cites & case_cites
+    (kind 'ors', 'oar' or 'case'), plus each headnote's reporter (kind 'reporter')
+    The primary key (kind, cite, headnote_rowid) is a covering index, so cite => headnotes lookups
+    are exact index seeks instead of LIKE scans over the JSON text. cite is COLLATE NOCASE (so is that index),
+    so cite = '...' matches any capitalisation like the old LIKE search did. Kept in sync with triggers
+    """
+    run_script(conn, f"""
+        DROP TABLE IF EXISTS headnote_citations;
+        DROP TRIGGER IF EXISTS headnote_citations_insert;
+        DROP TRIGGER IF EXISTS headnote_citations_delete;
+        DROP TRIGGER IF EXISTS headnote_citations_update;
+
+        CREATE TABLE headnote_citations (
+            headnote_rowid INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            cite TEXT NOT NULL COLLATE NOCASE,
+            PRIMARY KEY (kind, cite, headnote_rowid)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO headnote_citations
+            {citation_rows_sql('headnotes')};
+        CREATE INDEX headnote_citations_headnote ON headnote_citations (headnote_rowid);
+
+        CREATE TRIGGER headnote_citations_insert AFTER INSERT ON headnotes BEGIN
+            INSERT OR IGNORE INTO headnote_citations
+            {citation_rows_sql('new')};
+        END;
+        CREATE TRIGGER headnote_citations_delete AFTER DELETE ON headnotes BEGIN
+            DELETE FROM headnote_citations WHERE headnote_rowid = old.rowid;
+        END;
+        CREATE TRIGGER headnote_citations_update AFTER UPDATE OF ors_cites, oar_cites, case_cites, reporter ON headnotes BEGIN
+            DELETE FROM headnote_citations WHERE headnote_rowid = old.rowid;
+            INSERT OR IGNORE INTO headnote_citations
+            {citation_rows_sql('new')};
+        END;
+    """)
+    counts = conn.execute("SELECT kind, count(*) FROM headnote_citations GROUP BY kind ORDER BY kind").fetchall()
+    print_it("citation table built: " + ", ".join(f"{count} {kind}" for kind, count in counts))
+
+# LUBA opinion cites in either form ("37 Or LUBA 426" or "LUBA No 2021-065 (Dec 1, 2021)");
+# consolidated cases list several docket numbers ("2013-108/109")
+LUBA_REPORTER = re.compile(r"(\d+)\s*Or\.?\s*LUBA\s*(\d+)", re.IGNORECASE)
+LUBA_NUMBER = re.compile(r"LUBA\s*No\.?\s*(\d{2,4}-\d+(?:\s*/\s*\d+)*)", re.IGNORECASE)
+LUBA_DOCKET = re.compile(r"(\d{2,4})-(\d+(?:\s*/\s*\d+)*)")
+
+def docket_keys(luba_no: str) -> List[str]:
+    """
+    Opinion keys for a docket number: "83-028/034" => ["LUBA No 1983-028", "LUBA No 1983-034"]
+    (dockets before 2000 have 2 digit years)
+    """
+    keys = []
+    for year, numbers in LUBA_DOCKET.findall(luba_no or ''):
+        year = int(year) + 1900 if len(year) == 2 else int(year)
+        keys += [f"LUBA No {year}-{int(number):03d}" for number in re.split(r"\s*/\s*", numbers)]
+    return keys
+
+def opinion_keys(cite: str) -> List[str]:
+    """
+    Normalized keys for the LUBA opinion(s) a cite refers to ([] for other reporters, e.g. Or App)
+    """
+    keys = [f"{volume} Or LUBA {page}" for volume, page in LUBA_REPORTER.findall(cite or '')]
+    for luba_no in LUBA_NUMBER.findall(cite or ''):
+        keys += docket_keys(luba_no)
+    return list(dict.fromkeys(keys))
+
+# headnote_citations kinds that point at an opinion => headnote_opinions relation
+OPINION_RELATIONS = {'reporter': 'decided', 'case': 'cites'}
+OPINION_KINDS_SQL = ', '.join(f"'{kind}'" for kind in OPINION_RELATIONS)
+
+def opinion_edges(cites: Iterable[Tuple[int, str, str]], lookup) -> Tuple[List[Tuple[int, str, int]], set]:
+    """
+    headnote_opinions rows (opinion_rowid, relation, headnote_rowid) for (headnote_rowid, kind, cite) citation rows,
+    & the set of opinion keys nothing matched; lookup(key) gives the opinion rowids for a key
+    """
+    unresolved = set()
+    edges = []
+    for headnote_rowid, kind, cite in cites:
+        for key in opinion_keys(cite):
+            rowids = lookup(key)
+            if not rowids:
+                unresolved.add(key)
+            edges += [(rowid, OPINION_RELATIONS[kind], headnote_rowid) for rowid in rowids]
+    return edges, unresolved
+
+def build_opinion_links(conn: sqlite3.Connection):
+    """
+    opinion_keys(key, opinion_rowid): each opinion under its normalized reporter & docket number(s)
+    headnote_opinions(opinion_rowid, relation, headnote_rowid): the opinion a headnote comes from ('decided')
+    & the LUBA opinions in its case_cites ('cites'), resolved through opinion_keys
+    Keyed both ways, so "cited by" & "cites" are index lookups instead of LIKE scans on reporter & case_cites
+    Built from headnote_citations (run after build_citation_table); the keys are worked out in python,
+    so unlike headnote_citations there are no triggers: rebuild (or luba_db_update.py) after editing headnotes
+    """
+    run_script(conn, """
+        DROP TABLE IF EXISTS opinion_keys;
+        DROP TABLE IF EXISTS headnote_opinions;
+
+        CREATE TABLE opinion_keys (
+            key TEXT NOT NULL,
+            opinion_rowid INTEGER NOT NULL,
+            PRIMARY KEY (key, opinion_rowid)
+        ) WITHOUT ROWID;
+        CREATE TABLE headnote_opinions (
+            opinion_rowid INTEGER NOT NULL,
+            relation TEXT NOT NULL,
+            headnote_rowid INTEGER NOT NULL,
+            PRIMARY KEY (opinion_rowid, relation, headnote_rowid)
+        ) WITHOUT ROWID;
+    """)
+    opinions = {}
+    for rowid, reporter, luba_no in conn.execute("SELECT rowid, reporter, luba_no FROM opinions").fetchall():
+        for key in dict.fromkeys(opinion_keys(reporter) + docket_keys(luba_no)):
+            opinions.setdefault(key, []).append(rowid)
+    insert_batches(conn, "INSERT INTO opinion_keys VALUES (?, ?)",
+                   ((key, rowid) for key, rowids in opinions.items() for rowid in rowids))
+
+    cites = conn.execute(f"SELECT headnote_rowid, kind, cite FROM headnote_citations WHERE kind IN ({OPINION_KINDS_SQL})")
+    edges, unresolved = opinion_edges(cites.fetchall(), lambda key: opinions.get(key, ()))
+    insert_batches(conn, "INSERT OR IGNORE INTO headnote_opinions VALUES (?, ?, ?)", edges)
+    conn.execute("CREATE INDEX headnote_opinions_headnote ON headnote_opinions (headnote_rowid, relation, opinion_rowid)")
+
+    counts = dict(conn.execute("SELECT relation, count(*) FROM headnote_opinions GROUP BY relation").fetchall())
+    print_it(f"opinion links built: {counts.get('decided', 0)} decided, {counts.get('cites', 0)} cites "
+             f"({len(unresolved)} LUBA cites with no matching opinion)")
+
+# "Petitioner v. Respondent" (also "vs.", no period & scraper typos like "v," or "v.City")
+PARTY_SPLIT = re.compile(r"\s+vs?(?:[.,]\s*|\s+)", re.IGNORECASE)
+# "et al", stray docket fragments left at the front by the scraper ("/025 McIntosh") & edge punctuation
+PARTY_ET_AL = re.compile(r",?\s+et\.?\s+al\.?$", re.IGNORECASE)
+PARTY_PREFIX = re.compile(r"^/\S*\s+")
+PARTY_INVERTED = re.compile(r"^(.+?),\s*(City|County|State|Port) of$", re.IGNORECASE)
+# groups named after a place ("Landwatch Lane County") aren't governments
+NON_GOVERNMENT = re.compile(r"\b(Friends|Citizens|Neighbors|Landwatch|Association|Assoc|Coalition|Inc|LLC|Co)\b\.?", re.IGNORECASE)
+# first match wins, so counties' "Board of Commissioners" aren't taken for state commissions
+JURISDICTION_TYPES = (
+    ('city', re.compile(r"^City of\b|\bCity$", re.IGNORECASE)),
+    ('county', re.compile(r"^County of\b|\b(County|Cty\.?)$|\bCounty (Board|Commission)", re.IGNORECASE)),
+    ('regional', re.compile(r"^Metro\b|Metropolitan Service District", re.IGNORECASE)),
+    ('district', re.compile(r"\bDistrict\b|^Port of\b", re.IGNORECASE)),
+    ('state', re.compile(r"^State of\b|^Oregon\b.*\b(Department|Commission|Board|Division|Agency)\b|\bDepartment of\b"
+                         r"|\bDept\.? of\b|\b(LCDC|DLCD|ODOT|DEQ|ODFW|DSL)\b|Land Conservation and Development", re.IGNORECASE)),
+)
+
+def clean_party(party: str) -> str:
+    """
+    One side of a case name tidied up: "Corvallis, City of et al." => "City of Corvallis"
+    """
+    party = ' '.join(PARTY_PREFIX.sub('', party).split())
+    party = PARTY_ET_AL.sub('', party).strip(' ,;')
+    inverted = PARTY_INVERTED.match(party)
+    return f"{inverted[2]} of {inverted[1]}" if inverted else party
+
+def jurisdiction_type(party: str) -> Optional[str]:
+    """
+    'city', 'county', 'regional', 'district' or 'state' for government parties (None for everyone else)
+    """
+    if NON_GOVERNMENT.search(party):
+        return None
+    return next((kind for kind, pattern in JURISDICTION_TYPES if pattern.search(party)), None)
+
+def case_parties(case_name: str) -> List[Tuple[str, str]]:
+    """
+    [(role, party)] from a case name: "Walker v. Clackamas County" =>
+    [('petitioner', 'Walker'), ('respondent', 'Clackamas County')] ([] if there's no " v. ")
+    """
+    sides = PARTY_SPLIT.split(case_name or '', maxsplit=1)
+    if len(sides) != 2:
+        return []
+    parties = [('petitioner', clean_party(sides[0])), ('respondent', clean_party(sides[1]))]
+    return [(role, party) for role, party in parties if party]
+
+def build_party_tables(conn: sqlite3.Connection):
+    """
+    case_parties: one row per side of every headnote case_name & opinions name (source 'headnotes' or 'opinions'),
+    keyed on party_key (lower case party), so "cases against Lane County" is an index seek
+    (party_key = 'lane county' AND role = 'respondent') instead of LIKE '%Lane County%' over both tables
+    jurisdiction is city/county/regional/district/state for governments, for "any county" type lookups
+    party_names_fts: trigram FTS of each distinct party (in its most common spelling, preferring mixed case)
+    for typeahead, e.g. MATCH 'corval' or LIKE '%corval%'
+    Worked out in python like headnote_opinions, so no triggers: rebuild (or luba_db_update.py) after editing names
+    """
+    run_script(conn, """
+        DROP TABLE IF EXISTS case_parties;
+        DROP TABLE IF EXISTS party_names_fts;
+
+        CREATE TABLE case_parties (
+            party_key TEXT NOT NULL,
+            source TEXT NOT NULL,
+            role TEXT NOT NULL,
+            source_rowid INTEGER NOT NULL,
+            party TEXT NOT NULL,
+            jurisdiction TEXT,
+            PRIMARY KEY (party_key, source, role, source_rowid)
+        ) WITHOUT ROWID;
+        CREATE VIRTUAL TABLE party_names_fts USING fts5(
+            party, party_key UNINDEXED, jurisdiction UNINDEXED, case_count UNINDEXED,
+            tokenize="trigram"
+        );
+    """)
+    names = conn.execute("""
+        SELECT 'headnotes', rowid, case_name FROM headnotes
+        UNION ALL SELECT 'opinions', rowid, name FROM opinions""").fetchall()
+    rows = party_rows(names)
+    insert_batches(conn, "INSERT OR IGNORE INTO case_parties VALUES (?, ?, ?, ?, ?, ?)", rows)
+    run_script(conn, """
+        CREATE INDEX case_parties_source ON case_parties (source, source_rowid);
+        CREATE INDEX case_parties_jurisdiction ON case_parties (jurisdiction, role, party_key);
+    """)
+    name_count = insert_batches(conn, "INSERT INTO party_names_fts VALUES (?, ?, ?, ?)", party_name_rows(conn))
+    unsplit = len({(source, rowid) for source, rowid, case_name in names} - {(row[1], row[3]) for row in rows})
+    print_it(f"party tables built: {len(rows)} parties, {name_count} distinct names "
+             f"({unsplit} case names without \" v. \")")
+
+def party_rows(names: Iterable[Tuple[str, int, str]]) -> List[Tuple]:
+    """
+    case_parties rows (party_key, source, role, source_rowid, party, jurisdiction) for (source, rowid, case name)
+    """
+    return [(party.lower(), source, role, rowid, party, jurisdiction_type(party))
+            for source, rowid, case_name in names for role, party in case_parties(case_name)]
+
+def party_name_rows(conn: sqlite3.Connection, keys: Iterable[str] = None) -> List[Tuple]:
+    """
+    party_names_fts rows (party, party_key, jurisdiction, case_count) from case_parties, for every
+    party_key or just keys; party is the most common spelling, preferring mixed case over all caps
+    """
+    spellings = {}
+    if keys is None:
+        found = conn.execute("SELECT party_key, party, count(*) FROM case_parties GROUP BY party_key, party")
+    else:
+        found = (row for key in keys for row in conn.execute(
+            "SELECT party_key, party, count(*) FROM case_parties WHERE party_key = ? GROUP BY party", (key,)))
+    for key, party, count in found:
+        spellings.setdefault(key, Counter())[party] += count
+
+    def spelling(counts: Counter) -> str:
+        return max(counts.items(), key=lambda item: (item[0] != item[0].upper(), item[1], item[0]))[0]
+    return [(spelling(counts), key, jurisdiction_type(key), sum(counts.values()))
+            for key, counts in sorted(spellings.items())]
+
+# headnote numbers are <section>.<subsection>.<subsubsection>[.<subsubsubsection>] (e.g. 36.2.3, 10.1.2.4);
+# each level packs into 3 digits of headnote_sort, so 36.2.3 => 36002003000, 10.1.2.4 => 10001002004
+# & all of section 36 is 36000000000 - 36999999999
+OUTLINE_LEVEL_BASE = 1000
+
+def outline_column_sql() -> Dict[str, str]:
+    """
+    {column: SQL expression} for the integer outline columns computed from the headnote number
+    ("1." or "1.2" or "1.2.3" or "1.2.3.4"; missing levels are NULL)
+    """
+    after_first = "substr(headnote, instr(headnote, '.') + 1)"
+    after_second = f"substr({after_first}, instr({after_first}, '.') + 1)"
+    after_third = f"substr({after_second}, instr({after_second}, '.') + 1)"
+    base = OUTLINE_LEVEL_BASE
+    return {
+        'section': "CAST(headnote AS INTEGER)",
+        'subsection': f"NULLIF(CAST(CASE WHEN instr(headnote, '.') THEN {after_first} END AS INTEGER), 0)",
+        'subsubsection': (f"NULLIF(CAST(CASE WHEN instr(headnote, '.') AND instr({after_first}, '.') "
+                          f"THEN {after_second} END AS INTEGER), 0)"),
+        'subsubsubsection': (f"NULLIF(CAST(CASE WHEN instr(headnote, '.') AND instr({after_first}, '.') "
+                             f"AND instr({after_second}, '.') THEN {after_third} END AS INTEGER), 0)"),
+        'headnote_sort': (f"section * {base ** 3} + ifnull(subsection, 0) * {base ** 2} "
+                          f"+ ifnull(subsubsection, 0) * {base} + ifnull(subsubsubsection, 0)"),
+    }
+
+def build_outline_index(conn: sqlite3.Connection):
+    """
+    Adds section, subsection, subsubsection, subsubsubsection & headnote_sort (generated from headnote, so always
+    in sync) and an index on (headnote_sort, year), so browsing one part of the outline is an index range read
+    in numeric order (2.x before 10.x) instead of a LIKE '3%' scan that also matches 30-39
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(headnotes)")}
+    conn.execute("DROP INDEX IF EXISTS headnotes_outline")
+    for column, expression in outline_column_sql().items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE headnotes ADD COLUMN {column} INTEGER GENERATED ALWAYS AS ({expression}) VIRTUAL")
+    conn.execute("CREATE INDEX headnotes_outline ON headnotes (headnote_sort, year DESC)")
+    sections = conn.execute("SELECT count(DISTINCT section) FROM headnotes").fetchone()[0]
+    print_it(f"outline index built over {sections} sections")
+
+def build_keyset_index(conn: sqlite3.Connection):
+    """
+    Adds year_sort (year, with a missing year as 0 so no row drops out of a comparison) & an index on
+    (year_sort, ifnull(headnote_sort, -1)), so the paged headnote browser seeks straight to the row after
+    (year_sort, ifnull(headnote_sort, -1), index) from the last page instead of counting past an OFFSET
+    (the -1 keeps rows with no readable headnote number in the comparison; the browse SQL must use the same expression)
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(headnotes)")}
+    conn.execute("DROP INDEX IF EXISTS headnotes_keyset")
+    if 'year_sort' not in existing:
+        conn.execute("ALTER TABLE headnotes ADD COLUMN year_sort INTEGER GENERATED ALWAYS AS (ifnull(year, 0)) VIRTUAL")
+    conn.execute("CREATE INDEX headnotes_keyset ON headnotes (year_sort, ifnull(headnote_sort, -1))")
+    print_it("keyset index built")
+
+# precomputed summary tables: {table: (key columns, source table, filter)}, each
+# SELECT <key columns>, count(*) AS headnote_count FROM <source> [WHERE <filter>] GROUP BY <key columns>
+AGGREGATE_TABLES = {
+    'topic_counts': ('topic', 'headnotes', None),
+    'year_counts': ('year', 'headnotes', None),
+    'cite_counts': ('kind, cite', 'headnote_citations', "kind IN ('ors', 'oar', 'case')"),
+    'opinion_counts': ('case_name, reporter, year', 'headnotes', None),
+    'opinion_citation_counts': ('opinion_rowid, relation', 'headnote_opinions', None),
+}
+
+def aggregate_sql(table: str, *filters: str) -> str:
+    """
+    SELECT for one of the AGGREGATE_TABLES (optionally narrowed by more filters)
+    """
+    key_columns, source, where = AGGREGATE_TABLES[table]
+    conditions = [condition for condition in (where, *filters) if condition]
+    where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {key_columns}, count(*) AS headnote_count FROM {source}{where_sql} GROUP BY {key_columns}"
+
+def build_aggregate_tables(conn: sqlite3.Connection):
+    """
+    Materializes the summary tables in AGGREGATE_TABLES (headnotes per topic, per year,
+    per ORS/OAR/case cite, per opinion & per linked opinion row), since the data doesn't change between deploys
+    Built from headnote_citations & headnote_opinions, so run after build_opinion_links
+    """
+    for table, (key_columns, source, where) in AGGREGATE_TABLES.items():
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} AS {aggregate_sql(table)}")
+        conn.execute(f"CREATE INDEX {table}_count ON {table} (headnote_count DESC, {key_columns})")
+    print_it("aggregate tables built: " + ", ".join(AGGREGATE_TABLES))
+
+def verify_aggregate_tables(conn: sqlite3.Connection):
+    """
+    Checks every table in AGGREGATE_TABLES matches its query run live; raises RuntimeError if not
+    For luba_db_update.py, which refreshes the tables in place group by group (a fresh build runs the same
+    SQL, so it uses check_aggregate_totals instead)
+    """
+    for table in AGGREGATE_TABLES:
+        select_sql = aggregate_sql(table)
+        differences = conn.execute(f"""
+            SELECT count(*) FROM (
+                SELECT * FROM (SELECT * FROM {table} EXCEPT {select_sql})
+                UNION ALL
+                SELECT * FROM ({select_sql} EXCEPT SELECT * FROM {table})
+            )""").fetchone()[0]
+        if differences:
+            raise RuntimeError(f"{table} doesn't match headnotes ({differences} rows differ); rebuild it")
+    print_it("aggregate tables verified")
+
+def headnote_totals(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    What each aggregate table's headnote_count column should add up to, counted straight from headnotes
+    (taken before the derived steps, so it shares none of their SQL): every headnote once in topic_counts,
+    year_counts & opinion_counts, and each distinct ORS/OAR/case cite of a headnote once in cite_counts
+    (opinion_citation_counts has no figure independent of the opinion matching, so isn't checked)
+    """
+    headnotes = conn.execute("SELECT count(*) FROM headnotes").fetchone()[0]
+    cites = " UNION ALL ".join(
+        f"SELECT DISTINCT headnotes.rowid, '{kind}', lower(cite.value) FROM headnotes, "
+        f"json_each(CASE WHEN json_valid({column}) THEN {column} ELSE '[]' END) AS cite"
+        for kind, column in CITATION_COLUMNS.items()
+    )
+    return {
+        'topic_counts': headnotes, 'year_counts': headnotes, 'opinion_counts': headnotes,
+        'cite_counts': conn.execute(f"SELECT count(*) FROM ({cites})").fetchone()[0],
+    }
+
+def check_aggregate_totals(conn: sqlite3.Connection, totals: Dict[str, int]):
+    """
+    Checks each aggregate table adds up to its figure from headnote_totals; raises RuntimeError if not
+    (inside build_derived_tables' transaction, so a wrong table rolls back instead of shipping)
+    """
+    for table, expected in totals.items():
+        counted = conn.execute(f"SELECT ifnull(sum(headnote_count), 0) FROM {table}").fetchone()[0]
+        if counted != expected:
+            raise RuntimeError(f"{table} counts {counted} headnotes, headnotes has {expected}; rebuild it")
+    print_it("aggregate tables checked against headnotes")
+
+# derived table steps, in build order, named for the stage timers
+DERIVED_STEPS = (
+    ('search index', build_search_index),
+    ('citations', build_citation_table),
+    ('opinion links', build_opinion_links),
+    ('party tables', build_party_tables),
+    ('outline index', build_outline_index),
+    ('keyset index', build_keyset_index),
+    ('aggregates', build_aggregate_tables),
+)
+
+def build_derived_tables(conn: sqlite3.Connection, metrics: Metrics = None):
+    """
+    Builds everything derived from the headnotes table (safe to re-run), then checks the aggregate tables
+    against counts taken from headnotes beforehand
+    All in one transaction, so if a step (or the check) fails nothing is left half built
+    """
+    metrics = metrics or Metrics()
+    with conn:
+        conn.execute("BEGIN")
+        totals = headnote_totals(conn)
+        for name, step in DERIVED_STEPS:
+            with metrics.stage(name):
+                step(conn)
+        with metrics.stage('verify'):
+            check_aggregate_totals(conn, totals)
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Build luba.db from headnotes & opinions JSON, or add derived tables to it")
+    arg_parser.add_argument('db_path', nargs='?', default=lubaDB, help=f"database file (default {lubaDB})")
+    arg_parser.add_argument('--headnotes', metavar='JSON', help="headnotes .json or .jsonl (parser or combiner output)")
+    arg_parser.add_argument('--opinions', metavar='JSON', help="opinions JSON (luba_scraper.js output)")
+    arg_parser.add_argument('--metrics', metavar='RESULTS_JSON',
+                            help="add step times to this Headnotes_Results_*.json (metrics.db build)")
+    arg_parser.add_argument('--profile', action='store_true', help="profile the run (cProfile & peak memory)")
+    args = arg_parser.parse_args()
+    metrics = Metrics(profile=args.profile)
+
+    if args.headnotes or args.opinions:
+        if not (args.headnotes and args.opinions):
+            arg_parser.error("--headnotes & --opinions are needed together to build the database")
+        print_it(f"building {args.db_path} ...")
+        build_database(args.headnotes, args.opinions, args.db_path, metrics)
+    else:
+        conn = sqlite3.connect(args.db_path)
+        print_it(f"adding derived tables to {args.db_path} ...")
+        build_derived_tables(conn, metrics)
+        conn.close()
+    metrics.finish(profile_path_for(args.metrics or args.db_path, 'db build') if args.profile else None)
+    if args.metrics:
+        metrics.save(args.metrics, 'db build')
+    metrics.report()
+    print_it("finished!")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Applies a new headnotes release (luba_docx_parser.py or headnote_opinion_combiner.js JSON) to an existing luba.db in place,
+instead of rebuilding it: only added, changed & removed headnotes are written, in one transaction, and only their
+derived rows are redone (search index & headnote_citations through their triggers; headnote_opinions, case_parties,
+party_names_fts & the count tables here)
+Headnotes are matched like build_db_compare.py: by (headnote, citation), identical rows first, then by summary word overlap.
+Matched rows keep their rowid/index (a full rebuild renumbers them in file order); new ones get the next free index
+Opinions aren't touched: if the opinions JSON changed too, rebuild with luba_db_build.py
+to run type 'python luba_db_update.py <new headnotes.json> [luba.db] [--dry-run] [--verify]'
+(then re-run 'datasette inspect' before serving with -i)
+"""
+
+import hashlib, json, sqlite3, time
+from typing import Dict, List, Set, Tuple
+from headnote_io import iter_records
+from pipeline_metrics import Metrics, profile_path_for
+from build_db_compare import group_by_key, pair_group
+from luba_db_build import (HEADNOTE_COLUMNS, AGGREGATE_TABLES, OPINION_KINDS_SQL, aggregate_sql, headnote_row,
+                           insert_sql, opinion_edges, party_rows, party_name_rows, verify_aggregate_tables)
+
+# CONFIG ********
+lubaDB = "../luba.db"
+# ********
+
+# stored headnote columns compared & written (index is the rowid, so it's kept for matched rows)
+ROW_COLUMNS = [name for name in HEADNOTE_COLUMNS if name != 'index']
+
+# filled in from the opinion headnote_opinion_combiner.js matched a headnote to (opinion_ID); parser JSON has no
+# opinion_ID, so for its headnotes these are kept from the matched live row instead of being blanked
+OPINION_MATCH_COLUMNS = ('luba_no', 'pub_month', 'pub_pdf_url', 'pub_matched_by')
+
+# column holding the headnotes rowid in each aggregate source table
+SOURCE_ROWID = {'headnotes': 'rowid', 'headnote_citations': 'headnote_rowid', 'headnote_opinions': 'headnote_rowid'}
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+def row_hash(row: Dict) -> str:
+    """
+    Hash of every stored column but index (equal hashes => nothing to write)
+    """
+    return hashlib.sha1(json.dumps([row[name] for name in ROW_COLUMNS], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def delta_record(row: Dict, rowid: int = None) -> Dict:
+    """
+    Record in the shape build_db_compare's group_by_key & pair_group expect
+    """
+    return {'rowid': rowid, 'headnote': row['headnote'], 'citation': row['reporter'], 'summary': row['summary'],
+            'hash': row_hash(row), 'row': row}
+
+def load_live_rows(conn: sqlite3.Connection) -> List[Dict]:
+    columns = ', '.join(f"[{name}]" for name in ROW_COLUMNS)
+    return [delta_record(dict(zip(ROW_COLUMNS, values)), rowid)
+            for rowid, *values in conn.execute(f"SELECT rowid, {columns} FROM headnotes")]
+
+def load_release_rows(conn: sqlite3.Connection, headnotes_file: str) -> List[Dict]:
+    """
+    headnotes rows for the release, built exactly as luba_db_build.py would (pub_* from the db's opinions table);
+    opinion_matched is False for headnotes without an opinion_ID (parser output), see keep_opinion_match
+    """
+    conn.row_factory = sqlite3.Row
+    opinions_by_index = {row['index']: dict(row) for row in conn.execute("SELECT * FROM opinions")}
+    conn.row_factory = None
+    return [{**delta_record(headnote_row(headnote, opinions_by_index)),
+             'opinion_matched': headnote.get('opinion_ID') is not None} for headnote in iter_records(headnotes_file)]
+
+def keep_opinion_match(old: Dict, new: Dict) -> Dict:
+    """
+    new (a release record with no opinion_ID) with its empty OPINION_MATCH_COLUMNS taken from the live row old
+    """
+    row = {**new['row'], **{name: old['row'][name] for name in OPINION_MATCH_COLUMNS if new['row'][name] is None}}
+    return delta_record(row)
+
+def find_delta(live: List[Dict], release: List[Dict]) -> Tuple[List[Tuple[int, Dict]], List[int], List[Dict], int]:
+    """
+    (updates as (rowid, new row), rowids to delete, rows to insert, unchanged count)
+    """
+    live_groups = group_by_key(live)
+    release_groups = group_by_key(release)
+    updates, deletes, inserts = [], [], []
+    unchanged = 0
+    for key in dict.fromkeys(list(live_groups) + list(release_groups)):
+        pairs, removed, added = pair_group(live_groups.get(key, []), release_groups.get(key, []))
+        for old, new, score in pairs:
+            if not new['opinion_matched']:
+                new = keep_opinion_match(old, new)
+            if old['hash'] == new['hash']:
+                unchanged += 1
+            else:
+                updates.append((old['rowid'], new['row']))
+        deletes += [old['rowid'] for old in removed]
+        inserts += [new['row'] for new in added]
+    return updates, deletes, inserts, unchanged
+
+def aggregate_keys(conn: sqlite3.Connection, rowids: Set[int]) -> Dict[str, Set[Tuple]]:
+    """
+    {aggregate table: key tuples} the given headnotes count towards
+    """
+    keys = {}
+    for table, (key_columns, source, where) in AGGREGATE_TABLES.items():
+        sql = f"SELECT DISTINCT {key_columns} FROM {source} WHERE {SOURCE_ROWID[source]} = ?" + (f" AND {where}" if where else "")
+        keys[table] = {tuple(found) for rowid in rowids for found in conn.execute(sql, (rowid,))}
+    return keys
+
+def party_keys(conn: sqlite3.Connection, rowids: Set[int]) -> Set[str]:
+    return {key for rowid in rowids for key, in conn.execute(
+        "SELECT party_key FROM case_parties WHERE source = 'headnotes' AND source_rowid = ?", (rowid,))}
+
+def relink_headnotes(conn: sqlite3.Connection, removed: Set[int], current: Set[int]):
+    """
+    Redoes headnote_opinions & case_parties rows for the touched headnotes (removed = old rowids, current = rowids now
+    in the table), then the party_names_fts rows for every party whose cases changed
+    """
+    old_parties = party_keys(conn, removed | current)
+    for rowid in removed | current:
+        conn.execute("DELETE FROM headnote_opinions WHERE headnote_rowid = ?", (rowid,))
+        conn.execute("DELETE FROM case_parties WHERE source = 'headnotes' AND source_rowid = ?", (rowid,))
+
+    cites = [cite for rowid in current for cite in conn.execute(
+        f"SELECT headnote_rowid, kind, cite FROM headnote_citations WHERE headnote_rowid = ? AND kind IN ({OPINION_KINDS_SQL})",
+        (rowid,))]
+    lookup = lambda key: [rowid for rowid, in conn.execute("SELECT opinion_rowid FROM opinion_keys WHERE key = ?", (key,))]
+    edges, unresolved = opinion_edges(cites, lookup)
+    conn.executemany("INSERT OR IGNORE INTO headnote_opinions VALUES (?, ?, ?)", edges)
+
+    names = [('headnotes', rowid, case_name) for rowid in current
+             for case_name, in conn.execute("SELECT case_name FROM headnotes WHERE rowid = ?", (rowid,))]
+    conn.executemany("INSERT OR IGNORE INTO case_parties VALUES (?, ?, ?, ?, ?, ?)", party_rows(names))
+    changed_parties = old_parties | party_keys(conn, current)
+    for key in changed_parties:
+        conn.execute("DELETE FROM party_names_fts WHERE party_key = ?", (key,))
+    conn.executemany("INSERT INTO party_names_fts VALUES (?, ?, ?, ?)", party_name_rows(conn, changed_parties))
+    print_it(f"relinked {len(edges)} opinion links ({len(unresolved)} unresolved LUBA cites) & {len(changed_parties)} parties")
+
+def refresh_aggregates(conn: sqlite3.Connection, keys: Dict[str, Set[Tuple]]):
+    """
+    Recounts just the given groups of each aggregate table (dropping groups with no headnotes left)
+    """
+    for table, key_set in keys.items():
+        columns = [column.strip() for column in AGGREGATE_TABLES[table][0].split(',')]
+        match_sql = ' AND '.join(f"{column} IS ?" for column in columns)
+        for key in key_set:
+            conn.execute(f"DELETE FROM {table} WHERE {match_sql}", key)
+            conn.execute(f"INSERT INTO {table} {aggregate_sql(table, match_sql)}", key)
+    print_it("recounted " + ", ".join(f"{len(key_set)} {table}" for table, key_set in keys.items()))
+
+def apply_delta(conn: sqlite3.Connection, updates: List[Tuple[int, Dict]], deletes: List[int], inserts: List[Dict],
+                verify: bool = False, metrics: Metrics = None):
+    """
+    Writes the delta & redoes the touched rows' derived data in one transaction (nothing is kept if any step fails)
+    """
+    metrics = metrics or Metrics()
+    set_sql = ', '.join(f"[{name}] = :{name}" for name in ROW_COLUMNS)
+    with conn:
+        conn.execute("BEGIN")
+        with metrics.stage('derived'):
+            removed = set(deletes) | {rowid for rowid, row in updates}
+            keys = aggregate_keys(conn, removed)
+        with metrics.stage('write'):
+            conn.executemany("DELETE FROM headnotes WHERE rowid = ?", [(rowid,) for rowid in deletes])
+            conn.executemany(f"UPDATE headnotes SET {set_sql} WHERE rowid = :rowid",
+                             [{**row, 'rowid': rowid} for rowid, row in updates])
+            current = {rowid for rowid, row in updates}
+            for row in inserts:
+                current.add(conn.execute(insert_sql('headnotes', HEADNOTE_COLUMNS), {**row, 'index': None}).lastrowid)
+        with metrics.stage('derived'):
+            relink_headnotes(conn, set(deletes), current)
+            for table, found in aggregate_keys(conn, current).items():
+                keys[table] |= found
+            refresh_aggregates(conn, keys)
+        if verify:
+            with metrics.stage('verify'):
+                verify_aggregate_tables(conn)
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Apply a new headnotes release to luba.db in place")
+    arg_parser.add_argument('headnotes', help="new headnotes .json or .jsonl (parser or combiner output)")
+    arg_parser.add_argument('db_path', nargs='?', default=lubaDB, help=f"database to update (default {lubaDB})")
+    arg_parser.add_argument('--dry-run', action='store_true', help="only report what would change")
+    arg_parser.add_argument('--verify', action='store_true', help="check every count table against a full recount before committing")
+    arg_parser.add_argument('--metrics', metavar='RESULTS_JSON',
+                            help="add stage times to this Headnotes_Results_*.json (metrics.db update)")
+    arg_parser.add_argument('--profile', action='store_true', help="profile the run (cProfile & peak memory)")
+    args = arg_parser.parse_args()
+    metrics = Metrics(profile=args.profile)
+
+    conn = sqlite3.connect(args.db_path)
+    print_it(f"reading {args.db_path} & {args.headnotes} ...")
+    with metrics.stage('read'):
+        live = load_live_rows(conn)
+        release = load_release_rows(conn, args.headnotes)
+    with metrics.stage('match'):
+        updates, deletes, inserts, unchanged = find_delta(live, release)
+    print_it(f"{len(inserts)} added, {len(deletes)} removed, {len(updates)} changed, {unchanged} unchanged")
+    for name, amount in (('added', len(inserts)), ('removed', len(deletes)), ('changed', len(updates)), ('unchanged', unchanged)):
+        metrics.count(name, amount)
+
+    if args.dry_run:
+        print_it("dry run, nothing written")
+    elif updates or deletes or inserts:
+        apply_delta(conn, updates, deletes, inserts, args.verify, metrics)
+        print_it(f"committed to {args.db_path} (re-run 'datasette inspect' if serving with -i)")
+    conn.close()
+    metrics.finish(profile_path_for(args.metrics or args.db_path, 'db update') if args.profile else None)
+    if args.metrics:
+        metrics.save(args.metrics, 'db update')
+    metrics.report()
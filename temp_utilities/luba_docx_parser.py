@@ -5,12 +5,45 @@ Converted to DOCX manually using Word
 to run type 'python luba_docx_parser.py <doc name.docx>'
 """
 
-import re, json, os, traceback
-from typing import List, Dict
+import contextlib, re, json, os, time, traceback, zipfile
+import xml.etree.ElementTree as ET
+from typing import List, Dict, Iterator
+from citation_extractor import extract_citations
+from headnote_tokenizer import TimeBudget, find_topic, find_last_case_name, find_reporter, find_luba_no
+from headnote_cache import HeadnoteCache, hash_paragraphs, hash_normalized, normalized_xml
+from headnote_io import write_record, iter_records
+from pipeline_metrics import Metrics, DEFAULT_SLOWEST, profile_path_for
 
-def parse_docx_headnotes(file_path: str) -> List[Dict]:
+# WordprocessingML namespace used by word/document.xml
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Headnotes per chunk handed to each worker process when running with --workers
+CHUNK_SIZE = 250
+
+# Seconds allowed to parse one headnote before it's flagged & skipped over (--time-budget)
+DEFAULT_TIME_BUDGET = 2.0
+
+# Bump whenever extract_headnote_data output changes, so --cache entries from older code get re-parsed
+PARSER_VERSION = '2'
+
+# Warning added to headnotes that ran out of time (these aren't cached)
+TIME_BUDGET_WARNING_START = "Parsing took longer than"
+TIME_BUDGET_WARNING = TIME_BUDGET_WARNING_START + " {seconds}s time budget; headnote skipped over, check by hand"
+
+# Default parse cache file for --cache
+DEFAULT_CACHE_FILE = "headnote_parse_cache.db"
+
+# Topic pattern the tokenizer follows (quoted in warnings)
+TOPIC_PATTERN = r'^(?:[\d.]{2,}\s+)([\s\S]+?[^S-U0-9]\.)'
+
+# summary whitespace collapsed by collapse_spaces
+WHITESPACE_RUN = re.compile(r'\s+')
+
+def parse_docx_headnotes(file_path: str, with_hash: bool = False, metrics: Metrics = None) -> List[Dict]:
     """
     Parse DOCX file and extract headnotes with formatting
+    (with_hash adds 'source_hash' of the headnote's paragraph XML, used by the --cache)
+    (metrics gets the 'docx load' & 'paragraph walk' times)
     """
     try:
         from docx import Document
@@ -20,9 +53,13 @@ def parse_docx_headnotes(file_path: str) -> List[Dict]:
 
     print(f"Reading DOCX: {file_path}")
 
-    wordDoc = Document(file_path)
+    metrics = metrics or Metrics()
+    with metrics.stage('docx load'):
+        wordDoc = Document(file_path)
+    walk_start = time.perf_counter()
     headNotes = []
     current_headnote = None
+    current_elements = []
 
     for para in wordDoc.paragraphs:
         text = para.text.strip()
@@ -35,32 +72,171 @@ def parse_docx_headnotes(file_path: str) -> List[Dict]:
         if headnote_match:
             # Save previous headnote if it exists
             if current_headnote:
+                if with_hash:
+                    current_headnote['source_hash'] = hash_paragraphs(current_elements)
                 headNotes.append(current_headnote)
+            current_elements = [para._element]
 
             # Start new current headnote
             current_headnote = {
                 'headnote_number': headnote_match.group(1),
-                'formatting': extract_formatting(para),
+                'formatting': extract_formatting(para, text),
                 'raw_text': text
             }
         elif current_headnote:
             # Continue existing current headnote
+            offset = len(current_headnote['raw_text']) + 1
             current_headnote['raw_text'] += ' ' + text
+            current_elements.append(para._element)
 
             # Add formatting from this paragraph
-            para_formatting = extract_formatting(para)
+            para_formatting = shift_formatting(extract_formatting(para, text), offset)
             current_headnote['formatting'].extend(para_formatting)
 
     # Picking up the last headnote
     if current_headnote:
+        if with_hash:
+            current_headnote['source_hash'] = hash_paragraphs(current_elements)
         headNotes.append(current_headnote)
 
+    metrics.add_time('paragraph walk', time.perf_counter() - walk_start)
     print(f"Found {len(headNotes)} headnotes")
     return headNotes
 
-def extract_formatting(paragraph) -> List[Dict]:
+def iter_docx_headnotes(file_path: str, with_hash: bool = False, metrics: Metrics = None) -> Iterator[Dict]:
+    """
+    Streaming version of parse_docx_headnotes: reads word/document.xml straight out of the zip
+    and yields each raw headnote ({headnote_number, formatting, raw_text}) as soon as the next one starts.
+    Doesn't need python-docx & memory stays flat however big the file is
+    (with_hash adds 'source_hash' of the headnote's paragraph XML, used by the --cache)
+    (metrics gets the 'paragraph walk' time, not counting the time the caller spends between headnotes)
+    """
+    print(f"Streaming DOCX: {file_path}")
+
+    metrics = metrics or Metrics()
+    walk_start = time.perf_counter()
+    count = 0
+    current_headnote = None
+    current_xml = []
+
+    for text, runs_data, p_elem in iter_docx_paragraphs(file_path):
+        text = text.strip()
+        if not text:
+            continue
+
+        headnote_match = re.match(r'^((?:\d{1,2}\.)+\d{0,2})(?=\D)', text)
+
+        if headnote_match:
+            if current_headnote:
+                if with_hash:
+                    current_headnote['source_hash'] = hash_normalized(current_xml)
+                count += 1
+                metrics.add_time('paragraph walk', time.perf_counter() - walk_start)
+                yield current_headnote
+                walk_start = time.perf_counter()
+
+            current_headnote = {
+                'headnote_number': headnote_match.group(1),
+                'formatting': consolidate_runs(runs_data, text),
+                'raw_text': text
+            }
+            current_xml = [normalized_xml(p_elem)] if with_hash else []
+        elif current_headnote:
+            offset = len(current_headnote['raw_text']) + 1
+            current_headnote['raw_text'] += ' ' + text
+            current_headnote['formatting'].extend(shift_formatting(consolidate_runs(runs_data, text), offset))
+            if with_hash:
+                current_xml.append(normalized_xml(p_elem))
+
+    metrics.add_time('paragraph walk', time.perf_counter() - walk_start)
+    if current_headnote:
+        if with_hash:
+            current_headnote['source_hash'] = hash_normalized(current_xml)
+        count += 1
+        yield current_headnote
+
+    print(f"Found {count} headnotes")
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[tuple]:
+    """
+    Yields (paragraph text, runs_data, <w:p> element) for each top level paragraph in the document body,
+    matching what python-docx returns for para.text & para.runs. Each paragraph is dropped from the tree once read.
+    """
+    with zipfile.ZipFile(file_path) as docx_zip:
+        with docx_zip.open('word/document.xml') as xml_file:
+            depth = 0
+            body = None
+            for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 2 and elem.tag == W_NS + 'body':
+                        body = elem
+                    continue
+
+                depth -= 1
+                if depth == 2 and elem.tag == W_NS + 'p' and body is not None:
+                    yield paragraph_text_and_runs(elem) + (elem,)
+                    body.remove(elem)
+                elif depth == 2 and body is not None:
+                    body.remove(elem)  # tables, sectPr, etc. aren't in wordDoc.paragraphs either
+
+def paragraph_text_and_runs(p_elem) -> tuple:
+    """
+    Text of a <w:p> element (runs & hyperlinks, like para.text) and formatting of its direct runs (like para.runs)
+    """
+    text_parts = []
+    runs_data = []
+    for child in p_elem:
+        if child.tag == W_NS + 'r':
+            run_text = run_element_text(child)
+            text_parts.append(run_text)
+            if run_text:
+                runs_data.append({
+                    'text': run_text,
+                    'bold': run_property(child, 'b'),
+                    'italic': run_property(child, 'i')
+                })
+        elif child.tag == W_NS + 'hyperlink':
+            text_parts.extend(run_element_text(r) for r in child.findall(W_NS + 'r'))
+    return ''.join(text_parts), runs_data
+
+def run_element_text(r_elem) -> str:
+    """
+    Text of a <w:r> element, with tabs & breaks translated the way python-docx does
+    """
+    pieces = []
+    for child in r_elem:
+        tag = child.tag
+        if tag == W_NS + 't':
+            pieces.append(child.text or '')
+        elif tag in (W_NS + 'tab', W_NS + 'ptab'):
+            pieces.append('\t')
+        elif tag == W_NS + 'br':
+            # only text-wrapping breaks (the default) count as a newline; page & column breaks are empty
+            if child.get(W_NS + 'type', 'textWrapping') == 'textWrapping':
+                pieces.append('\n')
+        elif tag == W_NS + 'cr':
+            pieces.append('\n')
+        elif tag == W_NS + 'noBreakHyphen':
+            pieces.append('-')
+    return ''.join(pieces)
+
+def run_property(r_elem, name: str):
+    """
+    Tri-state bold/italic (True, False, None if inherited) from a run's <w:rPr>, like run.bold & run.italic
+    """
+    rPr = r_elem.find(W_NS + 'rPr')
+    if rPr is None:
+        return None
+    prop = rPr.find(W_NS + name)
+    if prop is None:
+        return None
+    return prop.get(W_NS + 'val', 'true') in ('1', 'true', 'on')
+
+def extract_formatting(paragraph, paragraph_text: str = None) -> List[Dict]:
     """
     Extract bold/italic runs from a paragraph, consolidate adjacent runs
+    (with paragraph_text, the paragraph's stripped text, each block also gets its start & end in it)
     """
     # First, collect all runs with their formatting
     runs_data = []
@@ -72,7 +248,13 @@ def extract_formatting(paragraph) -> List[Dict]:
                 'italic': run.italic
             })
 
-    # Consolidate adjacent runs with same formatting
+    return consolidate_runs(runs_data, paragraph_text)
+
+def consolidate_runs(runs_data: List[Dict], paragraph_text: str = None) -> List[Dict]:
+    """
+    Consolidate adjacent bold/italic runs ({text, bold, italic}) into formatting blocks
+    (with paragraph_text, each block also gets its start & end position in that text)
+    """
     formatList = []
 
     # Bold runs
@@ -115,30 +297,89 @@ def extract_formatting(paragraph) -> List[Dict]:
             'text': italic_text.strip()
         })
 
+    if paragraph_text is not None:
+        add_formatting_offsets(formatList, paragraph_text)
+    return formatList
+
+def add_formatting_offsets(formatList: List[Dict], paragraph_text: str):
+    """
+    Adds start & end (position in paragraph_text) to each formatting block
+    Blocks of one type are in paragraph order, so each is looked for after the one before it
+    (a phrase that's only emphasized once isn't matched again further on)
+    """
+    search_from = {}
+    for fmt in formatList:
+        start = paragraph_text.find(fmt['text'], search_from.get(fmt['type'], 0))
+        if start == -1:
+            continue  # runs the paragraph text doesn't include; stays text only
+        fmt['start'] = start
+        fmt['end'] = start + len(fmt['text'])
+        search_from[fmt['type']] = fmt['end']
+
+def shift_formatting(formatList: List[Dict], offset: int) -> List[Dict]:
+    """
+    Moves block positions from paragraph text to headnote raw_text (paragraph starts at offset)
+    """
+    for fmt in formatList:
+        if 'start' in fmt:
+            fmt['start'] += offset
+            fmt['end'] += offset
     return formatList
 
-def extract_headnote_data(headnote: Dict) -> Dict:
+def collapse_spaces(text: str) -> tuple:
+    """
+    re.sub(r'\s+', ' ', text) that also returns positions: positions[i] = where text[i] ended up
+    (characters dropped from a run of whitespace map to that run's single space)
+    """
+    parts = []
+    positions = []
+    last = 0
+    kept = 0  # length of the collapsed text so far (a running count keeps this linear)
+    for match in WHITESPACE_RUN.finditer(text):
+        positions.extend(range(kept, kept + match.start() - last))
+        kept += match.start() - last
+        parts += [text[last:match.start()], ' ']
+        positions.extend([kept] * (match.end() - match.start()))
+        kept += 1
+        last = match.end()
+    parts.append(text[last:])
+    positions.extend(range(kept, kept + len(text) - last))
+    return ''.join(parts), positions
+
+def add_summary_offsets(formatting: List[Dict], summary_start: int, positions: List[int]):
+    """
+    Adds summary_start & summary_end to formatting blocks (with raw_text positions) that fall inside the summary
+    (summary_start = summary's position in raw_text; positions from collapse_spaces)
+    """
+    summary_end = summary_start + len(positions)
+    for fmt in formatting:
+        if 'start' in fmt and summary_start <= fmt['start'] and fmt['end'] <= summary_end and fmt['end'] > fmt['start']:
+            fmt['summary_start'] = positions[fmt['start'] - summary_start]
+            fmt['summary_end'] = positions[fmt['end'] - 1 - summary_start] + 1
+
+def extract_headnote_data(headnote: Dict, time_budget: float = DEFAULT_TIME_BUDGET) -> Dict:
     """
     Extract structured data from headnote
+    (gives up on a headnote that takes more than time_budget seconds and flags it with a warning)
     """
     raw_text = headnote['raw_text']
     warnings = []
+    budget = TimeBudget(time_budget)
 
     # Extract headnote number
     number = headnote['headnote_number']
 
     # Extract topic ("Headnote - subsection - sub-sub") without period
     # assumes topic doesn't end with num or capital letter to avoid tripping on "U.S." or "197.xxx"
-    topic_pattern = r'^(?:[\d.]{2,}\s+)([\s\S]+?[^S-U0-9]\.)'
-    topic_match = re.search(topic_pattern, raw_text)
+    topic_match = find_topic(raw_text, budget)  # (topic, end position)
     topic = ""
     if topic_match:
-        topic = topic_match.group(1).strip().rstrip('.')
+        topic = topic_match[0].strip().rstrip('.')
     else:
-        warnings.append(f"No topic found in {raw_text} using {topic_pattern}")
+        warnings.append(f"No topic found in {raw_text} using {TOPIC_PATTERN}")
 
     # Validate whether topic & headnote number have same number of levels
-    en_dash_count = len(re.findall(r'\u2013', topic))
+    en_dash_count = topic.count('\u2013')
     dot_count = len(re.findall(r'\.\d', number))
     if not en_dash_count == dot_count:
         warnings.append(f"Headnote '{number}' & topic '{topic}' appear mismatched")
@@ -152,16 +393,15 @@ def extract_headnote_data(headnote: Dict) -> Dict:
             if re.match(r'^v\.\s', case_name):  # dealing with situation where first party is italicized in separate italicized run (e.g., "some guy" "v. county")
                 if len(italic_blocks) > 1:
                     case_name = italic_blocks[-2].strip() + " " + case_name
-                    print (case_name)
                     del headnote['formatting'][-2]
                     warnings.append(f"Case italicization was broken; check reporter for {case_name}")
                 else:
                     warnings.append(f"Missing party before 'v.' in case {case_name}")
             del headnote['formatting'][-1]
         else:
-            match_vs = re.findall(r'\S*?\sv\.\s[\s\S]*?,', raw_text)  # cruder regular expressions search as backup
+            match_vs = find_last_case_name(raw_text, budget)  # cruder "<word> v. <party>," search as backup
             if match_vs:
-                case_name = match_vs[len(match_vs)-1].strip(" ,") # takes last reporter
+                case_name = match_vs.strip(" ,") # takes last reporter
                 warnings.append(f'No italicized case name; case "{case_name}" was parsed via regular expressions, may be missing part of party name')
             else:
                 warnings.append('No italicized case name found; no LUBA case found by regular expressions')
@@ -169,7 +409,7 @@ def extract_headnote_data(headnote: Dict) -> Dict:
     # Remove topic from formatting list
     if len(headnote['formatting']) > 0 and headnote['formatting'][0]['type'] == 'bold':
         checkText = headnote['formatting'][0]['text']
-        if re.match(number, checkText) or re.match(topic, checkText):
+        if checkText.startswith(number) or checkText.startswith(topic):
             del headnote['formatting'][0]
 
     # Extract reporter (#### Or LUBA YYYY) by looking after the case name
@@ -180,66 +420,50 @@ def extract_headnote_data(headnote: Dict) -> Dict:
         case_name_pos = raw_text.rfind(case_name)
         if case_name_pos != -1:
             text_after_case = raw_text[case_name_pos + len(case_name):].strip()
-            text_after_case = re.sub(r' OR ', ' Or ', text_after_case) # turn any "OR" into "Or"
+            text_after_case = text_after_case.replace(' OR ', ' Or ') # turn any "OR" into "Or"
             # Look for reporter pattern: "## Or LUBA ### (YYYY)" cases on/before 2020
-            reporter_pattern = r'\s*(\d+\s+Or\s+LUBA\s+\d+)\s+\((\d{4})\)'
-            reporter_pattern = re.search(reporter_pattern, text_after_case)
-            if reporter_pattern:
-                reporter = reporter_pattern.group(1).strip()
+            reporter_match = find_reporter(text_after_case, budget)
+            if reporter_match:
+                reporter = reporter_match[0].strip()
                 try:
-                    year = int(reporter_pattern.group(2))
+                    year = int(reporter_match[1])
                 except:
                     year = None
                     warnings.append(f'No case year found in {text_after_case}')
 
             # method for retrieving reporters after circa 2020
             if not (reporter):
-                post_reporter_match = r'LUBA Nos? \d{4}-([0-9/-])+\s\(\w{3,4}\s\d{1,2},\s(\d{4})\)'
-                post_match = re.search(post_reporter_match, text_after_case)
+                post_match = find_luba_no(text_after_case, budget)  # "LUBA No YYYY-NNN (Mon DD, YYYY)"
                 if post_match:
-                    reporter = post_match.group(0).strip()
+                    reporter = post_match[0].strip()
                     try:
-                        year = int(post_match.group(2))
+                        year = int(post_match[1])
                     except:
                         year = None
                         warnings.append(f'No case year found in {text_after_case}')
-                # NOTE: We could extract month (or full date) too from group (1), but don't have a place to put it yet
+                # NOTE: We could extract month (or full date) too, but don't have a place to put it yet
                 else:
                     warnings.append(f'No case cite found in {text_after_case}')
 
-    # Extract summary (between topic and case name)
-    summary = raw_text
-    if topic_match:
-        summary = summary[topic_match.end():].strip()
+    # Extract summary (between topic and case name), keeping track of where it is in raw_text
+    summary_start = topic_match[1] if topic_match else 0
+    summary = raw_text[summary_start:]
+    summary_start += len(summary) - len(summary.lstrip())
+    summary = summary.strip()
     if case_name:
         case_name_pos = summary.rfind(case_name)
         if case_name_pos != -1:
             summary = summary[:case_name_pos].strip()
 
-    # Remove double spaces
-    summary = re.sub(r'\s+', ' ', summary).strip()
-
-    # Extract ORS citations
-    ors_pattern = r'(\d{1,3}[A-C]?\.\d{3,4})(?=\D)'
-    ors_cites = re.findall(ors_pattern, summary)
-
-    # Extract & normalize OAR citations
-    oar_pattern = r'((\d{3})-(\d{2,4})-(\d{2,4}))(?=\D)'
-    oar_cite_pieces = re.findall(oar_pattern, summary)
-    oar_cites = []
-    for cite in oar_cite_pieces:
-        first = f"{int(cite[1]):03d}"
-        second = f"{int(cite[2]):03d}"
-        third = f"{int(cite[3]):04d}"
-        oar_cites.append (f"{first}-{second}-{third}")
-
-    # Extract case citations (excluding the main case)
-    state_cases_pattern = r'\d{1,3}\sOr\.?\s*(?:App\.?|LUBA)?\s*\d{1,4}'
-    scotus_cases_pattern = r'\d{1,3}\sU\.?S\.?\s\d{1,4}'
-    pac_fed_reporter_pattern = r'\d{1,3}\s(?:F|P)\.?\dd\s\d{1,4}'
-    case_cites = re.findall(state_cases_pattern, summary)
-    case_cites += re.findall(scotus_cases_pattern, summary)
-    case_cites += re.findall(pac_fed_reporter_pattern, summary)
+    # Remove double spaces (& line formatting blocks up with the summary)
+    summary, positions = collapse_spaces(summary)
+    add_summary_offsets(headnote['formatting'], summary_start, positions)
+
+    # Extract ORS, OAR & case citations (excluding the main case)
+    cites = extract_citations(summary)
+
+    if budget.expired:
+        warnings.append(TIME_BUDGET_WARNING.format(seconds=budget.seconds))
 
     return {
         'headnote': number,
@@ -248,116 +472,296 @@ def extract_headnote_data(headnote: Dict) -> Dict:
         'case_name': case_name,
         'reporter': reporter,
         'year': year,
-        'ors_cites': list(set(ors_cites)),  # Removes duplicates
-        'oar_cites': list(set(oar_cites)),
-        'case_cites': list(set(case_cites)),
+        'ors_cites': cites['ors_cites'],
+        'oar_cites': cites['oar_cites'],
+        'case_cites': cites['case_cites'],
         'formatting': headnote['formatting'],
         'warnings': warnings
     }
 
-def process_docx_file(docx_path: str, output_meta: str, output_json: str = None) -> List[Dict]:
+def extract_headnote_chunk(chunk: List[tuple], time_budget: float = DEFAULT_TIME_BUDGET) -> List[tuple]:
+    """
+    Runs extract_headnote_data over a chunk of (index, raw headnote) pairs
+    Returns (index, parsed, error_info, seconds) for each; top level so process pool workers can pickle it
+    """
+    results = []
+    for i, raw_headnote in chunk:
+        start = time.perf_counter()
+        try:
+            results.append((i, extract_headnote_data(raw_headnote, time_budget), None, time.perf_counter() - start))
+        except Exception as e:
+            error_info = {
+                'index': i,
+                'error': str(e),
+                'preview': raw_headnote['raw_text'][:100] + "..."
+            }
+            results.append((i, None, (error_info, traceback.format_exc()), time.perf_counter() - start))
+    return results
+
+def iter_chunks(items, chunk_size: int) -> Iterator[List[tuple]]:
+    """
+    Splits any iterable (incl. streamed headnotes) into lists of (index, item) of chunk_size
+    """
+    chunk = []
+    for i, item in enumerate(items):
+        chunk.append((i, item))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_pool_results(chunks, workers: int, time_budget: float = DEFAULT_TIME_BUDGET) -> Iterator[tuple]:
+    """
+    Sends chunks to a process pool, yielding results back in original order
+    (keeps only a few chunks in flight at a time so streamed input isn't all read into memory)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(extract_headnote_chunk, chunk, time_budget))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def iter_cached_results(chunks, cache: HeadnoteCache, run_chunks) -> Iterator[tuple]:
+    """
+    Serves headnotes found in the cache directly & only sends the rest to run_chunks (serial or pool)
+    Yields (index, parsed, error, seconds) in original order, saving newly parsed headnotes to the cache
+    (seconds is None for cached headnotes)
+    """
+    from collections import deque
+
+    pending = deque()  # (chunk, {index: cached result}) waiting to be yielded
+
+    def miss_chunks():
+        for chunk in chunks:
+            cached, misses = cache.split_chunk(chunk)
+            pending.append((chunk, cached))
+            if misses:
+                yield misses
+
+    results = run_chunks(miss_chunks())
+    early_results = deque()  # results pulled while looking for the next pending chunk
+    while True:
+        if not pending:
+            try:
+                early_results.append(next(results))
+            except StopIteration:
+                if not pending:
+                    return
+            continue
+        chunk, cached = pending.popleft()
+        for i, raw_headnote in chunk:
+            if i in cached:
+                yield i, cached[i], None, None
+                continue
+            result = early_results.popleft() if early_results else next(results)
+            parsed = result[1]
+            timed_out = parsed and any(w.startswith(TIME_BUDGET_WARNING_START) for w in parsed['warnings'])
+            if parsed is not None and not timed_out:
+                cache.put(raw_headnote['source_hash'], parsed)
+            yield result
+
+def process_docx_file(docx_path: str, output_meta: str, output_json: str = None, stream: bool = False,
+                      workers: int = 1, time_budget: float = DEFAULT_TIME_BUDGET, cache_path: str = None,
+                      jsonl: bool = False, slowest: int = DEFAULT_SLOWEST, profile: bool = False) -> List[Dict]:
     """
     Main processing function
+    (stream = read headnotes one at a time with iter_docx_headnotes instead of loading whole doc w/ python-docx)
+    (workers > 1 = split headnotes into chunks run by a process pool; output is the same as a serial run)
+    (time_budget = seconds allowed per headnote before it's flagged in warnings)
+    (cache_path = SQLite file of previously parsed headnotes; only new or edited headnotes get parsed)
+    (jsonl = write output_json as JSON Lines while parsing instead of keeping every headnote in memory;
+     returns an empty list, read the file back with headnote_io.iter_records)
+    (slowest = how many of the slowest headnotes to list; profile = cProfile & tracemalloc the run, saving a .prof
+     next to output_meta; stage times, counts & these go in output_meta's metrics block, see pipeline_metrics.py)
     """
 
     if not os.path.exists(docx_path):
         print(f"Error. Word file not found at: {docx_path}")
         return []
 
-    # Parse raw headnotes into list with formatting
-    raw_headnotes = parse_docx_headnotes(docx_path)
+    metrics = Metrics(slowest=slowest, profile=profile)
 
-    if not raw_headnotes:
-        print("Error. No headnotes found")
-        return []
+    # Parse raw headnotes into list (or generator) with formatting
+    if stream:
+        # the zip is opened lazily, so streaming has no separate docx load
+        raw_headnotes = iter_docx_headnotes(docx_path, with_hash=bool(cache_path), metrics=metrics)
+    else:
+        raw_headnotes = parse_docx_headnotes(docx_path, with_hash=bool(cache_path), metrics=metrics)
+
+        if not raw_headnotes:
+            print("Error. No headnotes found")
+            metrics.finish()
+            return []
 
     # Process each headnote
     parsed_headnotes = []
+    parsed_count = 0
     errors = []
     parse_warning_list = []
 
-    for i, raw_headnote in enumerate(raw_headnotes):
-        try:
-            parsed = extract_headnote_data(raw_headnote)
+    extract_start = time.perf_counter()
+    if workers > 1:
+        print(f"Extracting headnote data with {workers} worker processes...")
+        run_chunks = lambda chunks: iter_pool_results(chunks, workers, time_budget)
+    else:
+        run_chunks = lambda chunks: (result for chunk in chunks for result in extract_headnote_chunk(chunk, time_budget))
+
+    cache_stats = None
+    # the cache & JSON Lines file are closed however extraction ends (a worker or cache error included)
+    with contextlib.ExitStack() as open_files:
+        if cache_path:
+            cache = open_files.enter_context(HeadnoteCache(cache_path, PARSER_VERSION))
+            results = iter_cached_results(iter_chunks(raw_headnotes, CHUNK_SIZE), cache, run_chunks)
+        else:
+            cache = None
+            results = run_chunks(iter_chunks(raw_headnotes, CHUNK_SIZE))
+        jsonl_file = open_files.enter_context(open(output_json, 'w', encoding='utf-8')) if jsonl and output_json else None
+        for i, parsed, error, seconds in results:
+            if error:
+                error_info, error_trace = error
+                errors.append(error_info)
+                print(f"Error parsing headnote {i}: {error_info['error']} : {error_trace}")
+                continue
             parsed['index'] = str(i)
+            if seconds is not None:
+                metrics.entry(f"item {i}: {parsed['headnote']} {parsed['case_name']}", seconds)
             for a_warning in parsed['warnings']:
                 parse_warning_list.append(f'item {i}: {a_warning}')
-            parsed_headnotes.append(parsed)
-        except Exception as e:
-            error_info = {
-                'index': i,
-                'error': str(e),
-                'preview': raw_headnote['raw_text'][:100] + "..."
-            }
-            errors.append(error_info)
-            print(f"Error parsing headnote {i}: {e} : {traceback.format_exc()}")
+            parsed_count += 1
+            if jsonl_file:
+                with metrics.stage('json write'):
+                    write_record(jsonl_file, parsed)
+            else:
+                parsed_headnotes.append(parsed)
+        if cache and (parsed_count or errors):  # an empty read would evict the whole cache
+            cache_stats = cache.finish()
+    if jsonl_file:
+        print(f"Saved file as : {output_json}")
+    # streamed reading & JSON Lines writing happen during extraction, so don't count them twice
+    metrics.add_time('extraction', time.perf_counter() - extract_start - (metrics.stages['paragraph walk'] if stream else 0)
+                     - metrics.stages.get('json write', 0))
+    metrics.count('headnotes', parsed_count)
+    metrics.count('errors', len(errors))
+    metrics.count('warnings', len(parse_warning_list))
+
+    if stream and not parsed_count and not errors:
+        print("Error. No headnotes found")
+        metrics.finish()
+        return []
 
-    print(f"Successfully parsed __{len(parsed_headnotes)}__ headnotes")
+    print(f"Successfully parsed __{parsed_count}__ headnotes")
     if errors:
         print(f"Errors: {len(errors)}")
 
+    if cache_stats:
+        metrics.count('cache hits', cache_stats['hits'])
+        print(f"Cache: {cache_stats['hits']} unchanged (from cache), {cache_stats['misses']} new or edited (parsed), "
+              f"{cache_stats['evicted']} stale entries removed")
+
     # Save results
-    if output_json:
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(parsed_headnotes, f, indent=2, ensure_ascii=False)
+    if output_json and not jsonl:
+        with metrics.stage('json write'):
+            with open(output_json, 'w', encoding='utf-8') as f:
+                json.dump(parsed_headnotes, f, indent=2, ensure_ascii=False)
 
         print(f"Saved file as : {output_json}")
 
     if output_meta:
         metadata = {
             'metadata': {
-                'total_headnotes': len(parsed_headnotes),
+                'total_headnotes': parsed_count,
                 'parsing_failures': len(errors),
                 'possible_errors': parse_warning_list,
                 'processed_date': str(__import__('datetime').datetime.now()),
                 'errors': errors if errors else []
             }
         }
+        if cache_stats:
+            metadata['metadata']['cache'] = cache_stats
+        metadata['metadata']['metrics'] = {'parse': metrics.finish(profile_path_for(output_meta, 'parse') if profile else None)}
         with open(output_meta, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
 
         print(f"Saved file as : {output_meta}")
 
+    metrics.finish()
+    metrics.report()
+
     return parsed_headnotes
 
 # entry into program
 if __name__ == "__main__":
-    import sys
+    import sys, argparse
+
+    arg_parser = argparse.ArgumentParser(description="Parse LUBA headnotes Word file into JSON")
+    arg_parser.add_argument('docx_file', help="headnotes .docx file")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help="stream word/document.xml directly (faster, low memory, no python-docx needed)")
+    arg_parser.add_argument('--workers', type=int, default=1, metavar='N',
+                            help="extract headnote data with N worker processes (default 1 = serial)")
+    arg_parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, metavar='SECONDS',
+                            help=f"flag & skip any headnote taking longer than this to parse (default {DEFAULT_TIME_BUDGET})")
+    arg_parser.add_argument('--jsonl', action='store_true',
+                            help="write headnotes as JSON Lines (one per line) while parsing, instead of one JSON array")
+    arg_parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_FILE, default=None, metavar='CACHE_FILE',
+                            help=f"reuse results for unchanged headnotes from CACHE_FILE (default {DEFAULT_CACHE_FILE})")
+    arg_parser.add_argument('--slowest', type=int, default=DEFAULT_SLOWEST, metavar='N',
+                            help=f"list the N headnotes that took longest to parse (default {DEFAULT_SLOWEST}, 0 = none)")
+    arg_parser.add_argument('--profile', action='store_true',
+                            help="profile the run (cProfile, saved as .prof next to the results file) & track peak memory")
+    args = arg_parser.parse_args()
 
     # Check for python-docx
-    try:
-        import docx
-    except ImportError:
-        print("Missing required package. Install:")
-        print("pip install python-docx")
-        sys.exit(1)
-
-    if len(sys.argv) < 1:
-        print("Docx file missing. Type 'python docx_parser.py <docx_file>'")
-        sys.exit(1)
-
-    docx_file = sys.argv[1]
+    if not args.stream:
+        try:
+            import docx
+        except ImportError:
+            print("Missing required package. Install:")
+            print("pip install python-docx")
+            print("(or run with --stream)")
+            sys.exit(1)
+
+    docx_file = args.docx_file
     date_stamp = str(__import__('datetime').datetime.now().strftime("%Y-%m-%d--%H-%M"))
-    json_output = f"LUBA_headnotes_{date_stamp}.json"
+    json_output = f"LUBA_headnotes_{date_stamp}.json" + ("l" if args.jsonl else "")
     json_output_meta = f"Headnotes_Results_{date_stamp}.json"
 
     # run parser to return headnotes as list
-    headnotes = process_docx_file(docx_file, json_output_meta, json_output)
-
-    if headnotes:
-        # Summary stats
-        years = [h['year'] for h in headnotes if h['year']]
-        topics = [h['topic'] for h in headnotes if h['topic']]
-        ors_total = sum(len(h.get('ors_cites', [])) for h in headnotes)
-        oar_total = sum(len(h.get('oar_cites', [])) for h in headnotes)
-        cases_total = sum(len(h.get('case_cites', [])) for h in headnotes)
-        errors_total = sum(len(h.get('warning_list',[])) for h in headnotes)
+    headnotes = process_docx_file(docx_file, json_output_meta, json_output, stream=args.stream, workers=args.workers,
+                                  time_budget=args.time_budget, cache_path=args.cache, jsonl=args.jsonl,
+                                  slowest=args.slowest, profile=args.profile)
+    if args.jsonl and os.path.exists(json_output):
+        headnotes = iter_records(json_output)
+
+    # Summary stats (one pass, so JSON Lines output is read back a line at a time)
+    years = []
+    topics = set()
+    topic_total = ors_total = oar_total = cases_total = errors_total = 0
+    for h in headnotes:
+        if h['year']:
+            years.append(h['year'])
+        if h['topic']:
+            topics.add(h['topic'])
+            topic_total += 1
+        ors_total += len(h.get('ors_cites', []))
+        oar_total += len(h.get('oar_cites', []))
+        cases_total += len(h.get('case_cites', []))
+        errors_total += len(h.get('warning_list',[]))
+
+    if topic_total or years:
         print(f"\n Summary:")
         if years:
             print(f"Years: {min(years)} - {max(years)}")
         if topics:
-            print(f"      Total headnotes: {len(topics)}")
-            print(f"     Unique headnotes: {len(set(topics))}")
+            print(f"      Total headnotes: {topic_total}")
+            print(f"     Unique headnotes: {len(topics)}")
             print(f"  ORS citations found: {ors_total}")
             print(f"  OAR citations found: {oar_total}")
             print(f" Court case citations: {cases_total}")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LUBA site: serves the saved listing pages in fixtures/luba_site/ (same paths as on
+www.oregon.gov, e.g. /luba/Pages/Final-Opinions.aspx) with ETag & Last-Modified headers, answering conditional
+requests with 304 like the live site, so luba_opinions_ingest.py can be built & tested offline
+Edit (or touch) a saved page to make it "change" on the next refresh
+to run type 'python luba_fixture_server.py [--port 8766] [--latency 0.2]'
+(or let 'python luba_opinions_ingest.py --fixtures' start one in the background)
+"""
+
+import hashlib, os, threading, time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+from urllib.parse import unquote, urlsplit
+
+# CONFIG ********
+FIXTURE_ROOT = Path(__file__).resolve().parent / "fixtures" / "luba_site"
+PORT = 8766
+# ********
+
+CONTENT_TYPES = {'.aspx': 'text/html; charset=utf-8', '.html': 'text/html; charset=utf-8', '.pdf': 'application/pdf'}
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    GET/HEAD for files under server.root; 304 when If-None-Match (or, without it, If-Modified-Since) still matches
+    """
+    def do_GET(self):
+        self.send_page(with_body=True)
+
+    def do_HEAD(self):
+        self.send_page(with_body=False)
+
+    def send_page(self, with_body: bool):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        root = self.server.root
+        path = (root / unquote(urlsplit(self.path).path).lstrip('/')).resolve()
+        if root not in path.parents or not path.is_file():
+            self.send_error(404)
+            return
+        body = path.read_bytes()
+        modified = int(path.stat().st_mtime)
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if self.not_modified(etag, modified):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(path.suffix, 'application/octet-stream'))
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(modified, usegmt=True))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def not_modified(self, etag: str, modified: int) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(root: Path = FIXTURE_ROOT, port: int = PORT, latency: float = 0, verbose: bool = False) -> ThreadingHTTPServer:
+    """
+    Fixture server bound to 127.0.0.1:port (port 0 = any free port); latency = seconds added to every response
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.daemon_threads = True
+    server.root = Path(root).resolve()
+    server.latency = latency
+    server.verbose = verbose
+    return server
+
+def start_background(root: Path = FIXTURE_ROOT, port: int = 0, latency: float = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    (server, site URL) with the server running in a daemon thread (stop it with server.shutdown())
+    """
+    server = make_server(root, port, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Serve the saved LUBA listing pages locally")
+    arg_parser.add_argument('--port', type=int, default=PORT, help=f"port (default {PORT})")
+    arg_parser.add_argument('--root', default=FIXTURE_ROOT, help="folder of saved pages (default fixtures/luba_site)")
+    arg_parser.add_argument('--latency', type=float, default=0, help="seconds to wait before each response (slow site)")
+    args = arg_parser.parse_args()
+
+    server = make_server(args.root, args.port, args.latency, verbose=True)
+    print_it(f"serving {server.root} at http://127.0.0.1:{server.server_address[1]} (point the ingester's --site here)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
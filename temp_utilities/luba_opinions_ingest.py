@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Python take on luba_scraper.js without the browser: fetches LUBA's Final Opinions & Published Orders listings and
+their year pages with one pooled HTTP client (N pages at a time), parses them into opinions rows & upserts them
+Every page's ETag/Last-Modified & content hash are kept in listing_pages, so a refresh sends conditional requests and
+only reparses pages that changed (304 or the same content => nothing to do)
+Rows are matched to the table's by url, then LUBA No, so they keep their index (headnotes' pub_* columns point at it);
+a resolved decision day (e.g. "(Dec 3, 2021)" instead of "(Dec ?, 2021)") isn't put back to "?" by a refresh
+--fixtures serves the saved pages in fixtures/luba_site/ locally (luba_fixture_server.py) to work offline
+to run type 'python luba_opinions_ingest.py [opinions.db] [--fixtures | --site URL] [--years 2021 2020] [--json <opinions.json>]'
+(--json writes the table in luba_scraper.js' shape for headnote_opinion_combiner.js & luba_db_build.py --opinions)
+"""
+
+import asyncio, datetime, hashlib, json, re, sqlite3, time
+from collections import defaultdict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+import httpx
+from pipeline_metrics import Metrics, profile_path_for
+from luba_db_build import OPINION_COLUMNS, create_table_sql, insert_sql
+
+# CONFIG ********
+opinionsDB = "luba_opinions.db"
+SITE_URL = "https://www.oregon.gov"
+CONCURRENCY = 4         # pages fetched at once (& pooled connections)
+# ********
+
+LISTING_PAGES = {'opinions': "/luba/Pages/Final-Opinions.aspx", 'orders': "/luba/Pages/Published-Orders.aspx"}
+DOCS_PREFIX = "/luba/Docs"  # taken off stored urls, like luba_scraper.js' urlTrim
+FIRST_YEAR = 1979
+REQUEST_TIMEOUT = 30
+RETRIES = 2             # more tries for connection errors & 5xx, RETRY_WAIT seconds apart (times the attempt)
+RETRY_WAIT = 2
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/147.0.7727.103 Safari/537.36"
+
+MONTHS = [("January", "01", "Jan"), ("February", "02", "Feb"), ("March", "03", "Mar"), ("April", "04", "Apr"),
+          ("May", "05", "May"), ("June", "06", "June"), ("July", "07", "July"), ("August", "08", "Aug"),
+          ("September", "09", "Sept"), ("October", "10", "Oct"), ("November", "11", "Nov"), ("December", "12", "Dec")]
+MONTH_NUMBERS = {name.upper(): number for name, number, abbr in MONTHS}
+MONTH_ABBRS = {number: abbr for name, number, abbr in MONTHS}
+
+LUBA_NO_PATTERN = re.compile(r"(\d{2})-(\d{3})")  # YY-###
+REPORTER_PATTERN = re.compile(r"(\d+\s+Or\s+LUBA\s+\d+)\s*\(\d{4}\)")
+CASE_PATTERN = re.compile(r".*v\..*(?=,)")
+DATE_PATTERN = re.compile(r"\(?\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+(\d{1,2}),\s*(\d{4})\)?")
+UNRESOLVED_DATE = "% ?, %"  # LIKE pattern for reporters still missing the decision day
+
+# listing & year pages fetched before: validators for conditional requests & what was found on them
+PAGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS listing_pages (
+       url TEXT PRIMARY KEY, source_type TEXT, year INTEGER, etag TEXT, last_modified TEXT, content_hash TEXT,
+       year_links TEXT, row_count INTEGER, checked TEXT
+    )"""
+PAGE_COLUMNS = ('url', 'source_type', 'year', 'etag', 'last_modified', 'content_hash', 'year_links', 'row_count', 'checked')
+ROW_COLUMNS = [name for name in OPINION_COLUMNS if name != 'index']
+
+# tags that start a new line in the page text (like the browser's innerText)
+BLOCK_TAGS = {'address', 'article', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'footer', 'h1', 'h2', 'h3', 'h4',
+              'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'section', 'table', 'td', 'th', 'tr', 'ul'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# collapsed like innerText does (non-breaking spaces are kept, they're in the stored names)
+SPACES = re.compile(r"[ \t\r\n\f]+")
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+class ListingPage(HTMLParser):
+    """
+    Links on the whole page ((url, text) in links) & the #main element's text lines & links (main_lines, main_links)
+    """
+    def __init__(self, page_url: str):
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.links, self.main_links, self.main_lines = [], [], []
+        self.main_depth = 0  # open tags inside #main (0 = outside it)
+        self.link_href, self.link_text = None, []
+        self.line = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.main_depth:
+            if tag not in VOID_TAGS:
+                self.main_depth += 1
+            if tag in BLOCK_TAGS:
+                self.end_line()
+        elif attrs.get('id') == 'main' and tag not in VOID_TAGS:
+            self.main_depth = 1
+        if tag == 'a' and attrs.get('href'):
+            self.link_href, self.link_text = urljoin(self.page_url, attrs['href']), []
+
+    def handle_startendtag(self, tag, attrs):
+        if self.main_depth and tag in BLOCK_TAGS:
+            self.end_line()
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.link_href:
+            text = SPACES.sub(' ', ''.join(self.link_text)).strip()
+            if text:
+                self.links.append((self.link_href, text))
+                if self.main_depth:
+                    self.main_links.append((self.link_href, text))
+            self.link_href = None
+        if self.main_depth and tag not in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self.end_line()
+            self.main_depth -= 1
+            if not self.main_depth:
+                self.end_line()
+
+    def handle_data(self, data):
+        if self.link_href:
+            self.link_text.append(data)
+        if self.main_depth:
+            self.line.append(data)
+
+    def end_line(self):
+        line = SPACES.sub(' ', ''.join(self.line)).strip()
+        if len(line) > 1:
+            self.main_lines.append(line)
+        self.line = []
+
+def read_page(html: str, page_url: str) -> ListingPage:
+    page = ListingPage(page_url)
+    page.feed(html)
+    page.close()
+    return page
+
+def year_links(html: str, page_url: str) -> Dict[int, str]:
+    """
+    {year: year page url} from a listing page's links whose text is just the year
+    """
+    last_year = datetime.date.today().year + 1
+    return {int(text): url for url, text in read_page(html, page_url).links
+            if re.fullmatch(r"\d{4}", text) and FIRST_YEAR <= int(text) <= last_year}
+
+def trim_url(url: str) -> str:
+    """
+    Stored url: the link's path without DOCS_PREFIX (e.g. /Opinions/2021/12-21/21065.pdf), whatever host served it
+    """
+    path = urlsplit(url).path.strip()
+    return path[len(DOCS_PREFIX):] if path.startswith(DOCS_PREFIX) else path
+
+def match_lines(lines: List[str], links: List[Tuple[str, str]]) -> Tuple[List[Dict], int]:
+    """
+    ([{month, text, luba_no, url, warnings}] for the case lines, lines skipped): each case line gets the month
+    heading above it & the link whose text has its LUBA No (when two do, the one filed under that month)
+    """
+    matches, skipped = [], 0
+    current_month = ""
+    for line in lines:
+        month = MONTH_NUMBERS.get(line.strip().upper())
+        if month:
+            current_month = month
+            continue
+        luba_no_match = LUBA_NO_PATTERN.search(line)
+        if not (luba_no_match and current_month):
+            skipped += 1
+            continue
+        luba_no = luba_no_match.group(0)
+        month_part = f"/{current_month}-"
+        url, luba_no_full, warnings = "", luba_no, []
+        for link_url, text in links:
+            if luba_no not in text:
+                continue
+            if not url:
+                url, luba_no_full = trim_url(link_url), text
+            elif month_part in link_url:
+                if month_part in url:
+                    warnings.append(f"LUBA No {luba_no} in url: {url} shares month with: {trim_url(link_url)}")
+                else:
+                    url, luba_no_full = trim_url(link_url), text
+
+        if not url:
+            warnings.append(f"LUBA No {luba_no} did not match any hyperlink text.")
+        else:
+            if month_part not in url:
+                any_month = re.search(r"/(\d{2})-", url)
+                warnings.append(f"Heading month: {current_month} doesn't match: "
+                                f"{any_month.group(1) if any_month else 'undefined'} in {url}")
+            if not re.search(f"{luba_no_match.group(1)}-?{luba_no_match.group(2)}", url):
+                warnings.append(f"LUBA No {luba_no} missing from url: {url}")
+        matches.append({'month': current_month, 'text': line.strip(), 'luba_no': luba_no_full, 'url': url,
+                        'warnings': warnings})
+    return matches, skipped
+
+def case_row(match: Dict, year: int, source_type: str) -> Dict:
+    """
+    opinions row for one matched case line; without an Or LUBA cite the reporter is
+    "LUBA No(s) <LUBA No> (<month> <day or ?>, <year>) [(Unpublished)]"
+    """
+    luba_no = match['luba_no']
+    case_name = match['text'].replace(luba_no, "", 1).strip()
+    if not case_name:
+        # 2006 in particular, the entire line is link text
+        luba_no = luba_no.split()[0]
+        case_name = match['text'].replace(luba_no, "", 1).strip()
+    reporter = ""
+    reporter_match = REPORTER_PATTERN.search(case_name)
+    if reporter_match:
+        reporter = reporter_match.group(1).strip()
+    elif "Unpublished" in case_name:
+        reporter = "(Unpublished)"
+    if re.match(r"\s?et\sseq", case_name):
+        luba_no += " et seq"
+        case_name = case_name.replace("et seq", "", 1).strip()
+    case_name = case_name.replace(reporter, "", 1).strip()
+    # decision date, when the line has one (otherwise the day stays "?")
+    month, day = match['month'], "?"
+    date_match = DATE_PATTERN.search(case_name)
+    if date_match and int(date_match.group(3)) == year:
+        month = next(number for name, number, abbr in MONTHS if name.startswith(date_match.group(1)))
+        day = str(int(date_match.group(2)))
+        case_name = case_name.replace(date_match.group(0), "", 1).strip()
+    if not re.search(r"Or\sLUBA", reporter):
+        plural = "Nos" if re.search(r"\d{2}-\d{3}.", luba_no) else "No"
+        reporter = f"LUBA {plural} {luba_no} ({MONTH_ABBRS[month]} {day}, {year}) {reporter}".strip()
+    case_name = case_name.replace(f"({year})", "", 1).strip()
+    case_match = CASE_PATTERN.search(case_name)
+    if case_match:
+        case_name = case_match.group(0).strip()
+    return {'name': case_name, 'year': year, 'month': match['month'], 'reporter': reporter, 'luba_no': luba_no,
+            'url': match['url'], 'source_type': source_type, 'warnings': json.dumps(match['warnings'], ensure_ascii=False)}
+
+def parse_year_page(html: str, page_url: str, year: int, source_type: str) -> List[Dict]:
+    """
+    opinions rows (no index yet) for one year page, in page order
+    """
+    page = read_page(html, page_url)
+    matches, skipped = match_lines(page.main_lines, page.main_links)
+    if skipped:
+        print_it(f"   {source_type} {year}: skipped {skipped} lines that aren't cases")
+    return [case_row(match, year, source_type) for match in matches]
+
+def open_db(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'opinions'").fetchone():
+        conn.execute(create_table_sql('opinions', OPINION_COLUMNS))
+    conn.execute("CREATE INDEX IF NOT EXISTS opinions_source_year ON opinions (source_type, year)")
+    conn.execute(PAGES_TABLE)
+    conn.commit()
+    return conn
+
+def load_pages(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    return {row['url']: dict(row) for row in conn.execute("SELECT * FROM listing_pages")}
+
+def save_page(conn: sqlite3.Connection, page: Dict):
+    conn.execute(f"INSERT OR REPLACE INTO listing_pages VALUES ({', '.join('?' * len(PAGE_COLUMNS))})",
+                 [page.get(name) for name in PAGE_COLUMNS])
+
+async def fetch_page(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str, known: Optional[Dict],
+                     force: bool = False) -> Dict:
+    """
+    {url, status, changed, text, etag, last_modified, content_hash} or {url, error}
+    Sends the validators saved for url (unless force); text is only kept when the page changed
+    """
+    headers = {}
+    if known and not force:
+        if known['etag']:
+            headers['If-None-Match'] = known['etag']
+        if known['last_modified']:
+            headers['If-Modified-Since'] = known['last_modified']
+    async with semaphore:
+        for attempt in range(RETRIES + 1):
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.TransportError as error:
+                failure = f"{type(error).__name__} {error}"
+            else:
+                if response.status_code < 500:
+                    break
+                failure = f"HTTP {response.status_code}"
+            # a connection error or 5xx: try again, or give up on the last attempt
+            if attempt == RETRIES:
+                return {'url': url, 'error': failure}
+            await asyncio.sleep(RETRY_WAIT * (attempt + 1))
+
+    fetched = {'url': url, 'status': response.status_code, 'etag': response.headers.get('ETag'),
+               'last_modified': response.headers.get('Last-Modified')}
+    if response.status_code == 304:
+        return {**fetched, 'changed': False, 'content_hash': known['content_hash'],
+                'etag': fetched['etag'] or known['etag'], 'last_modified': fetched['last_modified'] or known['last_modified']}
+    if response.status_code != 200:
+        return {'url': url, 'error': f"HTTP {response.status_code}"}
+    content_hash = hashlib.sha1(response.content).hexdigest()
+    changed = force or not known or known['content_hash'] != content_hash
+    return {**fetched, 'changed': changed, 'content_hash': content_hash, 'text': response.text if changed else None}
+
+def pair_rows(old_rows: List[Dict], new_rows: List[Dict]) -> Tuple[List[Tuple[Optional[Dict], Dict]], List[Dict]]:
+    """
+    ([(old row or None, new row)], old rows left over): paired on url, then LUBA No (fixed typos in either keep the
+    row's index); repeats (e.g. two orders under one LUBA No) pair up in page order
+    """
+    pairs = {id(new): None for new in new_rows}
+    unpaired = list(old_rows)
+    for field in ('url', 'luba_no'):
+        pool = defaultdict(list)
+        for old in unpaired:
+            if old[field]:
+                pool[old[field]].append(old)
+        for new in new_rows:
+            if pairs[id(new)] is None and pool.get(new[field]):
+                pairs[id(new)] = pool[new[field]].pop(0)
+        taken = {id(old) for old in pairs.values() if old}
+        unpaired = [old for old in unpaired if id(old) not in taken]
+    return [(pairs[id(new)], new) for new in new_rows], unpaired
+
+def keep_resolved_date(old_reporter: str, new_reporter: str) -> str:
+    """
+    The stored reporter when it's the new one with its "?" day filled in
+    """
+    if old_reporter and "?" in new_reporter:
+        if re.fullmatch(re.escape(new_reporter).replace(r"\?", r"\d{1,2}"), old_reporter):
+            return old_reporter
+    return new_reporter
+
+def upsert_page(conn: sqlite3.Connection, source_type: str, year: int, rows: List[Dict]) -> Tuple[int, int, int]:
+    """
+    Makes the table's rows for one year page match rows: (added, changed, removed)
+    """
+    old_rows = [dict(row) for row in conn.execute(
+        "SELECT * FROM opinions WHERE source_type = ? AND year = ? ORDER BY [index]", (source_type, year))]
+    pairs, removed = pair_rows(old_rows, rows)
+    next_index = (conn.execute("SELECT MAX([index]) FROM opinions").fetchone()[0] or 0) + 1
+    updates, inserts = [], []
+    for old, new in pairs:
+        if old is None:
+            inserts.append({**new, 'index': next_index})
+            next_index += 1
+            continue
+        new = {**new, 'reporter': keep_resolved_date(old['reporter'], new['reporter']), 'index': old['index']}
+        if any(old[name] != new[name] for name in ROW_COLUMNS):
+            updates.append(new)
+    set_sql = ', '.join(f"[{name}] = :{name}" for name in ROW_COLUMNS)
+    conn.executemany("DELETE FROM opinions WHERE [index] = ?", [(old['index'],) for old in removed])
+    conn.executemany(f"UPDATE opinions SET {set_sql} WHERE [index] = :index", updates)
+    conn.executemany(insert_sql('opinions', OPINION_COLUMNS), inserts)
+    return len(inserts), len(updates), len(removed)
+
+def count_fetch(metrics: Metrics, fetched: Dict):
+    if 'error' in fetched:
+        metrics.count('failed')
+    elif fetched['status'] == 304:
+        metrics.count('not modified')
+    elif not fetched['changed']:
+        metrics.count('same content')
+    else:
+        metrics.count('changed pages')
+
+async def refresh(conn: sqlite3.Connection, site: str = SITE_URL, concurrency: int = CONCURRENCY,
+                  years: List[int] = None, force: bool = False, metrics: Metrics = None):
+    """
+    Fetches the listings & then their year pages (concurrency at a time), reparsing & upserting only the pages
+    that changed; each page's rows & validators are committed together, so a failed page is just retried next time
+    """
+    metrics = metrics or Metrics()
+    pages = load_pages(conn)
+    checked = datetime.datetime.now().isoformat(timespec='seconds')
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT, follow_redirects=True,
+                                 headers={'User-Agent': USER_AGENT}) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        listing_urls = {source_type: site.rstrip('/') + path for source_type, path in LISTING_PAGES.items()}
+        with metrics.stage('fetch'):
+            listings = await asyncio.gather(*(fetch_page(client, semaphore, url, pages.get(url), force)
+                                              for url in listing_urls.values()))
+
+        year_pages = []  # (source_type, year, url)
+        for (source_type, url), fetched in zip(listing_urls.items(), listings):
+            count_fetch(metrics, fetched)
+            if 'error' in fetched:
+                print_it(f"!! {source_type} listing {url}: {fetched['error']} (its year pages are skipped)")
+                continue
+            if fetched['changed']:
+                with metrics.stage('parse'):
+                    links = year_links(fetched['text'], url)
+            else:
+                links = {int(year): year_url for year, year_url in json.loads(pages[url]['year_links']).items()}
+            print_it(f"{source_type} listing: {len(links)} years{'' if fetched['changed'] else ' (unchanged)'}")
+            with conn:
+                save_page(conn, {**fetched, 'source_type': source_type, 'year_links': json.dumps(links), 'checked': checked})
+            year_pages += [(source_type, year, year_url) for year, year_url in sorted(links.items(), reverse=True)
+                           if not years or year in years]
+
+        with metrics.stage('fetch'):
+            fetched_years = await asyncio.gather(*(fetch_page(client, semaphore, url, pages.get(url), force)
+                                                   for source_type, year, url in year_pages))
+
+    for (source_type, year, url), fetched in zip(year_pages, fetched_years):
+        count_fetch(metrics, fetched)
+        if 'error' in fetched:
+            print_it(f"!! {source_type} {year} {url}: {fetched['error']}")
+            continue
+        page = {**fetched, 'source_type': source_type, 'year': year, 'checked': checked,
+                'row_count': (pages.get(url) or {}).get('row_count')}
+        if fetched['changed']:
+            with metrics.stage('parse'):
+                rows = parse_year_page(fetched['text'], url, year, source_type)
+            if not rows:
+                # usually a page that didn't load properly; keep what's stored & try again next time
+                print_it(f"!! {source_type} {year}: no cases found on {url}, left as is")
+                metrics.count('failed')
+                continue
+            with metrics.stage('upsert'), conn:
+                added, changed, removed = upsert_page(conn, source_type, year, rows)
+                save_page(conn, {**page, 'row_count': len(rows)})
+            for name, amount in (('added', added), ('changed', changed), ('removed', removed)):
+                metrics.count(name, amount)
+            print_it(f"   {source_type} {year}: {len(rows)} cases, {added} added, {changed} changed, {removed} removed")
+        else:
+            with conn:
+                save_page(conn, page)
+
+    unresolved = conn.execute("SELECT COUNT(*) FROM opinions WHERE reporter LIKE ?", (UNRESOLVED_DATE,)).fetchone()[0]
+    metrics.count('unresolved dates', unresolved)
+
+def export_json(conn: sqlite3.Connection, json_path: str) -> int:
+    """
+    Writes the opinions table as luba_scraper.js output (case_name & citation for name & reporter)
+    """
+    opinions = [{'index': row['index'], 'case_name': row['name'], 'year': row['year'], 'month': row['month'],
+                 'citation': row['reporter'], 'luba_no': row['luba_no'], 'url': row['url'],
+                 'source_type': row['source_type'], 'warnings': json.loads(row['warnings'] or "[]")}
+                for row in conn.execute("SELECT * FROM opinions ORDER BY [index]")]
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(opinions, f, indent=2, ensure_ascii=False)
+    return len(opinions)
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Fetch LUBA's opinion & order listings into an opinions table")
+    arg_parser.add_argument('db_path', nargs='?', default=opinionsDB, help=f"database to upsert into (default {opinionsDB})")
+    arg_parser.add_argument('--site', default=SITE_URL, help=f"site to fetch from (default {SITE_URL})")
+    arg_parser.add_argument('--fixtures', action='store_true', help="fetch from the saved pages (local fixture server)")
+    arg_parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help=f"pages fetched at once (default {CONCURRENCY})")
+    arg_parser.add_argument('--years', type=int, nargs='+', metavar='YEAR', help="only these year pages")
+    arg_parser.add_argument('--force', action='store_true', help="ignore saved ETags/hashes, refetch & reparse everything")
+    arg_parser.add_argument('--json', metavar='OPINIONS_JSON', help="also write the table as opinions JSON")
+    arg_parser.add_argument('--metrics', metavar='RESULTS_JSON', help="add stage times to this Headnotes_Results_*.json")
+    arg_parser.add_argument('--profile', action='store_true', help="profile the run (cProfile & peak memory)")
+    args = arg_parser.parse_args()
+    metrics = Metrics(profile=args.profile)
+
+    site, server = args.site, None
+    if args.fixtures:
+        import luba_fixture_server
+        # same port every time, so the saved validators (kept per url) apply on the next run
+        server, site = luba_fixture_server.start_background(port=luba_fixture_server.PORT)
+        print_it(f"serving saved pages at {site}")
+    conn = open_db(args.db_path)
+    print_it(f"refreshing {args.db_path} from {site} ({args.concurrency} at a time) ...")
+    asyncio.run(refresh(conn, site, args.concurrency, args.years, args.force, metrics))
+    if args.json:
+        with metrics.stage('json write'):
+            print_it(f"wrote {export_json(conn, args.json)} opinions & orders to {args.json}")
+    conn.close()
+    if server:
+        server.shutdown()
+    metrics.finish(profile_path_for(args.metrics or args.db_path, 'opinions ingest') if args.profile else None)
+    if args.metrics:
+        metrics.save(args.metrics, 'opinions ingest')
+    metrics.report()
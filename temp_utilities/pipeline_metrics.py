@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Shared timing for the import pipeline (luba_docx_parser.py, build_db_compare.py & luba_db_build.py)
+  named stage timers & counters  (docx load, paragraph walk, extraction, JSON write, SQL import, compare, CSV export)
+  slowest entries                 (e.g. the N headnotes that took longest to parse)
+  profile=True                    (cProfile of the whole run, saved as .prof, & tracemalloc peak memory)
+Metrics.save() puts the numbers in the "metrics" block of a Headnotes_Results_*.json file, one section per tool,
+so import cost can be compared release over release
+"""
+
+import cProfile, heapq, io, json, os, pstats, time, tracemalloc
+from contextlib import contextmanager
+from typing import Dict
+
+# slowest entries kept
+DEFAULT_SLOWEST = 10
+
+# functions listed from the cProfile stats
+PROFILE_LINES = 25
+
+class Metrics:
+    """
+    Stage times (seconds, summed over repeats), counters & the slowest entries for one tool run
+    """
+    def __init__(self, slowest: int = DEFAULT_SLOWEST, profile: bool = False):
+        self.stages = {}
+        self.counters = {}
+        self.slowest = slowest
+        self.slow_entries = []  # min-heap of (seconds, order, label)
+        self.entry_count = 0
+        self.profiler = None
+        self.started = time.perf_counter()
+        self.finished = None
+        self.peak_mb = None
+        if profile:
+            tracemalloc.start()
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        with metrics.stage('json write'): ... adds the time inside to that stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def entry(self, label: str, seconds: float):
+        """
+        Records how long one entry (e.g. a headnote) took; only the slowest are kept
+        """
+        if not self.slowest:
+            return
+        item = (seconds, self.entry_count, label)
+        self.entry_count += 1
+        if len(self.slow_entries) < self.slowest:
+            heapq.heappush(self.slow_entries, item)
+        elif item > self.slow_entries[0]:
+            heapq.heapreplace(self.slow_entries, item)
+
+    def finish(self, profile_path: str = None) -> Dict:
+        """
+        Stops the clock (& profiler, saving its stats to profile_path) and returns to_dict()
+        """
+        if self.finished is None:
+            self.finished = time.perf_counter()
+            if self.profiler:
+                self.profiler.disable()
+                self.peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                tracemalloc.stop()
+                if profile_path:
+                    self.profiler.dump_stats(profile_path)
+                    print(f"Saved profile as : {profile_path} (open with python -m pstats or snakeviz)")
+        return self.to_dict()
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-ready metrics block
+        """
+        total = (self.finished or time.perf_counter()) - self.started
+        metrics = {
+            'total_seconds': round(total, 3),
+            'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+            'slowest': [{'label': label, 'seconds': round(seconds, 4)}
+                        for seconds, _, label in sorted(self.slow_entries, reverse=True)],
+        }
+        if self.peak_mb is not None:
+            metrics['peak_mb'] = self.peak_mb
+        return metrics
+
+    def report(self):
+        """
+        Prints stage times, counters, the slowest entries & (when profiling) the top functions
+        """
+        metrics = self.to_dict()
+        print("Stage times:")
+        for name, seconds in metrics['stages'].items():
+            print(f"  {name:>16}: {seconds:.2f}s")
+        print(f"  {'total':>16}: {metrics['total_seconds']:.2f}s")
+        if metrics['counters']:
+            print("Counts: " + ', '.join(f"{name} {value}" for name, value in metrics['counters'].items()))
+        if metrics['slowest']:
+            print(f"Slowest {len(metrics['slowest'])}:")
+            for slow in metrics['slowest']:
+                print(f"  {slow['seconds']:.4f}s  {slow['label']}")
+        if 'peak_mb' in metrics:
+            print(f"Peak Python memory: {metrics['peak_mb']} MB")
+        if self.profiler and self.finished is not None:
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            print(out.getvalue())
+
+    def save(self, results_path: str, section: str):
+        """
+        Writes the metrics into results_path's metadata (metadata.metrics[section]), keeping everything else in it
+        (creates the file if it doesn't exist yet)
+        """
+        results = {'metadata': {}}
+        if os.path.exists(results_path):
+            with open(results_path, encoding='utf-8') as f:
+                results = json.load(f)
+        results.setdefault('metadata', {}).setdefault('metrics', {})[section] = self.finish()
+        with open(results_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+def profile_path_for(results_path: str, section: str) -> str:
+    """
+    E.g. Headnotes_Results_2026-05-01.json => Headnotes_Results_2026-05-01_parse.prof
+    """
+    return f"{os.path.splitext(results_path)[0]}_{section.replace(' ', '_')}.prof"
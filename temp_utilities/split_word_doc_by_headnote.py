@@ -1,8 +1,19 @@
 import re
+import io
+import os
 import copy
+import json
+import time
+import zipfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from docx import Document
+from lxml import etree
+from headnote_cache import hash_paragraphs
 # Takes Word document full of headnotes and splits them into smaller files for each headnote (1.1.1; 1.1.2, etc.), provided that the first paragraph starts with headnote number in bold face.
+# The source is loaded once & every split reuses one blank package (styles, numbering, rels), with only
+# word/document.xml changing, so each file is just a zip write (done by a pool of threads)
+# to run type 'python split_word_doc_by_headnote.py [file.docx] [--workers N]'
 
 # ── CONFIG ──────────────────────────────────────────────────────────────────
 INPUT_PATH = r"..\headnotes_full-2025-08-06.docx"
@@ -26,19 +37,65 @@ def extract_headnote(para):
     return None
 
 
-def copy_paragraph_to_doc(src_para, dest_doc):
-    """Deep-copy a paragraph's XML into the destination document body."""
-    new_para = copy.deepcopy(src_para._element)
-    dest_doc.element.body.append(new_para)
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+class PackageSkeleton:
+    """
+    A blank Word document (python-docx's default template, as Document() made for each split before), saved once
+    Every part except word/document.xml is compressed once into base_zip; write_docx() copies it & adds
+    the section's document.xml (the styles alone are ~800KB, too slow to compress again for each file)
+    """
+    def __init__(self):
+        blank = Document()
+        # Remove the default empty paragraph Word adds to new documents
+        for p in blank.paragraphs:
+            p._element.getparent().remove(p._element)
+        buffer = io.BytesIO()
+        blank.save(buffer)
+        base = io.BytesIO()
+        with zipfile.ZipFile(buffer) as package, zipfile.ZipFile(base, "w", zipfile.ZIP_DEFLATED) as base_zip:
+            for info in package.infolist():
+                if info.filename == "word/document.xml":
+                    self.document_info = info
+                    self.document = etree.fromstring(package.read(info.filename))
+                else:
+                    base_zip.writestr(info, package.read(info.filename))
+        self.base_zip = base.getvalue()
+
+    def document_xml(self, paragraph_elements) -> bytes:
+        """
+        word/document.xml with copies of the given paragraphs (before the section properties)
+        """
+        document = copy.deepcopy(self.document)
+        body = document.find(f"{{{W_NS}}}body")
+        sect_pr = body.find(f"{{{W_NS}}}sectPr")
+        for element in paragraph_elements:
+            if sect_pr is None:
+                body.append(copy.deepcopy(element))
+            else:
+                sect_pr.addprevious(copy.deepcopy(element))
+        return etree.tostring(document, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def write_docx(self, out_path, document_xml: bytes):
+        """
+        Writes a .docx: the already compressed skeleton parts, plus document_xml as word/document.xml
+        """
+        with open(out_path, "w+b") as f:
+            f.write(self.base_zip)
+            f.seek(0)
+            with zipfile.ZipFile(f, "a", zipfile.ZIP_DEFLATED) as package:
+                package.writestr(self.document_info, document_xml)
 
 def safe_filename(label):
     """E.g. turn  '1.1.1' into a '1_1_1' for safe filename component"""
     return label.replace(".", "_")
 
-def split_document(input_path):
+def split_document(input_path, workers=None):
+    run_start = time.perf_counter()
     input_path = Path(input_path)
     doc = Document(input_path)
     paragraphs = doc.paragraphs
+    load_time = time.perf_counter() - run_start
 
     # Walk paragraphs, recording where each *new* headnote label begins.
     # Multiple consecutive paragraphs with the same label are grouped together.
@@ -65,20 +122,57 @@ def split_document(input_path):
 
     output_dir = input_path.parent
 
-    for i, (start, end, label) in enumerate(ranges):
-        new_doc = Document()
-        # Remove the default empty paragraph Word adds to new documents
-        for p in new_doc.paragraphs:
-            p._element.getparent().remove(p._element)
-
-        for para in paragraphs[start:end]:
-            copy_paragraph_to_doc(para, new_doc)
-
-        filename = f"{input_path.stem}_{str(i+1).zfill(3)}_{safe_filename(label)}.docx"
-        out_path = output_dir / filename
-        new_doc.save(out_path)
-        print(f"  Saved: {filename}  ({end - start} paragraphs)")
-
-    print("Done.")
-
-split_document(INPUT_PATH)
\ No newline at end of file
+    # content hash of each split file written last time, so unchanged sections aren't rewritten
+    manifest_path = output_dir / f"{input_path.stem}_split_manifest.json"
+    old_manifest = {}
+    if manifest_path.exists():
+        old_manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    new_manifest = {}
+    unchanged = 0
+    skeleton = PackageSkeleton()
+    write_start = time.perf_counter()
+
+    # documents are put together here (lxml), the zip compression & file writes run in the pool
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        pending = []
+        for i, (start, end, label) in enumerate(ranges):
+            filename = f"{input_path.stem}_{str(i+1).zfill(3)}_{safe_filename(label)}.docx"
+            out_path = output_dir / filename
+            section_elements = [para._element for para in paragraphs[start:end]]
+            section_hash = hash_paragraphs(section_elements)
+            new_manifest[filename] = section_hash
+            if old_manifest.get(filename) == section_hash and out_path.exists():
+                unchanged += 1
+                continue
+
+            document_xml = skeleton.document_xml(section_elements)
+            pending.append((pool.submit(skeleton.write_docx, out_path, document_xml), filename, end - start))
+
+        for future, filename, paragraph_count in pending:
+            future.result()
+            print(f"  Saved: {filename}  ({paragraph_count} paragraphs)")
+    write_time = time.perf_counter() - write_start
+
+    # remove split files from the last run that no longer have a section
+    removed = 0
+    for filename in old_manifest.keys() - new_manifest.keys():
+        stale_path = output_dir / filename
+        if stale_path.exists():
+            stale_path.unlink()
+            removed += 1
+
+    manifest_path.write_text(json.dumps(new_manifest, indent=2), encoding="utf-8")
+    print(f"Done. {len(ranges) - unchanged} written, {unchanged} unchanged, {removed} stale files removed.")
+    print(f"Times: load {load_time:.2f}s, split & write {write_time:.2f}s, total {time.perf_counter() - run_start:.2f}s")
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Split headnotes Word file into one file per headnote")
+    arg_parser.add_argument('docx_file', nargs='?', default=INPUT_PATH, help=f"headnotes .docx file (default {INPUT_PATH})")
+    arg_parser.add_argument('--workers', type=int, default=None, metavar='N',
+                            help="threads writing the split files (default: number of CPUs)")
+    args = arg_parser.parse_args()
+
+    split_document(args.docx_file, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Writes a made up (but realistically laid out) LUBA headnotes corpus, so the tools can be timed without the real Word file
+  <name>.docx           headnotes like the real file: bold number & topic, summaries running over several paragraphs,
+                        italic case names (some split around "v."), pre-2020 "Or LUBA" & later "LUBA No" reporters,
+                        ORS/OAR/case cites
+  <name>.json           what luba_docx_parser.py should get out of the .docx (plus opinion_ID, like combiner output),
+                        except for TOPIC_RULE_MISS topics, where it's what the headnote really says
+  <name>_opinions.json  luba_scraper.js style opinions for the cases
+  <name>_old.db         old database layout build_db_compare.py reads, with some headnotes edited, dropped & added
+Same count & seed always give the same files. Used by benchmark_tools.py
+to run type 'python synthetic_corpus.py [--count 1000] [--seed 1] [--out folder]'
+"""
+
+import csv, json, os, random, re, sqlite3, time
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape
+from split_word_doc_by_headnote import PackageSkeleton
+from zip_headnote_splits_to_word import CombinedWriter
+from citation_extractor import normalize_oar
+
+# CONFIG ********
+HEADNOTE_LIST = "HeadnotesList.csv"
+DEFAULT_COUNT = 1000
+DEFAULT_SEED = 1
+# ********
+
+CORPUS_VERSION = 3  # bump when the same count & seed would give different files (benchmark_tools.py names corpora with it)
+
+# share of headnotes with each quirk
+MULTI_PARAGRAPH = 0.2     # summary runs on into 1-2 more paragraphs
+SPLIT_ITALICS = 0.1       # case name italicized in two runs around " v."
+# old database: share of headnotes edited, missing (=> added) & only in the old db (=> removed)
+OLD_EDITED = 0.05
+OLD_MISSING = 0.02
+OLD_EXTRA = 0.02
+
+HEADNOTES_PER_CASE = 3
+# topics the parser's topic rule (TOPIC_PATTERN) can't end on ("Ballot Measure 49"): it only ends a topic at a period
+# not after S-U or a digit, so it reads on into the summary. Kept in the corpus; benchmark_tools.py scores them apart
+TOPIC_RULE_MISS = re.compile(r'[S-U0-9]$')
+LONG_SUMMARY_WORDS = 40000  # long_headnote() size (summaries like this once took over a minute to parse)
+LAST_REPORTER_YEAR = 2020  # later opinions are cited by LUBA No
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'June', 'July', 'Aug', 'Sept', 'Oct', 'Nov', 'Dec']
+
+PETITIONERS = ['Smith', 'Jones', 'Anderson', 'Kamp', 'Rhodes', 'Hoffman', 'McKay', 'Nguyen', 'Olson', 'Larsen',
+               '1000 Friends of Oregon', 'Central Oregon LandWatch', 'Oregon Coast Alliance', 'Friends of Yamhill County',
+               'Columbia Riverkeeper', 'Home Builders Association', 'Willamette Oaks LLC', 'Rogue Advocates']
+PLACES = ['Lane', 'Marion', 'Deschutes', 'Clackamas', 'Jackson', 'Josephine', 'Yamhill', 'Polk', 'Benton', 'Linn',
+          'Washington', 'Coos', 'Curry', 'Douglas', 'Umatilla', 'Hood River']
+CITIES = ['Bend', 'Eugene', 'Portland', 'Salem', 'Corvallis', 'Medford', 'Ashland', 'Hillsboro', 'Newberg', 'Albany',
+          'Springfield', 'Grants Pass', 'Lake Oswego', 'Sandy', 'Sisters', 'Cannon Beach']
+STATE_PARTIES = ['LCDC', 'DLCD', 'ODOT', 'Metro']
+CITED_CASES = [('Foland v. Jackson County', '239 Or App 60', '243 P3d 830', 2010),
+               ('Siporen v. City of Medford', '349 Or 247', '243 P3d 776', 2010),
+               ('Dolan v. City of Tigard', '512 US 374', None, 1994),
+               ('Gage v. City of Portland', '133 Or App 346', '891 P2d 1331', 1995),
+               ('Clark v. Jackson County', '313 Or 508', '836 P2d 710', 1992),
+               ('Younger v. City of Portland', '305 Or 346', '752 P2d 262', 1988)]
+ORS_CITES = ['197.829', '215.283', '197.763', '227.178', '197.835', '215.296', '197.015', '215.416', '197.610']
+OAR_CITES = [('660', '012', '0060'), ('660', '004', '0020'), ('660', '033', '0130'), ('660', '023', '0180')]
+
+# summary sentences are subject + verb + object (no digits, so no stray cites)
+SUBJECTS = ['The county', 'The city', 'The hearings officer', 'The planning commission', 'The governing body',
+            'Petitioner', 'Intervenor-respondent', 'The local government']
+VERBS = ['erred in concluding that', 'correctly determined that', 'did not adequately explain why',
+         'was required to find that', 'reasonably interpreted its code to mean that', 'failed to establish that']
+OBJECTS = ['the proposed use is compatible with surrounding uses', 'the application satisfies the approval criteria',
+           'the record contains substantial evidence supporting the decision', 'the notice of hearing was adequate',
+           'the use will not force a significant change in accepted farm practices',
+           'the challenged condition is roughly proportional to the impacts of the development',
+           'petitioner waived the issue by failing to raise it below', 'the findings are adequate for review']
+
+def print_it(myText):
+    print (str(time.time()) + " " + myText)
+
+def load_topics(path: str = HEADNOTE_LIST) -> List[Tuple[str, str]]:
+    """
+    [(headnote number as written in the Word file, topic)] from the headnote list ("1" => "1.")
+    """
+    topics = []
+    with open(path, encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            number = row['HeadNo'] + '.' if row['Level'] == '1' else row['HeadNo']
+            topic = row['HeadName'].replace('\\(', '(').replace('\\)', ')').strip()
+            topics.append((number, topic))
+    return topics
+
+def make_case(rng: random.Random, index: int) -> Dict:
+    """
+    One opinion: name, year, month, reporter (as cited after the case name) & LUBA docket number
+    """
+    year = rng.randint(1980, 2025)
+    month = rng.randint(1, 12)
+    respondent = rng.choice([f"{rng.choice(PLACES)} County", f"City of {rng.choice(CITIES)}", rng.choice(STATE_PARTIES)])
+    docket = f"{year}-{rng.randint(1, 250):03d}"
+    if year <= LAST_REPORTER_YEAR:
+        reporter = f"{max(1, (year - 1980) * 2 + rng.randint(0, 1))} Or LUBA {rng.randint(1, 900)}"
+        cite = f"{reporter} ({year})"
+    else:
+        cite = reporter = f"LUBA No {docket} ({MONTHS[month - 1]} {rng.randint(1, 28)}, {year})"
+    return {'index': index, 'name': f"{rng.choice(PETITIONERS)} v. {respondent}", 'year': year, 'month': f"{month:02d}",
+            'reporter': reporter, 'cite': cite, 'luba_no': docket if year >= 2000 else docket[2:],
+            'url': f"/Opinions/{year}/{month:02d}-{str(year)[2:]}/{docket.replace('-', '')[2:]}.pdf"}
+
+def make_summary(rng: random.Random) -> Tuple[List[str], Dict[str, List[str]], List[str]]:
+    """
+    (sentences, cites the parser should find, cited case names (italic)) for one headnote summary
+    """
+    sentences = []
+    cites = {'ors_cites': [], 'oar_cites': [], 'case_cites': []}
+    italics = []
+    for _ in range(rng.randint(2, 4)):
+        sentence = f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}"
+        roll = rng.random()
+        if roll < 0.3:
+            ors = rng.choice(ORS_CITES)
+            sentence += f" under ORS {ors}" + rng.choice(['', '(1)', '(2)(a)'])
+            cites['ors_cites'].append(ors)
+        elif roll < 0.45:
+            division, rule, section = rng.choice(OAR_CITES)
+            short = rng.random() < 0.3  # older headnotes drop the zero padding
+            sentence += f" under OAR {division}-{int(rule):02d}-{int(section):02d}" if short else f" under OAR {division}-{rule}-{section}"
+            cites['oar_cites'].append(normalize_oar(division, rule, section))
+        elif roll < 0.65:
+            name, reporter, regional, year = rng.choice(CITED_CASES)
+            sentence += f". {name}, {reporter}{', ' + regional if regional else ''} ({year})"
+            italics.append(name)
+            cites['case_cites'] += [reporter] + ([regional] if regional else [])
+        sentences.append(sentence + '.')
+    return sentences, {kind: list(dict.fromkeys(found)) for kind, found in cites.items()}, italics
+
+def long_headnote(rng: random.Random, words: int = LONG_SUMMARY_WORDS) -> Tuple[Dict, str]:
+    """
+    (headnote as luba_docx_parser's readers hand it to extract_headnote_data, expected summary) for one headnote with
+    a summary of about words words, its sentences separated by runs of spaces, tabs & line breaks
+    """
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentences += make_summary(rng)[0]
+    case = make_case(rng, 1)
+    gaps = [rng.choice([' ', '  ', ' \t ', '\n']) for _ in sentences]
+    heading = "1.1 Administrative Law \u2013 Interpretation of Law."
+    raw_text = f"{heading} " + ''.join(sentence + gap for sentence, gap in zip(sentences, gaps))
+    formatting = [{'type': 'bold', 'text': heading, 'start': 0, 'end': len(heading)},
+                  {'type': 'italic', 'text': case['name'], 'start': len(raw_text), 'end': len(raw_text) + len(case['name'])}]
+    raw_text += f"{case['name']}, {case['cite']}."
+    return {'headnote_number': '1.1', 'formatting': formatting, 'raw_text': raw_text}, ' '.join(sentences)
+
+def run_xml(text: str, bold: bool = False, italic: bool = False) -> str:
+    properties = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+    properties = f"<w:rPr>{properties}</w:rPr>" if properties else ''
+    return f'<w:r>{properties}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+def text_runs(text: str, italics: List[str]) -> str:
+    """
+    Runs for text, with each of the italics (in order) italicized
+    """
+    runs = []
+    pos = 0
+    for name in italics:
+        found = text.find(name, pos)
+        if found == -1:
+            continue
+        runs += [run_xml(text[pos:found]), run_xml(name, italic=True)]
+        pos = found + len(name)
+    runs.append(run_xml(text[pos:]))
+    return ''.join(run for run in runs if '></w:t>' not in run)
+
+def headnote_paragraphs(rng: random.Random, number: str, topic: str, case: Dict,
+                        sentences: List[str], italics: List[str]) -> List[bytes]:
+    """
+    <w:p> XML for one headnote: bold "number topic." then the summary (maybe over several paragraphs),
+    ending with the italic case name & reporter
+    """
+    breaks = sorted(rng.sample(range(1, len(sentences)), min(len(sentences) - 1, rng.randint(1, 2)))) \
+        if rng.random() < MULTI_PARAGRAPH else []
+    parts = [sentences[start:end] for start, end in zip([0] + breaks, breaks + [len(sentences)])]
+    paragraphs = []
+    for i, part in enumerate(parts):
+        text = ' '.join(part)
+        runs = run_xml(f"{number} {topic}.", bold=True) + run_xml(' ') if i == 0 else ''
+        runs += text_runs(text, [name for name in italics if name in text])
+        if i == len(parts) - 1:
+            petitioner, respondent = case['name'].split(' v. ')
+            if rng.random() < SPLIT_ITALICS:
+                runs += run_xml(' ') + run_xml(petitioner, italic=True) + run_xml(' ') + run_xml(f"v. {respondent}", italic=True)
+            else:
+                runs += run_xml(' ') + run_xml(case['name'], italic=True)
+            runs += run_xml(f", {case['cite']}.")
+        paragraphs.append(f"<w:p>{runs}</w:p>".encode('utf-8'))
+    return paragraphs
+
+def italic_formatting(summary: str, italics: List[str]) -> List[Dict]:
+    """
+    formatting blocks (summary positions only) for the cited case names in a summary
+    """
+    blocks = []
+    pos = 0
+    for name in italics:
+        found = summary.find(name, pos)
+        if found != -1:
+            blocks.append({'type': 'italic', 'text': name, 'summary_start': found, 'summary_end': found + len(name)})
+            pos = found + len(name)
+    return blocks
+
+def write_old_db(path: str, rng: random.Random, headnotes: List[Dict], cases: List[Dict]):
+    """
+    The old database tables build_db_compare.py reads (published_headnotes_old, opinions, headnote_topics, warnings),
+    from the headnotes with some summaries edited, some left out & some extra old-only rows
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript("""
+            CREATE TABLE opinions (id INTEGER PRIMARY KEY, case_name TEXT, reporter TEXT);
+            CREATE TABLE headnote_topics (number TEXT PRIMARY KEY, topic TEXT);
+            CREATE TABLE warnings (id INTEGER PRIMARY KEY, message TEXT);
+            CREATE TABLE published_headnotes_old (headnote_number TEXT, summary TEXT, opinion_id INTEGER, warning_id INTEGER);
+        """)
+        conn.executemany("INSERT INTO opinions VALUES (?, ?, ?)", ((case['index'], case['name'], case['reporter']) for case in cases))
+        conn.executemany("INSERT OR IGNORE INTO headnote_topics VALUES (?, ?)", ((h['headnote'], h['topic']) for h in headnotes))
+        conn.execute("INSERT INTO warnings VALUES (1, '[]')")
+        rows = []
+        for h in headnotes:
+            roll = rng.random()
+            if roll < OLD_MISSING:
+                continue
+            summary = h['summary']
+            if roll < OLD_MISSING + OLD_EDITED:
+                words = summary.split(' ')
+                del words[rng.randrange(len(words))]
+                summary = '  '.join(words)  # old data also had doubled spaces
+            rows.append((h['headnote'], summary, h['opinion_ID'], 1))
+            if rng.random() < OLD_EXTRA:
+                rows.append((h['headnote'], f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}.", h['opinion_ID'], 1))
+        conn.executemany("INSERT INTO published_headnotes_old VALUES (?, ?, ?, ?)", rows)
+    conn.close()
+
+def write_corpus(count: int = DEFAULT_COUNT, seed: int = DEFAULT_SEED, out_dir: str = '.', name: str = None) -> Dict[str, str]:
+    """
+    Writes the corpus files (see top of file) & returns {kind: path}
+    """
+    rng = random.Random(seed)
+    name = name or f"synthetic_{count}"
+    paths = {kind: os.path.join(out_dir, f"{name}{suffix}") for kind, suffix in
+             (('docx', '.docx'), ('json', '.json'), ('opinions', '_opinions.json'), ('old_db', '_old.db'))}
+    os.makedirs(out_dir, exist_ok=True)
+
+    topics = load_topics()
+    cases = [make_case(rng, i + 1) for i in range(max(1, count // HEADNOTES_PER_CASE))]
+    # the Word file runs in headnote order, newest case first within each headnote
+    picks = sorted(((rng.randrange(len(topics)), rng.choice(cases)) for _ in range(count)),
+                   key=lambda pick: (pick[0], -pick[1]['year'], pick[1]['index']))
+
+    headnotes = []
+    writer = CombinedWriter(PackageSkeleton(), paths['docx'])
+    for i, (topic_index, case) in enumerate(picks):
+        number, topic = topics[topic_index]
+        sentences, cites, italics = make_summary(rng)
+        for paragraph in headnote_paragraphs(rng, number, topic, case, sentences, italics):
+            writer.add(paragraph)
+        summary = ' '.join(sentences)
+        headnotes.append({
+            'headnote': number, 'topic': topic, 'summary': summary, 'case_name': case['name'],
+            'reporter': case['reporter'], 'year': case['year'], **cites,
+            'formatting': italic_formatting(summary, italics), 'warnings': [], 'index': str(i),
+            'opinion_ID': case['index'], 'opinion_matched_by': 'reporter',
+        })
+    writer.close()
+
+    with open(paths['json'], 'w', encoding='utf-8') as f:
+        json.dump(headnotes, f, indent=2, ensure_ascii=False)
+    with open(paths['opinions'], 'w', encoding='utf-8') as f:
+        json.dump([{key: value for key, value in case.items() if key != 'cite'} | {'source_type': 'opinions', 'warnings': []}
+                   for case in cases], f, indent=2, ensure_ascii=False)
+    write_old_db(paths['old_db'], rng, headnotes, cases)
+    return paths
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic LUBA headnotes corpus (.docx, .json, opinions & old db)")
+    arg_parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help=f"number of headnotes (default {DEFAULT_COUNT})")
+    arg_parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="random seed (same seed => same files)")
+    arg_parser.add_argument('--out', default='.', metavar='FOLDER', help="folder to write to (default current)")
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    print_it(f"writing {args.count} synthetic headnotes ...")
+    for kind, path in write_corpus(args.count, args.seed, args.out).items():
+        print_it(f"  {kind:>8}: {path}")
+    print_it(f"finished in {time.perf_counter() - start:.2f}s!")
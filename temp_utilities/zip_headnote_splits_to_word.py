@@ -1,21 +1,97 @@
-import copy
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from docx import Document
+from lxml import etree
 from natsort import natsorted
+from split_word_doc_by_headnote import PackageSkeleton, W_NS
 
 # zips together docx files in folder into combined file(s) (kept alphabetically by file name)
+# Each file's paragraphs are streamed straight into the output's word/document.xml (files are read by a pool
+# of threads & appended in order), so memory use doesn't grow with the number of files
+# to run type 'python zip_headnote_splits_to_word.py [folder] [--workers N] [--volume-size MB]'
 
 # ── CONFIG ──────────────────────────────────────────────────────────────────
 FOLDER_PATH = r"..\..\..\Word Versions"
 OUTPUT_NAME = "combined.docx"              # output file, saved folder
 # ────────────────────────────────────────────────────────────────────────────
 
-def combine_documents(folder_path):
+def read_paragraphs(path) -> bytes:
+    """
+    XML of the body paragraphs in one .docx (the same paragraphs as python-docx's doc.paragraphs)
+    """
+    with zipfile.ZipFile(path) as package:
+        document = etree.fromstring(package.read("word/document.xml"))
+    body = document.find(f"{{{W_NS}}}body")
+    return b"".join(etree.tostring(para) for para in body.iterchildren(f"{{{W_NS}}}p"))
+
+def iter_file_paragraphs(files, workers=None):
+    """
+    Yields (path, paragraph XML) for each file in order, reading a few files ahead in a thread pool
+    """
+    workers = workers or os.cpu_count()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ahead = workers * 2
+        in_flight = deque()
+        for path in files:
+            in_flight.append((path, pool.submit(read_paragraphs, path)))
+            if len(in_flight) >= ahead:
+                path, future = in_flight.popleft()
+                yield path, future.result()
+        while in_flight:
+            path, future = in_flight.popleft()
+            yield path, future.result()
+
+class CombinedWriter:
+    """
+    Writes one combined .docx: the skeleton's parts, then word/document.xml streamed paragraph by paragraph
+    """
+    def __init__(self, skeleton: PackageSkeleton, out_path):
+        self.out_path = out_path
+        document_xml = skeleton.document_xml([])
+        # blank body is just <w:sectPr>; paragraphs go between <w:body> & it
+        sect_pr_start = document_xml.index(b"<w:sectPr")
+        self.head, self.tail = document_xml[:sect_pr_start], document_xml[sect_pr_start:]
+        self.file = open(out_path, "w+b")
+        self.file.write(skeleton.base_zip)
+        self.file.seek(0)
+        self.package = zipfile.ZipFile(self.file, "a", zipfile.ZIP_DEFLATED)
+        document_info = zipfile.ZipInfo(skeleton.document_info.filename, skeleton.document_info.date_time)
+        document_info.compress_type = zipfile.ZIP_DEFLATED
+        self.document = self.package.open(document_info, "w", force_zip64=True)
+        self.document.write(self.head)
+        self.bytes_written = 0
+        self.file_count = 0
+
+    def add(self, paragraph_xml: bytes):
+        self.document.write(paragraph_xml)
+        self.bytes_written += len(paragraph_xml)
+        self.file_count += 1
+
+    def close(self):
+        self.document.write(self.tail)
+        self.document.close()
+        self.package.close()
+        self.file.close()
+
+def volume_path(folder_path, volume):
+    """E.g. combined.docx => combined_02.docx for the second volume"""
+    output = Path(OUTPUT_NAME)
+    return folder_path / f"{output.stem}_{str(volume).zfill(2)}{output.suffix}"
+
+def combine_documents(folder_path, workers=None, volume_size=None):
+    """
+    volume_size = start a new combined file (combined_01.docx, combined_02.docx...) once one holds this many MB
+    of paragraph XML (None = everything in OUTPUT_NAME)
+    """
     folder_path = Path(folder_path)
     files = natsorted(folder_path.glob("*.docx"), key=lambda f: f.name)
 
-    # Exclude the output file itself in case it already exists in the folder
-    files = [f for f in files if f.name != OUTPUT_NAME]
+    # Exclude the output file(s) themselves in case they already exist in the folder
+    output_stem = Path(OUTPUT_NAME).stem
+    files = [f for f in files if f.name != OUTPUT_NAME and not
+             (f.stem.startswith(f"{output_stem}_") and f.stem[len(output_stem) + 1:].isdigit())]
 
     if not files:
         print("No .docx files found.")
@@ -23,19 +99,36 @@ def combine_documents(folder_path):
 
     print(f"Combining {len(files)} files...")
 
-    combined = Document()
-    # Remove the default empty paragraph Word adds to new documents
-    for p in combined.paragraphs:
-        p._element.getparent().remove(p._element)
+    skeleton = PackageSkeleton()
+    volume_bytes = volume_size * 1024 * 1024 if volume_size else None
+    volume = 1
+    writer = CombinedWriter(skeleton, volume_path(folder_path, volume) if volume_bytes else folder_path / OUTPUT_NAME)
+    saved = []
 
-    for path in files:
-        doc = Document(path)
-        for para in doc.paragraphs:
-            combined.element.body.append(copy.deepcopy(para._element))
+    for path, paragraph_xml in iter_file_paragraphs(files, workers):
+        if volume_bytes and writer.file_count and writer.bytes_written + len(paragraph_xml) > volume_bytes:
+            writer.close()
+            saved.append(writer)
+            volume += 1
+            writer = CombinedWriter(skeleton, volume_path(folder_path, volume))
+        writer.add(paragraph_xml)
         print(f"  Added: {path.name}")
 
-    out_path = folder_path / OUTPUT_NAME
-    combined.save(out_path)
-    print(f"\nDone. Saved to: {out_path}")
+    writer.close()
+    saved.append(writer)
+    for done in saved:
+        print(f"\nDone. Saved {done.file_count} files to: {done.out_path}")
+
+# entry into program
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Combine split headnote Word files into one (or more) files")
+    arg_parser.add_argument('folder', nargs='?', default=FOLDER_PATH, help=f"folder of .docx files (default {FOLDER_PATH})")
+    arg_parser.add_argument('--workers', type=int, default=None, metavar='N',
+                            help="threads reading files ahead of the merge (default: number of CPUs)")
+    arg_parser.add_argument('--volume-size', type=float, default=None, metavar='MB',
+                            help="split the output into volumes of about this many MB of document text")
+    args = arg_parser.parse_args()
 
-combine_documents(FOLDER_PATH)
\ No newline at end of file
+    combine_documents(args.folder, workers=args.workers, volume_size=args.volume_size)